@@ -0,0 +1,4 @@
+import os
+
+# Settings are validated on import, benchmarks only need a throwaway refinement key
+os.environ.setdefault('REFINEMENT_ENCRYPTION_KEY', 'benchmark')
@@ -0,0 +1,50 @@
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.synthetic import generate_export
+from refiner.config import settings
+from refiner.transformer.instagram_transformer import InstagramTransformer
+from refiner.utils.encrypt import decrypt_file, encrypt_file
+
+CONFIGURATIONS = [
+    ('pgp', None),
+    ('none', None),
+    ('zlib', 1),
+    ('zlib', 6),
+    ('zstd', 1),
+    ('zstd', 3),
+    ('zstd', 9),
+]
+
+
+# Run with: python -m benchmarks.bench_compression --posts 20000
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare compression codecs applied before encryption")
+    parser.add_argument('--posts', type=int, default=20000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        settings.OUTPUT_DIR = root
+        db_path = os.path.join(root, 'db.libsql')
+        InstagramTransformer(db_path).process(generate_export(args.posts))
+        db_size = os.path.getsize(db_path)
+        print(f"database: {db_size / 2 ** 20:.1f} MiB")
+        print(f"{'codec':<8}{'level':>6}{'ratio':>8}{'encrypt (s)':>13}{'decrypt (s)':>13}{'upload (MiB)':>14}")
+
+        for codec, level in CONFIGURATIONS:
+            encrypted_path = os.path.join(root, f'db.{codec}.{level}.pgp')
+            started = time.perf_counter()
+            encrypt_file('benchmark', db_path, encrypted_path, codec=codec, level=level)
+            encrypt_seconds = time.perf_counter() - started
+
+            started = time.perf_counter()
+            decrypted_path = decrypt_file('benchmark', encrypted_path)
+            decrypt_seconds = time.perf_counter() - started
+            with open(db_path, 'rb') as original, open(decrypted_path, 'rb') as decrypted:
+                assert original.read() == decrypted.read(), f"{codec} did not round-trip"
+
+            upload_size = os.path.getsize(encrypted_path)
+            print(f"{codec:<8}{level if level is not None else '-':>6}{db_size / upload_size:>8.2f}"
+                  f"{encrypt_seconds:>13.2f}{decrypt_seconds:>13.2f}{upload_size / 2 ** 20:>14.2f}")
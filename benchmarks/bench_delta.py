@@ -0,0 +1,93 @@
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+from typing import Any, Dict
+
+from benchmarks.offline import job_settings, use_local_storage
+from benchmarks.synthetic import generate_export
+from refiner.config import settings
+from refiner.query import RefinementReader
+from refiner.refine import Refiner
+
+SECTIONS = ('posts', 'stories', 'comments', 'direct_messages', 'engagement_metrics')
+
+
+def exports(posts: int, change: float) -> Dict[str, Dict[str, Any]]:
+    """
+    A previous export and the current one of the same user.
+
+    The previous export lacks the most recent `change` share of every section,
+    and the current one also changed the bio and the likes of a few posts. (A
+    new follower count would change the engagement rate of every post.)
+    """
+    current = generate_export(posts)
+    previous = json.loads(json.dumps(current))
+    for section in SECTIONS:
+        previous[section] = previous[section][:int(len(previous[section]) * (1 - change))]
+    current['profile']['bio'] += ' (updated)'
+    for post in current['posts'][::max(int(1 / change), 1)]:
+        post['like_count'] += 1
+    return {'previous': previous, 'current': current}
+
+
+def row_checksums(db_path: str) -> Dict[str, str]:
+    """Checksum the rows of every table as a set: rows a delta replaced come back with another rowid."""
+    connection = sqlite3.connect(db_path)
+    try:
+        return {
+            table: hashlib.sha256(repr(sorted(map(repr, connection.execute(f'SELECT * FROM "{table}"')))).encode()).hexdigest()
+            for (table,) in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table' ORDER BY name")
+        }
+    finally:
+        connection.close()
+
+
+def refine(export: Dict[str, Any], root: str, name: str, delta_base: str = None) -> Dict[str, Any]:
+    """Refine an export, uploading it whole or as a delta, and measure what was uploaded."""
+    input_dir, output_dir = os.path.join(root, name, 'input'), os.path.join(root, name, 'output')
+    os.makedirs(input_dir)
+    os.makedirs(output_dir)
+    with open(os.path.join(input_dir, 'export.json'), 'w') as f:
+        json.dump(export, f)
+    settings.DELTA_BASE = delta_base
+    with job_settings(input_dir, output_dir):
+        output = Refiner().transform()
+    uploaded = sum(
+        os.path.getsize(os.path.join(output_dir, file)) for file in ('db.libsql.pgp', 'delta.libsql.pgp', 'manifest.json')
+        if os.path.exists(os.path.join(output_dir, file))
+    )
+    return {
+        'cid': output.refinement_url.rsplit('/', 1)[-1], 'uploaded': uploaded,
+        'db_path': os.path.join(output_dir, 'db.libsql')
+    }
+
+
+# Run with: python -m benchmarks.bench_delta --posts 50000 --change 0.02
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare uploading a refinement whole and as a delta against the previous one")
+    parser.add_argument('--posts', type=int, default=50000, help="Posts of the current synthetic export")
+    parser.add_argument('--change', type=float, default=0.02, help="Share of the records new since the previous export")
+    args = parser.parse_args()
+
+    use_local_storage()
+    with tempfile.TemporaryDirectory() as root:
+        settings.LOCAL_STORE_DIR = os.path.join(root, 'store')
+        data = exports(args.posts, args.change)
+        previous = refine(data['previous'], root, 'previous')
+        full = refine(data['current'], root, 'full')
+        delta = refine(data['current'], root, 'delta', delta_base=previous['cid'])
+
+        # Reconstruct the current refinement from the delta manifest, as a consumer would
+        reconstructed = os.path.join(root, 'reconstructed.libsql')
+        with open(reconstructed, 'wb') as f:
+            f.write(RefinementReader(cache_size=0).fetch(delta['cid'])[1])
+        identical = row_checksums(reconstructed) == row_checksums(full['db_path'])
+
+    print(f"{'upload':<10}{'MiB':>10}")
+    for name, result in (('full', full), ('delta', delta)):
+        print(f"{name:<10}{result['uploaded'] / 2 ** 20:>10.2f}")
+    print(f"Delta {full['uploaded'] / delta['uploaded']:.1f}x smaller, reconstructed tables "
+          f"{'identical' if identical else 'DIFFERENT'}")
@@ -0,0 +1,106 @@
+import argparse
+import http.client
+import json
+import os
+import tempfile
+import threading
+import time
+import zipfile
+from typing import Dict, Iterator
+
+from benchmarks.bench_parallel_build import table_checksums
+from benchmarks.offline import job_settings, use_local_storage
+from benchmarks.synthetic import write_export
+from refiner.config import settings
+from refiner.ingest import serve
+
+CHUNK_SIZE = 64 * 1024
+
+
+def throttled(path: str, megabytes_per_second: float) -> Iterator[bytes]:
+    """Read a file in chunks no faster than the given rate, like an upload over a slow link."""
+    started = time.perf_counter()
+    sent = 0
+    with open(path, 'rb') as f:
+        while chunk := f.read(CHUNK_SIZE):
+            sent += len(chunk)
+            delay = sent / (megabytes_per_second * 1024 * 1024) - (time.perf_counter() - started)
+            if delay > 0:
+                time.sleep(delay)
+            yield chunk
+
+
+def upload_then_refine(archive: str, root: str, megabytes_per_second: float) -> Dict[str, object]:
+    """Receive the whole archive to disk, then extract and refine it like a batch job."""
+    from refiner.__main__ import run
+
+    input_dir, output_dir = os.path.join(root, 'input'), os.path.join(root, 'output')
+    os.makedirs(input_dir)
+    os.makedirs(output_dir)
+    started = time.perf_counter()
+    with open(os.path.join(input_dir, os.path.basename(archive)), 'wb') as f:
+        for chunk in throttled(archive, megabytes_per_second):
+            f.write(chunk)
+    uploaded = time.perf_counter() - started
+    with job_settings(input_dir, output_dir):
+        run()
+    return {
+        'upload': uploaded, 'total': time.perf_counter() - started,
+        'checksums': table_checksums(os.path.join(output_dir, 'db.libsql'))
+    }
+
+
+def streamed_ingest(archive: str, root: str, megabytes_per_second: float) -> Dict[str, object]:
+    """Upload the archive to the ingest endpoint, which refines it while it arrives."""
+    server = serve(0, root)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        connection = http.client.HTTPConnection('127.0.0.1', server.server_port, timeout=3600)
+        uploaded = []
+
+        def body() -> Iterator[bytes]:
+            yield from throttled(archive, megabytes_per_second)
+            uploaded.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        connection.request('POST', f"/ingest?name={os.path.basename(archive)}", body=body(), encode_chunked=True)
+        response = connection.getresponse()
+        result = json.loads(response.read())
+        total = time.perf_counter() - started
+        if response.status != 200:
+            raise RuntimeError(result['error'])
+    finally:
+        server.shutdown()
+        server.server_close()
+    return {
+        'upload': uploaded[0], 'total': total,
+        'checksums': table_checksums(os.path.join(result['output_dir'], 'db.libsql'))
+    }
+
+
+# Run with: python -m benchmarks.bench_ingest --posts 50000 --mbps 20
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare refining an upload as it arrives with upload, unzip, then refine")
+    parser.add_argument('--posts', type=int, default=50000, help="Posts of the synthetic export")
+    parser.add_argument('--mbps', type=float, default=20, help="Upload rate in MiB/s of the compressed archive")
+    args = parser.parse_args()
+
+    use_local_storage()
+    with tempfile.TemporaryDirectory() as root:
+        settings.OUTPUT_DIR = root
+        export = write_export(os.path.join(root, 'export.json'), args.posts)
+        archive = os.path.join(root, 'export.zip')
+        with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as z:
+            z.write(export, 'export.json')
+        print(f"{os.path.getsize(export) / 2 ** 20:.1f} MiB export, {os.path.getsize(archive) / 2 ** 20:.1f} MiB zipped, "
+              f"uploaded at {args.mbps} MiB/s")
+
+        batch = upload_then_refine(archive, os.path.join(root, 'batch'), args.mbps)
+        streamed = streamed_ingest(archive, os.path.join(root, 'streamed'), args.mbps)
+
+    # Encrypting and uploading the refinement comes after the last byte in both modes
+    print(f"{'mode':<22}{'upload s':>10}{'result s':>10}{'after upload s':>16}")
+    for name, result in (('upload, unzip, refine', batch), ('streamed ingest', streamed)):
+        print(f"{name:<22}{result['upload']:>10.2f}{result['total']:>10.2f}{result['total'] - result['upload']:>16.2f}")
+    print(f"Time to result {batch['total'] / streamed['total']:.2f}x faster, tables "
+          f"{'identical' if batch['checksums'] == streamed['checksums'] else 'DIFFERENT'}")
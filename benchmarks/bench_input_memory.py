@@ -0,0 +1,69 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+SECTION = 'posts'
+MODES = ('load', 'stream')
+
+
+def _peak_rss_mb() -> float:
+    # VmHWM is reset on exec, unlike ru_maxrss which is inherited from the parent
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def measure(mode: str, path: str) -> None:
+    """Ingest `path` the given way and print its peak RSS as JSON."""
+    from refiner.utils.reader import iter_json_items, load_json
+
+    baseline = _peak_rss_mb()
+    started = time.perf_counter()
+    if mode == 'load':
+        records = len(load_json(path)[SECTION])
+    else:
+        records = sum(1 for _ in iter_json_items(path, f'{SECTION}.item'))
+    seconds = time.perf_counter() - started
+    print(json.dumps({
+        'mode': mode,
+        'records': records,
+        'seconds': seconds,
+        'peak_rss_mb': _peak_rss_mb(),
+        'baseline_rss_mb': baseline,
+    }))
+
+
+# Run with: python -m benchmarks.bench_input_memory --posts 500000
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare resident memory of the input reading paths")
+    parser.add_argument('--posts', type=int, default=200000)
+    parser.add_argument('--input', help="Existing export to measure instead of a synthetic one")
+    parser.add_argument('--measure', choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        measure(args.measure, args.input)
+        sys.exit(0)
+
+    with tempfile.TemporaryDirectory() as root:
+        path = args.input
+        if path is None:
+            # Generate in a child process so this process stays small
+            path = os.path.join(root, 'export.json')
+            subprocess.run([sys.executable, '-m', 'benchmarks.synthetic', path, '--posts', str(args.posts)], check=True)
+        size_mb = os.path.getsize(path) / 2 ** 20
+        print(f"input: {size_mb:.1f} MiB")
+        print(f"{'mode':<14}{'peak RSS (MiB)':>16}{'over baseline':>16}{'seconds':>10}")
+        for mode in MODES:
+            # Every mode runs in a fresh interpreter so peaks do not carry over
+            result = json.loads(subprocess.run(
+                [sys.executable, '-m', 'benchmarks.bench_input_memory', '--measure', mode, '--input', path],
+                check=True, capture_output=True, text=True
+            ).stdout)
+            print(f"{mode:<14}{result['peak_rss_mb']:>16.1f}{result['peak_rss_mb'] - result['baseline_rss_mb']:>16.1f}{result['seconds']:>10.2f}")
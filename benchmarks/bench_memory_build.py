@@ -0,0 +1,58 @@
+import argparse
+import os
+import tempfile
+import time
+from typing import Dict
+
+from benchmarks.offline import job_settings, use_local_storage
+from benchmarks.synthetic import write_export
+from refiner.config import settings
+from refiner.refine import Refiner
+
+
+def bytes_written() -> int:
+    """Bytes this process has caused to be written to storage so far (Linux only, 0 elsewhere)."""
+    try:
+        with open('/proc/self/io', 'r') as f:
+            return next(int(line.split()[1]) for line in f if line.startswith('write_bytes'))
+    except (OSError, StopIteration):
+        return 0
+
+
+def refine(input_dir: str, output_dir: str, in_memory: bool) -> Dict[str, float]:
+    """Run the whole refinement, database built on disk or in memory."""
+    os.makedirs(output_dir)
+    settings.REFINEMENT_IN_MEMORY = in_memory
+    with job_settings(input_dir, output_dir):
+        os.sync()
+        written = bytes_written()
+        started = time.perf_counter()
+        Refiner().transform()
+        seconds = time.perf_counter() - started
+        os.sync()
+    return {'seconds': seconds, 'written': bytes_written() - written}
+
+
+# Run with: python -m benchmarks.bench_memory_build --posts 100000
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare building the refinement on disk and in memory")
+    parser.add_argument('--posts', type=int, default=100000, help="Posts of the synthetic export")
+    parser.add_argument('--repeat', type=int, default=2)
+    args = parser.parse_args()
+
+    use_local_storage()
+    with tempfile.TemporaryDirectory() as root:
+        input_dir = os.path.join(root, 'input')
+        os.makedirs(input_dir)
+        export = write_export(os.path.join(input_dir, 'export.json'), args.posts)
+        print(f"{os.path.getsize(export) / 2 ** 20:.1f} MiB export")
+
+        results = {'on disk': [], 'in memory': []}
+        for run in range(args.repeat):
+            for name in results:
+                results[name].append(refine(input_dir, os.path.join(root, f"{name}-{run}"), name == 'in memory'))
+
+    print(f"{'database':<12}{'best s':>10}{'written MiB':>14}")
+    for name, runs in results.items():
+        best = min(runs, key=lambda result: result['seconds'])
+        print(f"{name:<12}{best['seconds']:>10.2f}{best['written'] / 2 ** 20:>14.1f}")
@@ -0,0 +1,69 @@
+import argparse
+import hashlib
+import os
+import sqlite3
+import tempfile
+import time
+from typing import Dict, List
+
+from benchmarks.synthetic import write_export
+from refiner.config import settings
+from refiner.transformer.instagram_transformer import InstagramTransformer
+
+
+def table_checksums(db_path: str) -> Dict[str, str]:
+    """Checksum the rows of every table, independently of their physical order."""
+    connection = sqlite3.connect(db_path)
+    try:
+        checksums = {}
+        for (table,) in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table' ORDER BY name"):
+            digest = hashlib.sha256()
+            for row in connection.execute(f"SELECT * FROM {table} ORDER BY rowid"):
+                digest.update(repr(row).encode())
+            checksums[table] = digest.hexdigest()
+        return checksums
+    finally:
+        connection.close()
+
+
+def build(path: str, root: str, processes: int, streaming: bool, batch_size: int) -> Dict[str, object]:
+    """Build the refinement of an export and return how long it took."""
+    db_path = os.path.join(root, f"db-{processes}-{int(streaming)}.libsql")
+    started = time.perf_counter()
+    transformer = InstagramTransformer(db_path)
+    transformer.process_file(path, streaming=streaming, batch_size=batch_size, processes=processes)
+    seconds = time.perf_counter() - started
+    transformer.engine.dispose()
+    return {'seconds': seconds, 'checksums': table_checksums(db_path)}
+
+
+# Run with: python -m benchmarks.bench_parallel_build --posts 20000 --processes 2 4
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the single-connection build with the parallel per-table build")
+    parser.add_argument('--posts', type=int, default=20000)
+    parser.add_argument('--comments-per-post', type=float, default=5)
+    parser.add_argument('--dms-per-post', type=float, default=10)
+    parser.add_argument('--processes', type=int, nargs='+', default=[2, 4])
+    parser.add_argument('--batch-size', type=int, default=10000)
+    parser.add_argument('--input', help="Existing export to build instead of a synthetic one")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        settings.OUTPUT_DIR = root
+        path = args.input or write_export(
+            os.path.join(root, 'export.json'), args.posts,
+            comments_per_post=args.comments_per_post, dms_per_post=args.dms_per_post
+        )
+        print(f"input: {os.path.getsize(path) / 2 ** 20:.1f} MiB")
+
+        runs: List[tuple] = [('single connection', 1, False), ('single connection, streamed', 1, True)]
+        runs += [(f"parallel, {processes} processes", processes, False) for processes in args.processes]
+
+        baseline = None
+        print(f"{'build':<30}{'seconds':>10}{'speedup':>10}  tables")
+        for name, processes, streaming in runs:
+            result = build(path, root, processes, streaming, args.batch_size)
+            if baseline is None:
+                baseline = result
+            identical = "identical" if result['checksums'] == baseline['checksums'] else "DIFFERENT"
+            print(f"{name:<30}{result['seconds']:>10.2f}{baseline['seconds'] / result['seconds']:>9.2f}x  {identical}")
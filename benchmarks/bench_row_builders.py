@@ -0,0 +1,178 @@
+import argparse
+import gc
+import os
+import tempfile
+import time
+from typing import Any, Callable, Dict, List
+
+from benchmarks.bench_parallel_build import table_checksums
+from benchmarks.synthetic import generate_export
+from refiner.config import settings
+from refiner.models.refined import (
+    CommentRefined, DirectMessageRefined, EngagementMetricRefined, MediaRefined, PostRefined, StoryRefined
+)
+from refiner.models.unrefined import InstagramData
+from refiner.transformer.instagram_transformer import ACTIVITY_KINDS, InstagramTransformer
+from refiner.utils.analytics import ActivityHistogram, engagement_rates
+from refiner.utils.date import parse_timestamp
+from refiner.utils.pii import hash_text
+
+# Share of the records of a synthetic export in every collection, per post
+RECORDS_PER_POST = 1 + 0.5 + 1 + 2 + 0.1
+
+
+def handwritten_posts(transformer: InstagramTransformer, data: InstagramData, posts: List[Any]) -> List[Any]:
+    """Post and media model instances as the transformer built them before row mappings."""
+    models = []
+    rates = engagement_rates([post.like_count for post in posts], [post.comment_count for post in posts],
+                             data.profile.follower_count)
+    for post, engagement_rate in zip(posts, rates):
+        models.append(PostRefined(
+            post_id=post.post_id,
+            user_id=data.user_id,
+            caption_length=len(post.caption) if post.caption else 0,
+            post_date=parse_timestamp(post.timestamp),
+            like_count=post.like_count,
+            comment_count=post.comment_count,
+            media_count=len(post.media),
+            has_location=bool(post.location),
+            hashtag_count=len(post.hashtags),
+            engagement_rate=engagement_rate
+        ))
+        for media in post.media:
+            models.append(MediaRefined(
+                post_id=post.post_id, media_type_id=transformer.categories['media_types'].code(media.media_type)
+            ))
+    return models
+
+
+def handwritten_stories(transformer: InstagramTransformer, data: InstagramData, stories: List[Any]) -> List[Any]:
+    return [
+        StoryRefined(
+            story_id=story.story_id,
+            user_id=data.user_id,
+            story_date=parse_timestamp(story.timestamp),
+            media_type_id=transformer.categories['media_types'].code(story.media_type),
+            view_count=story.view_count
+        )
+        for story in stories
+    ]
+
+
+def handwritten_comments(transformer: InstagramTransformer, data: InstagramData, comments: List[Any]) -> List[Any]:
+    return [
+        CommentRefined(
+            comment_id=comment.comment_id,
+            user_id=data.user_id,
+            post_id=comment.post_id,
+            comment_length=len(comment.text),
+            comment_date=parse_timestamp(comment.timestamp),
+            like_count=comment.like_count,
+            author_username_hash=hash_text(comment.author_username)
+        )
+        for comment in comments
+    ]
+
+
+def handwritten_direct_messages(transformer: InstagramTransformer, data: InstagramData, dms: List[Any]) -> List[Any]:
+    return [
+        DirectMessageRefined(
+            message_id=dm.message_id,
+            user_id=data.user_id,
+            conversation_id_hash=hash_text(dm.conversation_id),
+            message_length=len(dm.message_text) if dm.message_text else 0,
+            message_date=parse_timestamp(dm.timestamp),
+            message_type_id=transformer.categories['message_types'].code(dm.message_type),
+            is_sender=(dm.sender_username == data.profile.username)
+        )
+        for dm in dms
+    ]
+
+
+def handwritten_engagement_metrics(transformer: InstagramTransformer, data: InstagramData, metrics: List[Any]) -> List[Any]:
+    return [
+        EngagementMetricRefined(
+            user_id=data.user_id,
+            metric_date=parse_timestamp(metric.date),
+            profile_views=metric.profile_views,
+            reach=metric.reach,
+            impressions=metric.impressions,
+            website_clicks=metric.website_clicks
+        )
+        for metric in metrics
+    ]
+
+
+HANDWRITTEN: Dict[str, Callable[[InstagramTransformer, InstagramData, List[Any]], List[Any]]] = {
+    'posts': handwritten_posts,
+    'stories': handwritten_stories,
+    'comments': handwritten_comments,
+    'direct_messages': handwritten_direct_messages,
+    'engagement_metrics': handwritten_engagement_metrics,
+}
+
+
+def mapped_sections(transformer: InstagramTransformer, data: InstagramData, collection: str,
+                    records: List[Any]) -> List[tuple]:
+    """Row tuples of a collection from the compiled row mappings, as the transformer builds them."""
+    activity = ActivityHistogram(ACTIVITY_KINDS)
+    if collection == 'posts':
+        return list(transformer._create_posts(data, records, activity))
+    if collection == 'engagement_metrics':
+        return [(collection, transformer._create_engagement_metrics(data, records))]
+    create = getattr(transformer, f"_create_{collection}")
+    return [(collection, create(data, records, activity))]
+
+
+def run(data: InstagramData, db_path: str, mapped: bool, batch_size: int) -> Dict[str, Any]:
+    """Build and write every record collection, timing the two phases separately."""
+    transformer = InstagramTransformer(db_path)
+    if not mapped:
+        # Every section then goes through the ORM
+        transformer.row_builders = {}
+    build_seconds = write_seconds = 0.0
+    for collection in HANDWRITTEN:
+        records = getattr(data, collection)
+        gc.collect()
+        started = time.perf_counter()
+        if mapped:
+            sections = mapped_sections(transformer, data, collection, records)
+        else:
+            sections = [(collection, HANDWRITTEN[collection](transformer, data, records))]
+        build_seconds += time.perf_counter() - started
+
+        started = time.perf_counter()
+        transformer._write_sections(sections, '', batch_size)
+        write_seconds += time.perf_counter() - started
+        del sections
+    transformer.engine.dispose()
+    return {'build': build_seconds, 'write': write_seconds, 'checksums': table_checksums(db_path)}
+
+
+# Run with: python -m benchmarks.bench_row_builders --records 1000000
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare hand-written ORM row builders with the compiled row mappings")
+    parser.add_argument('--records', type=int, default=1_000_000, help="Approximate number of records of the export")
+    parser.add_argument('--batch-size', type=int, default=10000)
+    args = parser.parse_args()
+
+    posts = max(int(args.records / RECORDS_PER_POST), 1)
+    started = time.perf_counter()
+    data = InstagramData.model_validate(generate_export(posts))
+    records = sum(len(getattr(data, collection)) for collection in HANDWRITTEN)
+    print(f"{records} records generated and validated in {time.perf_counter() - started:.1f}s")
+
+    with tempfile.TemporaryDirectory() as root:
+        settings.OUTPUT_DIR = root
+        results = {
+            'hand-written (ORM)': run(data, os.path.join(root, 'handwritten.libsql'), False, args.batch_size),
+            'compiled mappings': run(data, os.path.join(root, 'mapped.libsql'), True, args.batch_size),
+        }
+
+    baseline = results['hand-written (ORM)']
+    print(f"{'builders':<22}{'build s':>10}{'write s':>10}{'total s':>10}{'speedup':>10}  tables")
+    for name, result in results.items():
+        total = result['build'] + result['write']
+        identical = "identical" if result['checksums'] == baseline['checksums'] else "DIFFERENT"
+        speedup = (baseline['build'] + baseline['write']) / total
+        print(f"{name:<22}{result['build']:>10.2f}{result['write']:>10.2f}{total:>10.2f}{speedup:>9.2f}x  {identical}")
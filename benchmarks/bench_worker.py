@@ -0,0 +1,98 @@
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List
+
+from benchmarks.offline import warm_up
+from benchmarks.synthetic import write_export
+from refiner.worker import RefinementWorker
+
+
+def _percentile(values: List[float], percentile: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(percentile / 100 * (len(ordered) - 1))))]
+
+
+def _summary(name: str, latencies: List[float], elapsed: float) -> Dict[str, float]:
+    return {
+        'mode': name,
+        'jobs_per_second': len(latencies) / elapsed,
+        'p50_seconds': statistics.median(latencies),
+        'p99_seconds': _percentile(latencies, 99),
+    }
+
+
+def _make_jobs(root: str, jobs: int, posts: int) -> List[Dict[str, str]]:
+    os.makedirs(root)
+    export = write_export(os.path.join(root, 'export.json'), posts)
+    specs = []
+    for i in range(jobs):
+        input_dir = os.path.join(root, f'job_{i}', 'input')
+        os.makedirs(input_dir)
+        shutil.copy(export, input_dir)
+        specs.append({'id': f'job_{i}', 'input_dir': input_dir, 'output_dir': os.path.join(root, f'job_{i}', 'output')})
+    return specs
+
+
+def bench_process_per_job(specs: List[Dict[str, str]], concurrency: int) -> Dict[str, float]:
+    """Run every job as a fresh `python -m` process, `concurrency` at a time."""
+    def run_one(spec, submitted):
+        os.makedirs(spec['output_dir'], exist_ok=True)
+        env = dict(os.environ, INPUT_DIR=spec['input_dir'], OUTPUT_DIR=spec['output_dir'])
+        subprocess.run([sys.executable, '-m', 'benchmarks.offline'], env=env, check=True, capture_output=True)
+        return time.perf_counter() - submitted
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        futures = [executor.submit(run_one, spec, time.perf_counter()) for spec in specs]
+        latencies = [future.result() for future in as_completed(futures)]
+    return _summary('process-per-job', latencies, time.perf_counter() - started)
+
+
+def bench_worker_pool(specs: List[Dict[str, str]], concurrency: int, threads: bool = False) -> Dict[str, float]:
+    """Run every job on a warm `RefinementWorker` pool of `concurrency` processes, or threads of this process."""
+    worker = RefinementWorker(concurrency, initializer=warm_up, threads=threads)
+    # Let the pool start and import the pipeline before timing
+    for future in [worker.pool.submit(warm_up) for _ in range(concurrency)]:
+        future.result()
+
+    submitted = {}
+    started = time.perf_counter()
+    for spec in specs:
+        submitted[worker.submit(dict(spec))] = time.perf_counter()
+    latencies = []
+    for future in as_completed(submitted):
+        result = future.result()
+        if result['status'] != 'completed':
+            raise RuntimeError(result['error'])
+        latencies.append(time.perf_counter() - submitted[future])
+    elapsed = time.perf_counter() - started
+    worker.shutdown()
+    return _summary('worker-threads' if threads else 'worker-pool', latencies, elapsed)
+
+
+# Run with: python -m benchmarks.bench_worker --jobs 40 --posts 100 --concurrency 4
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the warm worker pool, on processes or threads, with one process per job")
+    parser.add_argument('--jobs', type=int, default=40)
+    parser.add_argument('--posts', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        results = [
+            bench_process_per_job(_make_jobs(os.path.join(root, 'process'), args.jobs, args.posts), args.concurrency),
+            bench_worker_pool(_make_jobs(os.path.join(root, 'pool'), args.jobs, args.posts), args.concurrency),
+            bench_worker_pool(_make_jobs(os.path.join(root, 'threads'), args.jobs, args.posts), args.concurrency,
+                              threads=True),
+        ]
+
+    print(f"{'mode':<18}{'jobs/s':>10}{'p50 (s)':>10}{'p99 (s)':>10}")
+    for result in results:
+        print(f"{result['mode']:<18}{result['jobs_per_second']:>10.2f}{result['p50_seconds']:>10.3f}{result['p99_seconds']:>10.3f}")
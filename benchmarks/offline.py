@@ -0,0 +1,36 @@
+from contextlib import contextmanager
+from typing import Iterator
+
+from refiner.config import settings
+from refiner.context import JobContext
+
+
+def use_local_storage() -> None:
+    """Upload to the local content-addressed store so benchmarks run offline."""
+    settings.STORAGE_BACKEND = 'local'
+
+
+@contextmanager
+def job_settings(input_dir: str, output_dir: str) -> Iterator[JobContext]:
+    """
+    Point the settings at a job's directories for the duration of a benchmark run.
+
+    The job gets its own copy of the settings, in effect for the current thread
+    only, so code reading `refiner.config.settings` sees the job's directories.
+    """
+    with JobContext.for_job(input_dir, output_dir).activate() as context:
+        yield context
+
+
+def warm_up() -> None:
+    """Pool initializer for offline benchmark workers."""
+    from refiner.worker import warm_up as warm_up_pipeline
+    warm_up_pipeline()
+    use_local_storage()
+
+
+# Run with: python -m benchmarks.offline  (same as python -m refiner, uploading to the local store)
+if __name__ == "__main__":
+    from refiner.__main__ import run
+    use_local_storage()
+    run()
@@ -0,0 +1,114 @@
+import argparse
+import json
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict
+
+EPOCH = datetime(2022, 1, 1, tzinfo=timezone.utc)
+SPAN_SECONDS = 3 * 365 * 24 * 3600
+
+
+def generate_export(posts: int, seed: int = 1, comments_per_post: float = 1,
+                    dms_per_post: float = 2) -> Dict[str, Any]:
+    """
+    Generate a synthetic Instagram export shaped like input/instagram_sample.json.
+
+    Stories, comments, DMs and engagement metrics scale with the number of posts
+    (0.5x, 1x, 2x and 0.1x respectively, comments and DMs can be changed).
+    """
+    rng = random.Random(seed)
+
+    def timestamp() -> str:
+        moment = EPOCH + timedelta(seconds=rng.randrange(SPAN_SECONDS))
+        return moment.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+    return {
+        "user_id": f"synthetic_user_{seed}",
+        "profile": {
+            "username": "synthetic_user",
+            "full_name": "Synthetic User",
+            "bio": "Generated for benchmarks",
+            "follower_count": 1250,
+            "following_count": 890,
+            "post_count": posts,
+            "is_verified": False,
+            "is_private": False
+        },
+        "posts": [
+            {
+                "post_id": f"post_{i}",
+                "caption": "Generated post #bench",
+                "timestamp": timestamp(),
+                "like_count": rng.randrange(500),
+                "comment_count": rng.randrange(50),
+                "media": [{"media_type": rng.choice(["photo", "video", "carousel"]), "url": f"https://example.com/{i}.jpg"}],
+                "location": rng.choice([None, "Somewhere"]),
+                "hashtags": rng.sample(["bench", "sunset", "coffee", "travel", "nature", "food"], 2)
+            }
+            for i in range(posts)
+        ],
+        "stories": [
+            {
+                "story_id": f"story_{i}",
+                "timestamp": timestamp(),
+                "media_type": rng.choice(["photo", "video"]),
+                "view_count": rng.randrange(1000),
+                "media_url": f"https://example.com/story_{i}.jpg"
+            }
+            for i in range(posts // 2)
+        ],
+        "comments": [
+            {
+                "comment_id": f"comment_{i}",
+                "post_id": f"post_{rng.randrange(max(posts, 1))}",
+                "text": "Nice one!",
+                "timestamp": timestamp(),
+                "like_count": rng.randrange(20),
+                "author_username": f"friend_{rng.randrange(200)}"
+            }
+            for i in range(int(posts * comments_per_post))
+        ],
+        "direct_messages": [
+            {
+                "message_id": f"dm_{i}",
+                "conversation_id": f"conv_{rng.randrange(100)}",
+                "sender_username": (sender := rng.choice(["synthetic_user", "friend"])),
+                "recipient_username": "friend" if sender == "synthetic_user" else "synthetic_user",
+                "message_text": "Hey there",
+                "timestamp": timestamp(),
+                "message_type": rng.choice(["text", "media", "link"])
+            }
+            for i in range(int(posts * dms_per_post))
+        ],
+        "engagement_metrics": [
+            {
+                "date": timestamp(),
+                "profile_views": rng.randrange(100),
+                "reach": rng.randrange(1000),
+                "impressions": rng.randrange(2000),
+                "website_clicks": rng.randrange(10)
+            }
+            for i in range(max(posts // 10, 1))
+        ],
+        "data_export_timestamp": "2025-01-01T00:00:00Z"
+    }
+
+
+def write_export(path: str, posts: int, seed: int = 1, comments_per_post: float = 1,
+                 dms_per_post: float = 2) -> str:
+    """Write a synthetic export to `path`."""
+    with open(path, 'w') as f:
+        json.dump(generate_export(posts, seed, comments_per_post, dms_per_post), f)
+    return path
+
+
+# Run with: python -m benchmarks.synthetic export.json --posts 100000
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic Instagram export")
+    parser.add_argument('path')
+    parser.add_argument('--posts', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--comments-per-post', type=float, default=1)
+    parser.add_argument('--dms-per-post', type=float, default=2)
+    args = parser.parse_args()
+    write_export(args.path, args.posts, args.seed, args.comments_per_post, args.dms_per_post)
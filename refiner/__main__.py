@@ -4,41 +4,53 @@ import os
 import sys
 import traceback
 import zipfile
+from typing import Optional
 
+from refiner.context import JobContext
+from refiner.models.output import Output
 from refiner.refine import Refiner
 from refiner.config import settings
 
 logging.basicConfig(level=logging.INFO, format='%(message)s')
 
 
-def run() -> None:
-    """Transform all input files into the database."""
-    input_files_exist = os.path.isdir(settings.INPUT_DIR) and bool(os.listdir(settings.INPUT_DIR))
+def run(context: Optional[JobContext] = None) -> Output:
+    """
+    Transform all input files into the database.
+
+    Args:
+        context: Settings and directories of the job (defaults to the settings currently in effect)
+    """
+    context = context or JobContext()
+    input_files_exist = os.path.isdir(context.input_dir) and bool(os.listdir(context.input_dir))
 
     if not input_files_exist:
-        raise FileNotFoundError(f"No input files found in {settings.INPUT_DIR}")
-    extract_input()
+        raise FileNotFoundError(f"No input files found in {context.input_dir}")
+    extract_input(context.input_dir)
 
-    refiner = Refiner()
+    refiner = Refiner(context)
     output = refiner.transform()
     
-    output_path = os.path.join(settings.OUTPUT_DIR, "output.json")
+    output_path = context.output_path("output.json")
     with open(output_path, 'w') as f:
         json.dump(output.model_dump(), f, indent=2)    
     logging.info(f"Data transformation complete: {output}")
+    return output
 
 
-def extract_input() -> None:
+def extract_input(input_dir: Optional[str] = None) -> None:
     """
     If the input directory contains any zip files, extract them
+    :param input_dir: Directory of the input files (defaults to INPUT_DIR)
     :return:
     """
-    for input_filename in os.listdir(settings.INPUT_DIR):
-        input_file = os.path.join(settings.INPUT_DIR, input_filename)
+    input_dir = input_dir or settings.INPUT_DIR
+    for input_filename in os.listdir(input_dir):
+        input_file = os.path.join(input_dir, input_filename)
 
         if zipfile.is_zipfile(input_file):
             with zipfile.ZipFile(input_file, 'r') as zip_ref:
-                zip_ref.extractall(settings.INPUT_DIR)
+                zip_ref.extractall(input_dir)
 
 
 if __name__ == "__main__":
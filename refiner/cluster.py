@@ -0,0 +1,368 @@
+import argparse
+import json
+import logging
+import os
+import shutil
+import socket
+import subprocess
+import sys
+from collections import defaultdict
+from concurrent.futures import as_completed
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel
+
+from refiner.models.cluster import ClusterInput, ClusterManifest, ClusterPlan, NodeManifest, NodeResult
+from refiner.models.output import Output
+from refiner.utils.checkpoint import file_sha256
+from refiner.worker import RefinementWorker
+
+logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+PLAN_FILE = "cluster.json"
+MANIFEST_FILE = "manifest.json"
+REDISPATCH_FILE = "redispatch.json"
+NODES_DIR = "nodes"
+JOBS_DIR = "jobs"
+RESULTS_FILE = "results.jsonl"
+
+
+def assign_node(sha256: str, nodes: int) -> int:
+    """Deterministically assign an input to one of `nodes` nodes by its content hash."""
+    return int(sha256, 16) % nodes
+
+
+def plan_cluster(input_dir: str, cluster_dir: str, nodes: int) -> ClusterPlan:
+    """
+    Partition the inputs of a directory across nodes and write the plan to the cluster directory.
+
+    Every file in `input_dir` is one export, refined on its own. The partition only
+    depends on the content of the inputs, so planning the same inputs again yields
+    the same plan; an existing plan for the same inputs is kept as it is.
+
+    Args:
+        input_dir: Directory with the exports, visible to every node at the same path
+        cluster_dir: Shared directory used as the transport between the coordinator and the nodes
+        nodes: Number of nodes
+
+    Returns:
+        The cluster plan
+    """
+    if nodes < 1:
+        raise ValueError("A cluster needs at least one node")
+    input_dir = os.path.abspath(input_dir)
+    inputs = []
+    for name in sorted(os.listdir(input_dir)):
+        path = os.path.join(input_dir, name)
+        if name.startswith('.') or not os.path.isfile(path):
+            continue
+        sha256 = file_sha256(path)
+        inputs.append(ClusterInput(name=name, sha256=sha256, node=assign_node(sha256, nodes)))
+    if not inputs:
+        raise FileNotFoundError(f"No input files found in {input_dir}")
+    plan = ClusterPlan(input_dir=input_dir, nodes=nodes, inputs=inputs)
+
+    plan_path = os.path.join(cluster_dir, PLAN_FILE)
+    if os.path.exists(plan_path):
+        existing = load_plan(cluster_dir)
+        if existing != plan:
+            raise ValueError(f"{cluster_dir} already holds the plan of different inputs or node count")
+        return existing
+    os.makedirs(cluster_dir, exist_ok=True)
+    _write_model(plan_path, plan)
+    logging.info(f"Planned {len(inputs)} inputs across {nodes} nodes in {cluster_dir}")
+    return plan
+
+
+def load_plan(cluster_dir: str) -> ClusterPlan:
+    with open(os.path.join(cluster_dir, PLAN_FILE), 'r') as f:
+        return ClusterPlan.model_validate_json(f.read())
+
+
+def run_node(cluster_dir: str, node: int, processes: Optional[int] = None) -> NodeManifest:
+    """
+    Refine the inputs assigned to a node and write its partial manifest.
+
+    The node refines its slice of the plan, plus any inputs the last merge
+    re-dispatched to it, skipping those it already refined. Every result is
+    appended to the node's journal as soon as its job finishes, so a node that
+    dies still leaves the results of its finished jobs behind. Jobs keep their
+    output directory across attempts, so a re-dispatched job resumes from its
+    checkpoint.
+
+    Args:
+        cluster_dir: Shared cluster directory
+        node: Index of this node
+        processes: Number of jobs run concurrently (defaults to the CPU count)
+
+    Returns:
+        Manifest of the node's results
+    """
+    plan = load_plan(cluster_dir)
+    if not 0 <= node < plan.nodes:
+        raise ValueError(f"Node {node} is not part of a {plan.nodes}-node cluster")
+    started_at = _now()
+    node_dir = os.path.join(cluster_dir, NODES_DIR, str(node))
+    os.makedirs(node_dir, exist_ok=True)
+    journal_path = os.path.join(node_dir, RESULTS_FILE)
+
+    redispatched = set(_load_redispatch(cluster_dir).get(str(node), []))
+    assigned = [item for item in plan.inputs if item.node == node or item.name in redispatched]
+    refined = {name for name, result in _read_journal(journal_path).items() if result.status == 'completed'}
+    pending = [item for item in assigned if item.name not in refined]
+    logging.info(f"Node {node}: {len(assigned)} inputs assigned, {len(pending)} to refine")
+
+    if pending:
+        worker = RefinementWorker(processes)
+        try:
+            futures = {worker.submit(_prepare_job(plan, node_dir, item)): item for item in pending}
+            with open(journal_path, 'a') as journal:
+                for future in as_completed(futures):
+                    result = _node_result(futures[future], node, future.result())
+                    journal.write(result.model_dump_json() + "\n")
+                    journal.flush()
+                    os.fsync(journal.fileno())
+                    logging.info(f"Node {node}: {result.input} {result.status} in {result.duration_seconds:.2f}s")
+        finally:
+            worker.shutdown()
+
+    results = _read_journal(journal_path)
+    assigned_results = [results[item.name] for item in assigned if item.name in results]
+    manifest = NodeManifest(
+        node=node,
+        host=socket.gethostname(),
+        started_at=started_at,
+        finished_at=_now(),
+        completed=sum(result.status == 'completed' for result in assigned_results),
+        failed=sum(result.status == 'failed' for result in assigned_results),
+        results=assigned_results
+    )
+    _write_model(os.path.join(node_dir, MANIFEST_FILE), manifest)
+    return manifest
+
+
+def merge_cluster(cluster_dir: str, reassign: bool = False) -> ClusterManifest:
+    """
+    Combine the results of all nodes into the cluster manifest.
+
+    Results are read from the node journals, so the results of nodes that are
+    still running or died midway are merged too. Inputs without a completed
+    result are reported as missing or failed and re-dispatched to their node;
+    the re-dispatch is written to the cluster directory, where `run_node` picks
+    it up on the node's next run.
+
+    Args:
+        cluster_dir: Shared cluster directory
+        reassign: Re-dispatch the inputs of nodes that never reported to the nodes that did
+
+    Returns:
+        The cluster manifest, also written to the cluster directory
+    """
+    plan = load_plan(cluster_dir)
+    results: Dict[str, NodeResult] = {}
+    node_status = {}
+    for node in range(plan.nodes):
+        node_dir = os.path.join(cluster_dir, NODES_DIR, str(node))
+        journal_path = os.path.join(node_dir, RESULTS_FILE)
+        if os.path.exists(os.path.join(node_dir, MANIFEST_FILE)):
+            node_status[str(node)] = 'finished'
+        elif os.path.exists(journal_path):
+            node_status[str(node)] = 'partial'
+        else:
+            node_status[str(node)] = 'missing'
+            continue
+        for name, result in _read_journal(journal_path).items():
+            # A completed result wins over failures of the same input on other nodes
+            if name not in results or (results[name].status != 'completed' and result.status == 'completed'):
+                results[name] = result
+
+    reporting = [int(node) for node, status in node_status.items() if status != 'missing']
+    missing, failed = [], []
+    redispatch = defaultdict(list)
+    for item in plan.inputs:
+        result = results.get(item.name)
+        if result is not None and result.status == 'completed':
+            continue
+        (missing if result is None else failed).append(item.name)
+        node = item.node
+        if reassign and node_status[str(node)] == 'missing' and reporting:
+            node = reporting[assign_node(item.sha256, len(reporting))]
+        redispatch[str(node)].append(item.name)
+
+    manifest = ClusterManifest(
+        nodes=plan.nodes,
+        complete=not missing and not failed,
+        node_status=node_status,
+        results=[results[item.name] for item in plan.inputs if item.name in results],
+        missing=missing,
+        failed=failed,
+        redispatch=dict(redispatch)
+    )
+    _write_model(os.path.join(cluster_dir, MANIFEST_FILE), manifest)
+    redispatch_path = os.path.join(cluster_dir, REDISPATCH_FILE)
+    if manifest.redispatch:
+        _write_json(redispatch_path, manifest.redispatch)
+    elif os.path.exists(redispatch_path):
+        os.remove(redispatch_path)
+    logging.info(
+        f"Merged {len(manifest.results)} results: {len(plan.inputs) - len(missing) - len(failed)} completed, "
+        f"{len(failed)} failed, {len(missing)} missing"
+    )
+    return manifest
+
+
+def run_local(input_dir: str, cluster_dir: str, nodes: int, processes: Optional[int] = None,
+              retries: int = 1) -> ClusterManifest:
+    """
+    Run a whole cluster on this host, with one local process standing in for each node.
+
+    Args:
+        input_dir: Directory with the exports
+        cluster_dir: Shared cluster directory
+        nodes: Number of node processes
+        processes: Concurrent jobs per node
+        retries: How many times missing and failed inputs are re-dispatched
+
+    Returns:
+        The final cluster manifest
+    """
+    plan_cluster(input_dir, cluster_dir, nodes)
+    to_run = list(range(nodes))
+    for attempt in range(retries + 1):
+        command = [sys.executable, '-m', 'refiner.cluster', 'node', cluster_dir]
+        if processes:
+            command += ['--processes', str(processes)]
+        node_processes = [subprocess.Popen(command + ['--node', str(node)]) for node in to_run]
+        for node_process in node_processes:
+            node_process.wait()
+
+        manifest = merge_cluster(cluster_dir, reassign=True)
+        if manifest.complete:
+            break
+        to_run = sorted(int(node) for node in manifest.redispatch)
+        if attempt < retries:
+            logging.info(f"Re-dispatching {len(manifest.missing) + len(manifest.failed)} inputs to nodes {to_run}")
+    return manifest
+
+
+def _prepare_job(plan: ClusterPlan, node_dir: str, item: ClusterInput) -> Dict[str, str]:
+    """Create the directories of an input's job, with the input linked into its own input directory."""
+    job_dir = os.path.join(node_dir, JOBS_DIR, item.name)
+    input_dir = os.path.join(job_dir, 'input')
+    shutil.rmtree(input_dir, ignore_errors=True)  # Drop files extracted by an earlier attempt
+    os.makedirs(input_dir)
+    source = os.path.join(plan.input_dir, item.name)
+    target = os.path.join(input_dir, item.name)
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copyfile(source, target)  # Inputs on another filesystem than the cluster directory
+    return {'id': item.name, 'input_dir': input_dir, 'output_dir': os.path.join(job_dir, 'output')}
+
+
+def _node_result(item: ClusterInput, node: int, result: Dict) -> NodeResult:
+    """Turn a worker job result into the node's record of an input."""
+    output = proof = cid = None
+    status, error = result['status'], result.get('error')
+    if status == 'completed':
+        output = Output.model_validate(result['output'])
+        if output.refinement_url:
+            cid = output.refinement_url.rstrip('/').rsplit('/', 1)[-1]
+        else:
+            status, error = 'failed', "No input file could be transformed"
+        proof_path = os.path.join(result['output_dir'], 'proof.json')
+        if os.path.exists(proof_path):
+            with open(proof_path, 'r') as f:
+                proof = json.load(f)
+    return NodeResult(
+        input=item.name,
+        sha256=item.sha256,
+        node=node,
+        status=status,
+        cid=cid,
+        output=output,
+        proof=proof,
+        error=error,
+        duration_seconds=result['duration_seconds'],
+        finished_at=_now()
+    )
+
+
+def _read_journal(journal_path: str) -> Dict[str, NodeResult]:
+    """Read the latest result of every input from a node journal, ignoring a torn last line."""
+    results = {}
+    if not os.path.exists(journal_path):
+        return results
+    with open(journal_path, 'r') as f:
+        for line in f:
+            try:
+                result = NodeResult.model_validate_json(line)
+            except ValueError:
+                continue
+            results[result.input] = result
+    return results
+
+
+def _load_redispatch(cluster_dir: str) -> Dict[str, List[str]]:
+    path = os.path.join(cluster_dir, REDISPATCH_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def _write_model(path: str, model: BaseModel) -> None:
+    _write_json(path, model.model_dump())
+
+
+def _write_json(path: str, data) -> None:
+    """Write a file of the shared directory atomically, so readers never see it half-written."""
+    with open(f"{path}.tmp", 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(f"{path}.tmp", path)
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+# Run with: python -m refiner.cluster local input/ cluster/ --nodes 3
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Partition refinement jobs across nodes sharing a directory")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    plan_parser = commands.add_parser('plan', help="Partition the inputs across nodes")
+    plan_parser.add_argument('input_dir')
+    plan_parser.add_argument('cluster_dir')
+    plan_parser.add_argument('--nodes', type=int, required=True)
+
+    node_parser = commands.add_parser('node', help="Refine the inputs assigned to one node")
+    node_parser.add_argument('cluster_dir')
+    node_parser.add_argument('--node', type=int, required=True)
+    node_parser.add_argument('--processes', type=int, default=None, help="Concurrent jobs (defaults to the CPU count)")
+
+    merge_parser = commands.add_parser('merge', help="Merge the node manifests and re-dispatch missing inputs")
+    merge_parser.add_argument('cluster_dir')
+    merge_parser.add_argument('--reassign', action='store_true',
+                              help="Re-dispatch the inputs of nodes that never reported to the other nodes")
+
+    local_parser = commands.add_parser('local', help="Run every node as a local process")
+    local_parser.add_argument('input_dir')
+    local_parser.add_argument('cluster_dir')
+    local_parser.add_argument('--nodes', type=int, required=True)
+    local_parser.add_argument('--processes', type=int, default=None, help="Concurrent jobs per node")
+    local_parser.add_argument('--retries', type=int, default=1)
+    args = parser.parse_args()
+
+    if args.command == 'plan':
+        plan_cluster(args.input_dir, args.cluster_dir, args.nodes)
+    elif args.command == 'node':
+        manifest = run_node(args.cluster_dir, args.node, args.processes)
+        sys.exit(1 if manifest.failed else 0)
+    else:
+        if args.command == 'merge':
+            manifest = merge_cluster(args.cluster_dir, args.reassign)
+        else:
+            manifest = run_local(args.input_dir, args.cluster_dir, args.nodes, args.processes, args.retries)
+        sys.exit(0 if manifest.complete else 1)
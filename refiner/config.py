@@ -1,6 +1,8 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
 from pydantic_settings import BaseSettings
 from pydantic import Field
-from typing import Optional
+from typing import Any, Iterator, Optional
 
 class Settings(BaseSettings):
     """Global settings configuration using environment variables"""
@@ -20,6 +22,101 @@ class Settings(BaseSettings):
         description="Key to symmetrically encrypt the refinement. This is derived from the original file encryption key"
     )
     
+    REFINEMENT_COMPRESSION: str = Field(
+        default="pgp",
+        description="Compression applied before encrypting the refinement: 'pgp' (zlib inside the PGP message), 'none', 'zlib' or 'zstd'"
+    )
+    
+    REFINEMENT_COMPRESSION_LEVEL: Optional[int] = Field(
+        default=None,
+        description="Compression level for the 'zlib' and 'zstd' codecs (defaults to the codec's default level)"
+    )
+    
+    COMPRESSION_THREADS: Optional[int] = Field(
+        default=None,
+        description="Number of threads compressing chunks in parallel (defaults to the CPU count)"
+    )
+    
+    REFINEMENT_IN_MEMORY: bool = Field(
+        default=False,
+        description="Build the refinement in an in-memory SQLite database serialized straight into compression and encryption, so the plaintext database is never written to disk; disables the checkpoint, and shards and Parquet files are still written"
+    )
+    
+    DUPLICATE_POLICY: str = Field(
+        default="drop",
+        description="Handling of records whose primary key was already ingested: 'drop' (keep the first occurrence and count the rest) or 'error'"
+    )
+    
+    DROP_ORPHANS: bool = Field(
+        default=False,
+        description="Leave comments on posts missing from the export, and direct messages the profile user neither sent nor received, out of the refinement; orphans are counted in the proof either way"
+    )
+    
+    CHECKPOINT_INTERVAL: int = Field(
+        default=10000,
+        description="Records committed per transaction, with a checkpoint a restarted job resumes from, removed once the job completes; 0 saves everything in a single transaction without a checkpoint"
+    )
+    
+    EXECUTION_MODE: str = Field(
+        default="auto",
+        description="How inputs are read: 'auto' (planned from input sizes and the memory budget), 'memory' (load each input whole) or 'streaming' (read inputs in batches)"
+    )
+    
+    MEMORY_BUDGET: Optional[int] = Field(
+        default=None,
+        description="Memory in MiB the refinement may use when planning the execution mode (defaults to half of the container's memory limit)"
+    )
+    
+    REFINED_TABLES: Optional[str] = Field(
+        default=None,
+        description="Comma-separated refined tables to produce, tables they reference are always included (defaults to all); input sections no produced table needs are not parsed"
+    )
+    
+    RECORDS_SINCE: Optional[str] = Field(
+        default=None,
+        description="ISO 8601 date or timestamp, older records are dropped while parsing"
+    )
+    
+    RECORDS_UNTIL: Optional[str] = Field(
+        default=None,
+        description="ISO 8601 date or timestamp, records from then on are dropped while parsing"
+    )
+    
+    RECORDS_MAX_AGE_DAYS: Optional[int] = Field(
+        default=None,
+        description="Drop records older than this many days before the export timestamp while parsing"
+    )
+    
+    BUILD_PROCESSES: int = Field(
+        default=1,
+        description="Worker processes building the tables of an input in parallel, each into its own SQLite file merged into the refinement afterwards; 1 builds everything through a single connection"
+    )
+    
+    OUTPUT_SHARDING: str = Field(
+        default="none",
+        description="Split the refinement into time-partitioned shards: 'none', 'year' or 'quarter'"
+    )
+    
+    DELTA_BASE: Optional[str] = Field(
+        default=None,
+        description="CID, gateway URL or path of the previous refinement (a database or a delta manifest); the refinement is then uploaded as a delta against it, with a manifest pointing at the base. Ignored when sharding"
+    )
+    
+    OUTPUT_PARQUET: bool = Field(
+        default=False,
+        description="Also export every refined table as an encrypted Parquet file (requires pyarrow)"
+    )
+    
+    PARQUET_COMPRESSION: str = Field(
+        default="zstd",
+        description="Compression codec of the Parquet files: 'zstd', 'snappy', 'gzip', 'lz4', 'brotli' or 'none'"
+    )
+    
+    PARQUET_ROW_GROUP_SIZE: int = Field(
+        default=65536,
+        description="Number of rows per Parquet row group, rows are read from the refinement one row group at a time"
+    )
+    
     SCHEMA_NAME: str = Field(
         default="Google Drive Analytics",
         description="Name of the schema"
@@ -40,6 +137,21 @@ class Settings(BaseSettings):
         description="Dialect of the schema"
     )
     
+    STORAGE_BACKEND: str = Field(
+        default="pinata",
+        description="Where artifacts are uploaded: 'pinata', 'local' (content-addressed store in LOCAL_STORE_DIR) or 'stub' (in-process server speaking the Pinata API)"
+    )
+    
+    STORAGE_CACHE: bool = Field(
+        default=False,
+        description="Keep uploaded artifacts in LOCAL_STORE_DIR as well, identical artifacts are then never uploaded twice"
+    )
+    
+    LOCAL_STORE_DIR: Optional[str] = Field(
+        default=None,
+        description="Directory of the local content-addressed store (defaults to a 'store' directory in OUTPUT_DIR)"
+    )
+    
     # Optional, required if using https://pinata.cloud (IPFS pinning service)
     PINATA_API_KEY: Optional[str] = Field(
         default=None,
@@ -51,6 +163,36 @@ class Settings(BaseSettings):
         description="Pinata API secret"
     )
 
+    PINATA_API_URL: str = Field(
+        default="https://api.pinata.cloud",
+        description="Base URL of the Pinata API, can point to a compatible stub for offline runs"
+    )
+
+    IPFS_CID_VERSION: int = Field(
+        default=0,
+        description="CID version used when pinning files (0 or 1), local CIDs are precomputed with the same layout"
+    )
+
+    IPFS_PIN_INDEX: Optional[str] = Field(
+        default=None,
+        description="Path of a JSON index of already pinned content, uploads of indexed content are skipped"
+    )
+
+    IPFS_CHECK_REMOTE_PINS: bool = Field(
+        default=False,
+        description="Ask the pinning service whether a precomputed CID is already pinned before uploading it"
+    )
+
+    QUERY_CACHE_DIR: Optional[str] = Field(
+        default=None,
+        description="Directory where refiner.query caches decrypted refinements by CID, readable by the current user only (defaults to ~/.cache/refiner-query)"
+    )
+
+    QUERY_CACHE_SIZE: int = Field(
+        default=1024,
+        description="Size limit in MiB of the refiner.query cache, least recently used refinements are evicted first; 0 disables it"
+    )
+
     IPFS_GATEWAY_URL: str = Field(
         default="https://gateway.pinata.cloud/ipfs",
         description="IPFS gateway URL for accessing uploaded files. Recommended to use own dedicated gateway to avoid congestion and rate limiting. Example: 'https://ipfs.my-dao.org/ipfs' (Note: won't work for third-party files)"
@@ -60,4 +202,42 @@ class Settings(BaseSettings):
         env_file = ".env"
         case_sensitive = True
 
-settings = Settings() 
\ No newline at end of file
+
+# Settings of the job running in the current thread or task, None outside a job
+_job_settings: ContextVar[Optional[Settings]] = ContextVar('job_settings', default=None)
+
+
+class CurrentSettings:
+    """
+    The settings of the job running in the current thread or task, or the process-wide defaults outside a job.
+
+    Reads and writes go to the job's own `Settings` while one is active (see use_settings),
+    so jobs running concurrently in one process never see each other's directories, keys,
+    backend or limits.
+    """
+
+    def __init__(self, defaults: Settings):
+        object.__setattr__(self, '_defaults', defaults)
+
+    def current(self) -> Settings:
+        """The `Settings` reads and writes currently go to."""
+        return _job_settings.get() or self._defaults
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.current(), name)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        setattr(self.current(), name, value)
+
+
+@contextmanager
+def use_settings(job_settings: Settings) -> Iterator[Settings]:
+    """Make a job's settings those of the current thread or task until the block exits."""
+    token = _job_settings.set(job_settings)
+    try:
+        yield job_settings
+    finally:
+        _job_settings.reset(token)
+
+
+settings = CurrentSettings(Settings())
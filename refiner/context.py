@@ -0,0 +1,85 @@
+import functools
+import os
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, Optional, TypeVar
+
+from refiner.config import Settings, settings, use_settings
+
+T = TypeVar('T')
+
+
+class JobContext:
+    """
+    Everything a refinement job runs with: its settings and where its inputs and outputs live.
+
+    Every job owns a copy of the settings, so several jobs can run in one process,
+    on threads of their own, without overwriting each other's database, schema,
+    proof or output files. The pipeline is handed the context explicitly; the
+    helpers it calls read `refiner.config.settings`, which resolves to the
+    settings of the context active in the current thread (see activate).
+    """
+
+    def __init__(self, job_settings: Optional[Settings] = None):
+        """
+        Args:
+            job_settings: Settings of the job (defaults to the settings currently in effect, shared with the caller)
+        """
+        self.settings = job_settings or settings.current()
+
+    @classmethod
+    def for_job(cls, input_dir: Optional[str] = None, output_dir: Optional[str] = None, **overrides: Any) -> "JobContext":
+        """
+        Create a context with its own copy of the settings currently in effect.
+
+        Args:
+            input_dir: Directory of the job's input files (defaults to INPUT_DIR)
+            output_dir: Directory the job writes to (defaults to OUTPUT_DIR)
+            overrides: Other settings of the job, by setting name
+        """
+        if input_dir is not None:
+            overrides['INPUT_DIR'] = input_dir
+        if output_dir is not None:
+            overrides['OUTPUT_DIR'] = output_dir
+        return cls(settings.current().model_copy(update=overrides))
+
+    @property
+    def input_dir(self) -> str:
+        return self.settings.INPUT_DIR
+
+    @property
+    def output_dir(self) -> str:
+        return self.settings.OUTPUT_DIR
+
+    def output_path(self, name: str) -> str:
+        """Path of a file or directory of the job's output."""
+        return os.path.join(self.settings.OUTPUT_DIR, name)
+
+    @property
+    def database_path(self) -> str:
+        return self.output_path('db.libsql')
+
+    @property
+    def schema_path(self) -> str:
+        return self.output_path('schema.json')
+
+    @property
+    def proof_path(self) -> str:
+        return self.output_path('proof.json')
+
+    @property
+    def manifest_path(self) -> str:
+        return self.output_path('manifest.json')
+
+    @contextmanager
+    def activate(self) -> Iterator["JobContext"]:
+        """Run the block with this job's settings in effect for the current thread."""
+        with use_settings(self.settings):
+            yield self
+
+    def bind(self, function: Callable[..., T]) -> Callable[..., T]:
+        """Wrap a function to run with this job's settings in effect, e.g. on the threads of an executor."""
+        @functools.wraps(function)
+        def bound(*args, **kwargs) -> T:
+            with self.activate():
+                return function(*args, **kwargs)
+        return bound
@@ -0,0 +1,134 @@
+import argparse
+import io
+import json
+import logging
+import os
+import time
+import traceback
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict
+from urllib.parse import parse_qs, urlsplit
+
+from refiner.config import settings
+from refiner.context import JobContext
+from refiner.utils.reader import JSON_ERRORS
+from refiner.utils.stream import CHUNK_SIZE, ChunkedBody, LimitedBody
+
+logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+
+def ingest_upload(stream: io.BufferedIOBase, name: str, output_dir: str) -> Dict[str, Any]:
+    """
+    Refine an upload into its own output directory while it is read.
+
+    Args:
+        stream: Binary stream of the upload, a JSON export or a zip archive of exports
+        name: Name of the upload
+        output_dir: Directory the database, proof and output.json are written to
+
+    Returns:
+        The `Output` of the refinement
+    """
+    from refiner.refine import Refiner
+
+    os.makedirs(output_dir, exist_ok=True)
+    context = JobContext.for_job(output_dir=output_dir)
+    output = Refiner(context, resumable=False).transform_stream(stream, name)
+    with open(context.output_path("output.json"), 'w') as f:
+        json.dump(output.model_dump(), f, indent=2)
+    return output.model_dump()
+
+
+def serve(port: int, output_root: str, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """
+    Create an HTTP server refining exports uploaded as `POST /ingest?name=<file name>`.
+
+    The body is a JSON export or a zip archive, sent with a Content-Length or
+    chunked. It is decompressed, parsed and transformed as it arrives, and the
+    response, sent once the upload is complete, holds the `Output` of the
+    refinement. Uploads are refined concurrently, each on its own thread with
+    its own JobContext, into its own directory under `output_root`.
+    """
+
+    class IngestHandler(BaseHTTPRequestHandler):
+        # HTTP/1.1 for chunked bodies and `Expect: 100-continue`
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            if self.path == '/health':
+                self._respond(200, {'status': 'ok'})
+            else:
+                self._respond(404, {'error': 'Not found'})
+
+        def do_POST(self):
+            url = urlsplit(self.path)
+            if url.path != '/ingest':
+                self._respond(404, {'error': 'Not found'}, close=True)
+                return
+            if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+                body = ChunkedBody(self.rfile)
+            elif self.headers.get('Content-Length') is not None:
+                body = LimitedBody(self.rfile, int(self.headers['Content-Length']))
+            else:
+                self._respond(411, {'error': 'Content-Length or chunked Transfer-Encoding required'}, close=True)
+                return
+
+            stream = io.BufferedReader(body, CHUNK_SIZE)
+            name = os.path.basename(parse_qs(url.query).get('name', ['upload.json'])[0]) or 'upload.json'
+            result = {'id': uuid.uuid4().hex, 'name': name}
+            result['output_dir'] = os.path.join(output_root, result['id'])
+            started = time.perf_counter()
+            try:
+                result['output'] = ingest_upload(stream, name, result['output_dir'])
+                # Whatever follows the document, e.g. trailing whitespace, is still part of the body
+                while stream.read(CHUNK_SIZE):
+                    pass
+            except JSON_ERRORS as e:
+                logging.error(f"Upload {result['id']} rejected: {e}")
+                self._respond(400, {**result, 'status': 'rejected', 'error': str(e)}, close=True)
+                return
+            except Exception as e:
+                logging.error(f"Upload {result['id']} failed: {e}")
+                self._respond(500, {**result, 'status': 'failed', 'error': str(e),
+                                    'traceback': traceback.format_exc()}, close=True)
+                return
+            result.update(status='completed', duration_seconds=time.perf_counter() - started)
+            logging.info(f"Upload {result['id']} ({name}) refined in {result['duration_seconds']:.2f}s")
+            self._respond(200, result)
+
+        def _respond(self, status: int, body: Dict[str, Any], close: bool = False) -> None:
+            """Send a JSON response; close the connection when the request body may not have been read."""
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            if close:
+                self.send_header('Connection', 'close')
+                self.close_connection = True
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            logging.debug(format % args)
+
+    server = ThreadingHTTPServer((host, port), IngestHandler)
+    logging.info(f"Accepting uploads on http://{host}:{server.server_port}/ingest")
+    return server
+
+
+# Run with: python -m refiner.ingest --port 8081 --output-dir ingested
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Refine exports uploaded over HTTP while they arrive")
+    parser.add_argument('--port', type=int, required=True, help="Port of the localhost HTTP endpoint")
+    parser.add_argument('--host', default="127.0.0.1", help="Address to listen on")
+    parser.add_argument('--output-dir', default=settings.OUTPUT_DIR, help="Directory the output of every upload goes under")
+    args = parser.parse_args()
+
+    server = serve(args.port, args.output_dir, args.host)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,51 @@
+from typing import Any, Dict, List, Optional
+from pydantic import BaseModel
+
+from refiner.models.output import Output
+
+
+class ClusterInput(BaseModel):
+    name: str
+    sha256: str
+    node: int
+
+
+class ClusterPlan(BaseModel):
+    version: int = 1
+    input_dir: str
+    nodes: int
+    inputs: List[ClusterInput]
+
+
+class NodeResult(BaseModel):
+    input: str
+    sha256: str
+    node: int
+    status: str  # completed or failed
+    cid: Optional[str] = None
+    output: Optional[Output] = None
+    proof: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    duration_seconds: float = 0.0
+    finished_at: str
+
+
+class NodeManifest(BaseModel):
+    node: int
+    host: str
+    started_at: str
+    finished_at: str
+    completed: int
+    failed: int
+    results: List[NodeResult]
+
+
+class ClusterManifest(BaseModel):
+    version: int = 1
+    nodes: int
+    complete: bool
+    node_status: Dict[str, str]  # finished, partial (no node manifest yet) or missing (never reported)
+    results: List[NodeResult]
+    missing: List[str]
+    failed: List[str]
+    redispatch: Dict[str, List[str]]  # Inputs to run again, by node
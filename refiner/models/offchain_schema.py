@@ -1,3 +1,4 @@
+from typing import Dict, List, Optional
 from pydantic import BaseModel
 
 class OffChainSchema(BaseModel):
@@ -5,4 +6,5 @@ class OffChainSchema(BaseModel):
     version: str
     description: str
     dialect: str
-    schema: str
\ No newline at end of file
+    schema: str
+    parquet_schema: Optional[Dict[str, List[str]]] = None  # Arrow schema of the Parquet file of every table
@@ -1,8 +1,12 @@
-from typing import Optional
+from typing import Dict, Optional
 from pydantic import BaseModel
 
 from refiner.models.offchain_schema import OffChainSchema
+from refiner.models.plan import ExecutionPlan
 
 class Output(BaseModel):
     refinement_url: Optional[str] = None
-    schema: Optional[OffChainSchema] = None
\ No newline at end of file
+    schema: Optional[OffChainSchema] = None
+    plan: Optional[ExecutionPlan] = None
+    parquet_urls: Optional[Dict[str, str]] = None  # URL of the encrypted Parquet file of every table
+
@@ -0,0 +1,12 @@
+from typing import Optional
+from pydantic import BaseModel
+
+class ExecutionPlan(BaseModel):
+    mode: str  # "memory" or "streaming"
+    reason: str
+    input_bytes: int
+    largest_input_bytes: int
+    estimated_peak_bytes: int  # Of the in-memory path for the largest input
+    memory_budget_bytes: Optional[int] = None
+    memory_limit_bytes: Optional[int] = None
+    batch_size: int  # Records per commit, and per batch when streaming
@@ -22,6 +22,25 @@ class InstagramProof(BaseModel):
     total_stories: int
     total_comments: int
     total_dms: int
+    duplicates_dropped: Optional[Dict[str, int]] = None  # Tekrarlanan ID'ler nedeniyle atılan kayıtlar (tablo başına)
+    
+    # Tahmini istatistikler: farklı yorumcu/konuşma sayıları (HyperLogLog) ve dağılımlar (KLL, ör. "posts.like_count": {"p50": ...})
+    # sketches, aynı kullanıcının farklı export'larının istatistiklerini birleştirmek için saklanır (refiner.utils.sketches.load_sketch)
+    distinct_commenters: Optional[int] = None
+    distinct_conversations: Optional[int] = None
+    quantiles: Optional[Dict[str, Dict[str, float]]] = None
+    sketches: Optional[Dict[str, Dict[str, Any]]] = None
+    
+    # Referans bütünlüğü: kontrol edilen yorum/mesaj sayıları, export'ta olmayan gönderilere yapılan yorumlar,
+    # profil kullanıcısının göndermediği ve almadığı mesajlar ve karşı tarafı değişen konuşmalar
+    # (refiner.utils.integrity.INTEGRITY_COUNTS); orphans_dropped ise bu kayıtlar refinement'a yazılmamıştır
+    integrity: Optional[Dict[str, int]] = None
+    orphans_dropped: bool = False
+    
+    # Kapsam: ayarlandığında sayılar ve hash'ler yalnızca bu tablolar için okunan, bu zaman aralığındaki kayıtları kapsar
+    refined_tables: Optional[List[str]] = None
+    records_since: Optional[str] = None
+    records_until: Optional[str] = None
     
     # Hesap doğrulama
     account_creation_estimate: Optional[str] = None
@@ -47,4 +66,14 @@ class InstagramProof(BaseModel):
     class Config:
         json_encoders = {
             datetime: lambda v: v.isoformat()
-        }
\ No newline at end of file
+        }
+
+class CombinedProof(BaseModel):
+    """
+    Birden çok export'tan oluşan bir refinement'ın proof'u.
+    Her export'un proof'u, refinement'a işlendiği sırayla, girdi adıyla tutulur. duplicates_dropped
+    bir export'ta tekrarlanan ve daha önceki export'ların zaten yazdığı kayıtları birlikte sayar.
+    """
+    
+    proof_type: str = "combined"
+    proofs: Dict[str, InstagramProof]
@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import Column, String, Integer, Float, Boolean, Text, ForeignKey, DateTime
+from sqlalchemy import DDL, Column, String, Integer, Float, Boolean, Text, ForeignKey, DateTime, event, inspect
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 
@@ -20,6 +20,12 @@ class UserProfileRefined(Base):
     is_private = Column(Boolean, default=False)
     account_age_days = Column(Integer, nullable=True)
     data_export_date = Column(DateTime, nullable=False)
+    # Streaming estimates over the records of the export (HyperLogLog / KLL sketches)
+    distinct_commenters = Column(Integer, nullable=True)
+    distinct_conversations = Column(Integer, nullable=True)
+    median_post_likes = Column(Float, nullable=True)
+    median_story_views = Column(Float, nullable=True)
+    median_engagement_rate = Column(Float, nullable=True)
     
     posts = relationship("PostRefined", back_populates="user")
     stories = relationship("StoryRefined", back_populates="user")
@@ -43,12 +49,24 @@ class PostRefined(Base):
     user = relationship("UserProfileRefined", back_populates="posts")
     media_items = relationship("MediaRefined", back_populates="post")
 
+class MediaTypeRefined(Base):
+    __tablename__ = 'media_types'
+    
+    media_type_id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False, unique=True)  # photo, video, carousel
+
+class MessageTypeRefined(Base):
+    __tablename__ = 'message_types'
+    
+    message_type_id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False, unique=True)  # text, media, link
+
 class MediaRefined(Base):
     __tablename__ = 'media'
     
     media_id = Column(Integer, primary_key=True, autoincrement=True)
     post_id = Column(String, ForeignKey('posts.post_id'), nullable=False)
-    media_type = Column(String, nullable=False)  # photo, video, carousel
+    media_type_id = Column(Integer, ForeignKey('media_types.media_type_id'), nullable=False)
     
     post = relationship("PostRefined", back_populates="media_items")
 
@@ -58,7 +76,7 @@ class StoryRefined(Base):
     story_id = Column(String, primary_key=True)
     user_id = Column(String, ForeignKey('user_profiles.user_id'), nullable=False)
     story_date = Column(DateTime, nullable=False)
-    media_type = Column(String, nullable=False)
+    media_type_id = Column(Integer, ForeignKey('media_types.media_type_id'), nullable=False)
     view_count = Column(Integer, nullable=False)
     
     user = relationship("UserProfileRefined", back_populates="stories")
@@ -84,7 +102,7 @@ class DirectMessageRefined(Base):
     conversation_id_hash = Column(String, nullable=False)  # Hashed for privacy
     message_length = Column(Integer, nullable=True)  # Length instead of actual message
     message_date = Column(DateTime, nullable=False)
-    message_type = Column(String, nullable=False)
+    message_type_id = Column(Integer, ForeignKey('message_types.message_type_id'), nullable=False)
     is_sender = Column(Boolean, nullable=False)  # True if user sent, False if received
 
 class EngagementMetricRefined(Base):
@@ -120,4 +138,89 @@ class ActivityPatternRefined(Base):
     post_count = Column(Integer, default=0)
     story_count = Column(Integer, default=0)
     comment_count = Column(Integer, default=0)
-    dm_count = Column(Integer, default=0)
\ No newline at end of file
+    dm_count = Column(Integer, default=0)
+
+# Known categories get fixed codes in every refinement, values outside them are added as they appear
+MEDIA_TYPES = ('photo', 'video', 'carousel')
+MESSAGE_TYPES = ('text', 'media', 'link')
+
+def _seed(table: str, key: str, names) -> DDL:
+    values = ", ".join(f"({code}, '{name}')" for code, name in enumerate(names, start=1))
+    return DDL(f"INSERT INTO {table} ({key}, name) VALUES {values}")
+
+event.listen(MediaTypeRefined.__table__, 'after_create', _seed('media_types', 'media_type_id', MEDIA_TYPES))
+event.listen(MessageTypeRefined.__table__, 'after_create', _seed('message_types', 'message_type_id', MESSAGE_TYPES))
+
+# Views exposing the categorical columns as text, with the columns of the tables before they were coded,
+# and the tables each view reads
+COMPATIBILITY_VIEWS = {
+    'media_view': (
+        ('media', 'media_types'),
+        "SELECT media.media_id, media.post_id, media_types.name AS media_type "
+        "FROM media JOIN media_types ON media_types.media_type_id = media.media_type_id"
+    ),
+    'stories_view': (
+        ('stories', 'media_types'),
+        "SELECT stories.story_id, stories.user_id, stories.story_date, media_types.name AS media_type, "
+        "stories.view_count "
+        "FROM stories JOIN media_types ON media_types.media_type_id = stories.media_type_id"
+    ),
+    'direct_messages_view': (
+        ('direct_messages', 'message_types'),
+        "SELECT direct_messages.message_id, direct_messages.user_id, direct_messages.conversation_id_hash, "
+        "direct_messages.message_length, direct_messages.message_date, message_types.name AS message_type, "
+        "direct_messages.is_sender "
+        "FROM direct_messages JOIN message_types ON message_types.message_type_id = direct_messages.message_type_id"
+    ),
+}
+
+
+def _tables_exist(names):
+    """Condition a DDL on all of the named tables existing, transformers may only create some of them."""
+    def tables_exist(ddl, target, bind, **kw):
+        inspector = inspect(bind)
+        return all(inspector.has_table(name) for name in names)
+    return tables_exist
+
+for view_name, (view_tables, select) in COMPATIBILITY_VIEWS.items():
+    event.listen(
+        Base.metadata, 'after_create',
+        DDL(f"CREATE VIEW IF NOT EXISTS {view_name} AS {select}").execute_if(callable_=_tables_exist(view_tables))
+    )
+
+# Google user models, kept on their own declarative base so their tables are only
+# created in databases that actually hold user data
+UserBase = declarative_base()
+
+class UserRefined(UserBase):
+    __tablename__ = 'users'
+    
+    user_id = Column(String, primary_key=True)
+    email = Column(String, nullable=False)  # Local part is masked for privacy
+    name = Column(String, nullable=False)
+    locale = Column(String, nullable=False)
+    created_at = Column(DateTime, nullable=False)
+    
+    storage_metrics = relationship("StorageMetric", back_populates="user")
+    auth_sources = relationship("AuthSource", back_populates="user")
+
+class StorageMetric(UserBase):
+    __tablename__ = 'storage_metrics'
+    
+    metric_id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(String, ForeignKey('users.user_id'), nullable=False)
+    percent_used = Column(Float, nullable=False)
+    recorded_at = Column(DateTime, nullable=False)
+    
+    user = relationship("UserRefined", back_populates="storage_metrics")
+
+class AuthSource(UserBase):
+    __tablename__ = 'auth_sources'
+    
+    auth_id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(String, ForeignKey('users.user_id'), nullable=False)
+    source = Column(String, nullable=False)
+    collection_date = Column(DateTime, nullable=False)
+    data_type = Column(String, nullable=False)
+    
+    user = relationship("UserRefined", back_populates="auth_sources")
\ No newline at end of file
@@ -1,7 +1,11 @@
-from typing import Optional, List
-from pydantic import BaseModel
+import sys
+from typing import Annotated, Optional, List
+from pydantic import AfterValidator, BaseModel
 from datetime import datetime
 
+# Low-cardinality values repeated on many records share a single interned str
+Category = Annotated[str, AfterValidator(sys.intern)]
+
 
 class InstagramProfile(BaseModel):
     username: str
@@ -15,7 +19,7 @@ class InstagramProfile(BaseModel):
     profile_pic_url: Optional[str] = None
 
 class PostMedia(BaseModel):
-    media_type: str  # photo, video, carousel
+    media_type: Category  # photo, video, carousel
     url: str
     thumbnail_url: Optional[str] = None
 
@@ -32,7 +36,7 @@ class InstagramPost(BaseModel):
 class InstagramStory(BaseModel):
     story_id: str
     timestamp: str
-    media_type: str  # photo, video
+    media_type: Category  # photo, video
     view_count: int
     media_url: str
 
@@ -51,7 +55,7 @@ class InstagramDM(BaseModel):
     recipient_username: str
     message_text: Optional[str] = None
     timestamp: str
-    message_type: str  # text, media, link
+    message_type: Category  # text, media, link
 
 class InstagramEngagement(BaseModel):
     date: str
@@ -68,4 +72,24 @@ class InstagramData(BaseModel):
     comments: List[InstagramComment] = []
     direct_messages: List[InstagramDM] = []
     engagement_metrics: List[InstagramEngagement] = []
-    data_export_timestamp: str
\ No newline at end of file
+    data_export_timestamp: str
+
+class UserProfile(BaseModel):
+    name: str
+    locale: str
+
+class UserStorage(BaseModel):
+    percentUsed: float
+
+class UserMetadata(BaseModel):
+    source: str
+    collectionDate: str
+    dataType: str
+
+class User(BaseModel):
+    userId: str
+    email: str
+    timestamp: int
+    profile: UserProfile
+    storage: Optional[UserStorage] = None
+    metadata: Optional[UserMetadata] = None
\ No newline at end of file
@@ -0,0 +1,116 @@
+import logging
+import os
+from typing import List, Optional
+
+from refiner.config import settings
+from refiner.models.plan import ExecutionPlan
+from refiner.utils.reader import ijson
+
+MEMORY_MODE = "memory"
+STREAMING_MODE = "streaming"
+EXECUTION_MODES = ("auto", MEMORY_MODE, STREAMING_MODE)
+
+# Peak memory of the in-memory path per byte of JSON input: the decoded document,
+# its Pydantic models and the ORM rows built from them are all alive at once
+# (measured at about 14.5 on synthetic exports)
+MEMORY_EXPANSION = 15
+
+# Share of the memory limit planned with when MEMORY_BUDGET is not set
+DEFAULT_BUDGET_FRACTION = 0.5
+
+# Records per batch when streaming with checkpointing disabled
+DEFAULT_STREAMING_BATCH_SIZE = 10000
+
+# cgroup v2, then v1
+CGROUP_MEMORY_LIMITS = (
+    "/sys/fs/cgroup/memory.max",
+    "/sys/fs/cgroup/memory/memory.limit_in_bytes",
+)
+
+# cgroup v1 reports "no limit" as a huge number rather than "max"
+UNLIMITED = 1 << 60
+
+MIB = 1024 * 1024
+
+
+def memory_limit() -> Optional[int]:
+    """
+    Return the memory available to this process in bytes.
+
+    This is the memory limit of the container's cgroup when there is one, the
+    physical memory of the machine otherwise, or None if neither can be read.
+    """
+    for path in CGROUP_MEMORY_LIMITS:
+        try:
+            with open(path) as f:
+                value = f.read().strip()
+        except OSError:
+            continue
+        if value.isdigit() and int(value) < UNLIMITED:
+            return int(value)
+
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (AttributeError, OSError, ValueError):
+        return None
+
+
+def plan_execution(input_files: List[str]) -> ExecutionPlan:
+    """
+    Choose how to read the inputs of a job.
+
+    Inputs are loaded whole, the fastest path, when the largest one is expected
+    to fit the memory budget. Otherwise they are streamed in batches and rows are
+    committed batch by batch, so memory use no longer grows with the input.
+
+    Args:
+        input_files: Paths of the job's input files
+
+    Returns:
+        The execution plan
+    """
+    sizes = [os.path.getsize(input_file) for input_file in input_files]
+    largest = max(sizes, default=0)
+    estimated_peak = largest * MEMORY_EXPANSION
+
+    limit = memory_limit()
+    if settings.MEMORY_BUDGET is not None:
+        budget = settings.MEMORY_BUDGET * MIB
+    elif limit is not None:
+        budget = int(limit * DEFAULT_BUDGET_FRACTION)
+    else:
+        budget = None
+
+    if settings.EXECUTION_MODE not in EXECUTION_MODES:
+        raise ValueError(f"Unsupported execution mode: {settings.EXECUTION_MODE}")
+
+    if settings.EXECUTION_MODE != "auto":
+        mode, reason = settings.EXECUTION_MODE, "set by EXECUTION_MODE"
+    elif budget is None or estimated_peak <= budget:
+        mode, reason = MEMORY_MODE, "largest input fits the memory budget"
+    elif ijson is None:
+        mode, reason = MEMORY_MODE, "largest input exceeds the memory budget, but streaming requires ijson"
+        logging.warning("Inputs may not fit in memory, install ijson to stream them")
+    else:
+        mode, reason = STREAMING_MODE, "largest input exceeds the memory budget"
+
+    batch_size = settings.CHECKPOINT_INTERVAL
+    if mode == STREAMING_MODE and not batch_size:
+        batch_size = DEFAULT_STREAMING_BATCH_SIZE
+
+    plan = ExecutionPlan(
+        mode=mode,
+        reason=reason,
+        input_bytes=sum(sizes),
+        largest_input_bytes=largest,
+        estimated_peak_bytes=estimated_peak,
+        memory_budget_bytes=budget,
+        memory_limit_bytes=limit,
+        batch_size=batch_size
+    )
+    logging.info(
+        f"Planned {mode} execution ({reason}): largest input {largest / MIB:.1f} MiB, "
+        f"estimated peak {estimated_peak / MIB:.1f} MiB, "
+        f"budget {'unknown' if budget is None else f'{budget / MIB:.0f} MiB'}"
+    )
+    return plan
@@ -0,0 +1,280 @@
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import urlparse
+from urllib.request import url2pathname
+
+import requests
+
+from refiner.config import settings
+from refiner.utils.cid import bytes_cid
+from refiner.utils.delta import apply_delta, read_delta_manifest
+from refiner.utils.encrypt import decrypt_bytes
+from refiner.utils.storage import get_storage
+
+# Decrypted databases opened by a reader are kept open for repeated queries
+MAX_OPEN_DATABASES = 8
+
+# Databases opened from the cache are read through a memory mapping of up to this size
+MMAP_SIZE = 1 << 30
+
+MIB = 1024 * 1024
+
+
+class RefinementReader:
+    """
+    Runs SQL queries against encrypted refinements.
+
+    A refinement is decrypted once: the plaintext database is cached on disk
+    under its CID, and opened read-only through a memory mapping, so later
+    queries, also from other processes, skip both the download and the
+    decryption. The least recently used databases are evicted once the cache
+    outgrows its size limit. With caching disabled, databases are decrypted
+    straight into an in-memory SQLite database and never written to disk.
+
+    A delta manifest is read as the refinement it describes: its base is
+    resolved, following earlier deltas down to a full database, and the delta
+    applied on top, so the reconstructed database is what gets cached.
+    """
+
+    def __init__(self, encryption_key: Optional[str] = None, cache_dir: Optional[str] = None,
+                 cache_size: Optional[int] = None):
+        """
+        Args:
+            encryption_key: Key the refinements were encrypted with (defaults to REFINEMENT_ENCRYPTION_KEY)
+            cache_dir: Directory of the decrypted database cache (defaults to QUERY_CACHE_DIR)
+            cache_size: Cache size limit in MiB, 0 disables the disk cache (defaults to QUERY_CACHE_SIZE)
+        """
+        self.encryption_key = encryption_key or settings.REFINEMENT_ENCRYPTION_KEY
+        self.cache_dir = cache_dir or settings.QUERY_CACHE_DIR or _default_cache_dir()
+        self.cache_size = (settings.QUERY_CACHE_SIZE if cache_size is None else cache_size) * MIB
+        self._connections: "OrderedDict[str, sqlite3.Connection]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def open(self, source: str) -> sqlite3.Connection:
+        """
+        Open a refinement for reading.
+
+        Args:
+            source: CID, gateway or file URL, or local path of an encrypted refinement or a delta manifest
+
+        Returns:
+            Read-only connection to the decrypted database
+        """
+        with self._lock:
+            key = source
+            connection = self._connections.get(key)
+            if connection is None:
+                connection = self._connect(source)
+                self._connections[key] = connection
+                while len(self._connections) > MAX_OPEN_DATABASES:
+                    _, evicted = self._connections.popitem(last=False)
+                    evicted.close()
+            self._connections.move_to_end(key)
+            return connection
+
+    def query(self, source: str, sql: str, parameters: Sequence[Any] = ()) -> List[Dict[str, Any]]:
+        """
+        Run a query against a refinement.
+
+        Args:
+            source: CID, gateway or file URL, or local path of an encrypted refinement
+            sql: SQL statement to run
+            parameters: Values of the statement's placeholders
+
+        Returns:
+            The result rows, as dictionaries keyed by column name
+        """
+        connection = self.open(source)
+        with self._lock:
+            cursor = connection.execute(sql, parameters)
+            columns = [column[0] for column in cursor.description or ()]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def fetch(self, source: str) -> Tuple[str, bytes]:
+        """
+        Fetch and decrypt a refinement, reconstructing it first if it is a delta manifest.
+
+        Args:
+            source: CID, gateway or file URL, or local path of an encrypted refinement or a delta manifest
+
+        Returns:
+            The CID of the source and the plaintext database
+        """
+        cid = _source_cid(source)
+        cached_path = self._cached_path(cid) if cid and self.cache_size else None
+        if cached_path and os.path.exists(cached_path):
+            with open(cached_path, 'rb') as f:
+                return cid, f.read()
+
+        content = _fetch(source)
+        return cid or bytes_cid(content, settings.IPFS_CID_VERSION), self._plaintext(content)
+
+    def close(self) -> None:
+        with self._lock:
+            for connection in self._connections.values():
+                connection.close()
+            self._connections.clear()
+
+    def _connect(self, source: str) -> sqlite3.Connection:
+        cid = _source_cid(source)
+        cached_path = self._cached_path(cid) if cid and self.cache_size else None
+        if cached_path and os.path.exists(cached_path):
+            # Mark as recently used for eviction
+            os.utime(cached_path)
+            return _open_file(cached_path)
+
+        encrypted = _fetch(source)
+        if cid is None:
+            cid = bytes_cid(encrypted, settings.IPFS_CID_VERSION)
+            cached_path = self._cached_path(cid) if self.cache_size else None
+            if cached_path and os.path.exists(cached_path):
+                os.utime(cached_path)
+                return _open_file(cached_path)
+
+        plaintext = self._plaintext(encrypted)
+        del encrypted
+        if not cached_path:
+            return _open_memory(plaintext)
+
+        # Decrypted refinements are readable by the current user only
+        os.makedirs(self.cache_dir, mode=0o700, exist_ok=True)
+        tmp_path = f"{cached_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with os.fdopen(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'wb') as f:
+            f.write(plaintext)
+        os.replace(tmp_path, cached_path)
+        self._evict(keep=cached_path)
+        return _open_file(cached_path)
+
+    def _plaintext(self, content: bytes) -> bytes:
+        """Decrypt an encrypted refinement, or reconstruct the refinement a delta manifest describes."""
+        manifest = read_delta_manifest(content)
+        if manifest is None:
+            return decrypt_bytes(self.encryption_key, content)
+
+        _, base = self.fetch(manifest.base_cid)
+        connection = _open_memory(base)
+        del base
+        try:
+            apply_delta(connection, self.fetch(manifest.delta_cid)[1])
+            return connection.serialize()
+        finally:
+            connection.close()
+
+    def _cached_path(self, cid: str) -> str:
+        return os.path.join(self.cache_dir, f"{cid}.libsql")
+
+    def _evict(self, keep: str) -> None:
+        """Remove the least recently used databases until the cache fits its size limit."""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.libsql'):
+                path = os.path.join(self.cache_dir, name)
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.cache_size:
+                break
+            if path == keep:
+                continue
+            os.remove(path)
+            total -= size
+            logging.info(f"Evicted {os.path.basename(path)} from the query cache")
+
+
+def _default_cache_dir() -> str:
+    """Cache directory of the current user, under XDG_CACHE_HOME or ~/.cache."""
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, 'refiner-query')
+
+
+def _source_cid(source: str) -> Optional[str]:
+    """Return the CID named by a source, None for local files."""
+    if os.path.exists(source):
+        return None
+    if source.startswith(('http://', 'https://', 'file://')):
+        # Gateway URLs and file URLs into the local store (see LocalStorage.url) end with the CID
+        return source.rstrip('/').rsplit('/', 1)[-1]
+    return source
+
+
+def _fetch(source: str) -> bytes:
+    """Read an encrypted refinement from a local file, the local store or an IPFS gateway."""
+    if source.startswith('file://'):
+        source = url2pathname(urlparse(source).path)
+    if os.path.exists(source):
+        with open(source, 'rb') as f:
+            return f.read()
+
+    if not source.startswith(('http://', 'https://')):
+        content = get_storage().get(source)
+        if content is not None:
+            return content
+
+    url = source if source.startswith(('http://', 'https://')) else f"{settings.IPFS_GATEWAY_URL}/{source}"
+    response = requests.get(url, timeout=120)
+    response.raise_for_status()
+    return response.content
+
+
+def _open_file(path: str) -> sqlite3.Connection:
+    connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+    connection.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+    return connection
+
+
+def _open_memory(plaintext: bytes) -> sqlite3.Connection:
+    connection = sqlite3.connect(":memory:", check_same_thread=False)
+    connection.deserialize(plaintext)
+    return connection
+
+
+_reader: Optional[RefinementReader] = None
+
+
+def query(source: str, sql: str, parameters: Sequence[Any] = ()) -> List[Dict[str, Any]]:
+    """
+    Run a query against a refinement with the default reader.
+
+    Args:
+        source: CID, gateway or file URL, or local path of an encrypted refinement
+        sql: SQL statement to run
+        parameters: Values of the statement's placeholders
+
+    Returns:
+        The result rows, as dictionaries keyed by column name
+    """
+    global _reader
+    if _reader is None:
+        _reader = RefinementReader()
+    return _reader.query(source, sql, parameters)
+
+
+# Run with: python -m refiner.query <cid|url|path> "SELECT count(*) FROM posts"
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query an encrypted refinement")
+    parser.add_argument('source', help="CID, gateway URL or local path of the encrypted refinement")
+    parser.add_argument('sql', help="SQL statement to run")
+    parser.add_argument('--key', help="Encryption key (defaults to REFINEMENT_ENCRYPTION_KEY)")
+    parser.add_argument('--cache-dir', help="Directory of decrypted databases (defaults to QUERY_CACHE_DIR)")
+    parser.add_argument('--no-cache', action='store_true', help="Decrypt into memory without caching on disk")
+    parser.add_argument('--json', action='store_true', help="Print the rows as JSON")
+    args = parser.parse_args()
+
+    reader = RefinementReader(args.key, args.cache_dir, 0 if args.no_cache else None)
+    rows = reader.query(args.source, args.sql)
+    if args.json:
+        json.dump(rows, sys.stdout, indent=2, default=str)
+        print()
+    elif rows:
+        print("\t".join(rows[0]))
+        for row in rows:
+            print("\t".join("" if value is None else str(value) for value in row.values()))
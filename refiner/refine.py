@@ -1,65 +1,348 @@
 import json
 import logging
 import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Dict, Iterable, List, Optional
 
 from refiner.models.offchain_schema import OffChainSchema
 from refiner.models.output import Output
-from refiner.transformer.instagram_transformer import InstagramTransformer
-from refiner.config import settings
-from refiner.utils.encrypt import encrypt_file
-from refiner.utils.ipfs import upload_file_to_ipfs, upload_json_to_ipfs
+from refiner.models.proof import CombinedProof
+from refiner.query import RefinementReader
+from refiner.planner import DEFAULT_STREAMING_BATCH_SIZE, STREAMING_MODE, plan_execution
+from refiner.transformer.base_transformer import DataTransformer
+from refiner.transformer.registry import SNIFF_BYTES, TransformerSpec, detect_transformer, match_transformer
+from refiner.context import JobContext
+from refiner.utils.checkpoint import Checkpoint, code_version, file_sha256
+from refiner.utils.compression import NO_CODEC
+from refiner.utils.database import MemoryDatabase
+from refiner.utils.delta import build_delta
+from refiner.utils.encrypt import encrypt_bytes, encrypt_file, encryption_fingerprint, encryption_fingerprint_bytes
+from refiner.utils.ipfs import ipfs_url, lookup_pinned, upload_file_to_ipfs, upload_json_to_ipfs
+from refiner.utils.shards import ShardManifest, build_shards
+from refiner.utils.stream import iter_documents, peek_head
 
 class Refiner:
-    def __init__(self):
-        self.db_path = os.path.join(settings.OUTPUT_DIR, 'db.libsql')
+    def __init__(self, context: Optional[JobContext] = None, resumable: bool = True):
+        """
+        Args:
+            context: Settings and directories of the job (defaults to the settings currently in effect);
+                refiners of different contexts can run concurrently in one process
+            resumable: Keep a checkpoint a restarted job resumes from (if CHECKPOINT_INTERVAL is set);
+                pointless for inputs that cannot be read again, such as uploads, and for databases
+                built in memory (REFINEMENT_IN_MEMORY)
+        """
+        self.context = context or JobContext()
+        self.settings = self.context.settings
+        self.memory = MemoryDatabase() if self.settings.REFINEMENT_IN_MEMORY else None
+        self.db_path = self.memory.uri if self.memory else self.context.database_path
+        resumable = resumable and self.memory is None
+        self.checkpoint = Checkpoint(self.db_path) if resumable and self.settings.CHECKPOINT_INTERVAL else None
+        self.engines = []
 
     def transform(self) -> Output:
         """Transform all input files into the database."""
+        try:
+            with self.context.activate():
+                output = self._transform_inputs()
+        finally:
+            self.close()
+        if self.checkpoint is not None:
+            # The job completed, there is nothing left to resume
+            self.checkpoint.clear()
+        return output
+
+    def transform_stream(self, stream: BinaryIO, name: str = 'upload.json') -> Output:
+        """
+        Transform an upload into the database while its bytes are still arriving.
+
+        The upload is a JSON export or a zip archive of exports. Archive members
+        are decompressed and parsed as they are read, straight into their
+        transformer, so nothing is written to disk before the database.
+
+        Args:
+            stream: Binary stream of the upload, read once from start to end
+            name: Name of the upload, used for a JSON export uploaded as is
+        """
+        try:
+            with self.context.activate():
+                return self._transform_upload(stream, name)
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        """Close the connections of the transformers, freeing the database if it was built in memory."""
+        for engine in self.engines:
+            engine.dispose()
+        self.engines = []
+        if self.memory is not None:
+            self.memory.close()
+
+    def _transform_inputs(self) -> Output:
         logging.info("Starting Instagram data transformation")
         output = Output()
+        transformers = {}
+        input_filenames = [
+            input_filename for input_filename in sorted(os.listdir(self.settings.INPUT_DIR))
+            if os.path.splitext(input_filename)[1].lower() == '.json'
+        ]
+        self._open_checkpoint(input_filenames)
+        plan = plan_execution([os.path.join(self.settings.INPUT_DIR, input_filename) for input_filename in input_filenames])
+        output.plan = plan
+
+        # Iterate through files, routing each to the transformer that recognises it
+        for input_filename in input_filenames:
+            input_file = os.path.join(self.settings.INPUT_DIR, input_filename)
+            spec = detect_transformer(input_file)
+            if spec is None:
+                logging.warning(f"No transformer recognises {input_filename}, skipping it")
+                continue
+
+            transformer = self._transformer(spec, transformers)
+            transformer.process_file(
+                input_file, input_filename, streaming=plan.mode == STREAMING_MODE, batch_size=plan.batch_size,
+                processes=self.settings.BUILD_PROCESSES
+            )
+            logging.info(f"Transformed {spec.name} data from {input_filename}")
+
+        if not transformers:
+            raise ValueError(f"No transformer recognises the input files in {self.settings.INPUT_DIR}")
+        return self._publish(transformers, output)
+
+    def _transform_upload(self, stream: BinaryIO, name: str) -> Output:
+        logging.info(f"Starting transformation of upload {name}")
+        output = Output()
+        transformers = {}
+        batch_size = self.settings.CHECKPOINT_INTERVAL or DEFAULT_STREAMING_BATCH_SIZE
+        for document_name, document in iter_documents(stream, name):
+            head, document = peek_head(document, SNIFF_BYTES)
+            spec = match_transformer(head)
+            if spec is None:
+                logging.warning(f"No transformer recognises {document_name}, skipping it")
+                continue
 
-        # Iterate through files and transform data
-        for input_filename in os.listdir(settings.INPUT_DIR):
-            input_file = os.path.join(settings.INPUT_DIR, input_filename)
-            if os.path.splitext(input_file)[1].lower() == '.json':
-                with open(input_file, 'r') as f:
-                    input_data = json.load(f)
-
-                    # Transform Instagram data
-                    transformer = InstagramTransformer(self.db_path)
-                    transformer.process(input_data)
-                    logging.info(f"Transformed Instagram data from {input_filename}")
-                    
-                    # Create a schema based on the SQLAlchemy schema
-                    schema = OffChainSchema(
-                        name=settings.SCHEMA_NAME,
-                        version=settings.SCHEMA_VERSION,
-                        description=settings.SCHEMA_DESCRIPTION,
-                        dialect=settings.SCHEMA_DIALECT,
-                        schema=transformer.get_schema()
-                    )
-                    output.schema = schema
-                        
-                    # Upload the schema to IPFS
-                    schema_file = os.path.join(settings.OUTPUT_DIR, 'schema.json')
-                    with open(schema_file, 'w') as f:
-                        json.dump(schema.model_dump(), f, indent=4)
-                        schema_ipfs_hash = upload_json_to_ipfs(schema.model_dump())
-                        logging.info(f"Instagram schema uploaded to IPFS with hash: {schema_ipfs_hash}")
-                    
-                    # Upload proof to IPFS
-                    proof_file = os.path.join(settings.OUTPUT_DIR, 'proof.json')
-                    if os.path.exists(proof_file):
-                        with open(proof_file, 'r') as f:
-                            proof_data = json.load(f)
-                            proof_ipfs_hash = upload_json_to_ipfs(proof_data)
-                            logging.info(f"Instagram proof uploaded to IPFS with hash: {proof_ipfs_hash}")
-                    
-                    # Encrypt and upload the database to IPFS
-                    encrypted_path = encrypt_file(settings.REFINEMENT_ENCRYPTION_KEY, self.db_path)
-                    ipfs_hash = upload_file_to_ipfs(encrypted_path)
-                    output.refinement_url = f"{settings.IPFS_GATEWAY_URL}/{ipfs_hash}"
-                    continue
+            self._transformer(spec, transformers).process_stream(document, document_name, batch_size)
+            logging.info(f"Transformed {spec.name} data from {document_name}")
+
+        if not transformers:
+            raise ValueError(f"No transformer recognises the content of upload {name}")
+        return self._publish(transformers, output)
+
+    def _transformer(self, spec: TransformerSpec, transformers: Dict[str, DataTransformer]) -> DataTransformer:
+        """
+        Return the transformer of a spec, imported and created on first use.
+
+        Only the first transformer resets the database, unless the checkpoint already took care of it.
+        """
+        transformer = transformers.get(spec.name)
+        if transformer is None:
+            reset = self.checkpoint is None and not transformers
+            transformer = spec.load()(self.db_path, reset=reset, checkpoint=self.checkpoint, context=self.context)
+            transformers[spec.name] = transformer
+            self.engines.append(transformer.engine)
+        return transformer
+
+    def _publish(self, transformers: Dict[str, DataTransformer], output: Output) -> Output:
+        """Describe the schema of the refined database, then upload the schema, proof and refinement."""
+        # Create a schema based on the SQLAlchemy schema
+        parquet_schema = None
+        if self.settings.OUTPUT_PARQUET:
+            parquet_schema = {}
+            for transformer in transformers.values():
+                parquet_schema.update(transformer.get_parquet_schema())
+        schema = OffChainSchema(
+            name=self.settings.SCHEMA_NAME,
+            version=self.settings.SCHEMA_VERSION,
+            description=self.settings.SCHEMA_DESCRIPTION,
+            dialect=self.settings.SCHEMA_DIALECT,
+            schema=next(iter(transformers.values())).get_schema(),
+            parquet_schema=parquet_schema
+        )
+        output.schema = schema
+            
+        # Upload the schema to IPFS
+        schema_file = self.context.schema_path
+        with open(schema_file, 'w') as f:
+            json.dump(schema.model_dump(), f, indent=4)
+            schema_ipfs_hash = upload_json_to_ipfs(schema.model_dump())
+            logging.info(f"Instagram schema uploaded to IPFS with hash: {schema_ipfs_hash}")
+        
+        # Save the proof of every input to the job's output directory and upload it to IPFS
+        proofs = {name: proof for transformer in transformers.values() for name, proof in transformer.proofs.items()}
+        if proofs:
+            # A single input keeps the proof of its export, several inputs get one proof holding all of them
+            proof = next(iter(proofs.values())) if len(proofs) == 1 else CombinedProof(proofs=proofs)
+            with open(self.context.proof_path, 'w') as f:
+                json.dump(proof.model_dump(), f, indent=2)
+            proof_ipfs_hash = upload_json_to_ipfs(proof.model_dump())
+            logging.info(f"Instagram proof uploaded to IPFS with hash: {proof_ipfs_hash}")
+        
+        # Encrypt and upload the database to IPFS, or its shards and their manifest, or its delta and its manifest
+        if self.settings.OUTPUT_SHARDING != 'none':
+            ipfs_hash = self._upload_shards(schema.schema)
+        elif self.settings.DELTA_BASE:
+            ipfs_hash = self._upload_delta(schema.schema)
+        else:
+            ipfs_hash = self._upload_database(self.db_path)
+        output.refinement_url = ipfs_url(ipfs_hash)
+        if self.settings.OUTPUT_PARQUET:
+            output.parquet_urls = self._upload_parquet(transformers.values())
 
         logging.info("Instagram data transformation completed successfully")
-        return output
\ No newline at end of file
+        return output
+
+    def _open_checkpoint(self, input_filenames: List[str]) -> None:
+        """
+        Resume the checkpoint of an earlier run of this code over the same inputs, or start a new one.
+
+        A new checkpoint starts with an empty database: the stale checkpoint is removed
+        before the database, so a crash in between never pairs old rows with fresh progress.
+        """
+        if self.checkpoint is None:
+            return
+
+        inputs = {
+            input_filename: file_sha256(os.path.join(self.settings.INPUT_DIR, input_filename))
+            for input_filename in input_filenames
+        }
+        version = code_version(self.settings.SCHEMA_VERSION)
+        if os.path.exists(self.db_path) and self.checkpoint.resumable(inputs, version):
+            logging.info(f"Resuming refinement from checkpoint {self.checkpoint.path}")
+            return
+
+        self.checkpoint.clear()
+        if os.path.exists(self.db_path):
+            os.remove(self.db_path)
+            logging.info(f"Deleted existing database at {self.db_path}")
+        self.checkpoint.start(inputs, version)
+
+    def _upload_database(self, db_path: str, codec: Optional[str] = None) -> str:
+        """
+        Encrypt and upload a database, unless this exact refinement is already pinned.
+
+        With a checkpoint, both stages are recorded against the database fingerprint,
+        so a restarted job reuses the encrypted file and the CID of an earlier run.
+        A database built in memory is serialized once, then fingerprinted and
+        encrypted from memory.
+
+        Args:
+            db_path: Path to the file to upload, or the in-memory refinement database
+            codec: Compression codec applied before encryption (defaults to REFINEMENT_COMPRESSION)
+        """
+        if self.memory is not None and db_path == self.memory.uri:
+            return self._upload_memory_database(codec)
+
+        fingerprint = encryption_fingerprint(self.settings.REFINEMENT_ENCRYPTION_KEY, db_path, codec=codec)
+        ipfs_hash = lookup_pinned(fingerprint)
+        if ipfs_hash is None and self.checkpoint is not None:
+            ipfs_hash = self.checkpoint.stage('upload', fingerprint)
+        if ipfs_hash:
+            logging.info(f"Refinement already pinned with hash: {ipfs_hash}, skipping encryption and upload")
+            return ipfs_hash
+
+        encrypted_path = self.checkpoint.stage('encrypt', fingerprint) if self.checkpoint is not None else None
+        if encrypted_path and os.path.exists(encrypted_path):
+            logging.info(f"Reusing encrypted refinement {encrypted_path} from checkpoint")
+        else:
+            encrypted_path = encrypt_file(self.settings.REFINEMENT_ENCRYPTION_KEY, db_path, codec=codec)
+            if self.checkpoint is not None:
+                self.checkpoint.complete_stage('encrypt', fingerprint, encrypted_path)
+
+        ipfs_hash = upload_file_to_ipfs(encrypted_path, content_key=fingerprint)
+        if self.checkpoint is not None:
+            self.checkpoint.complete_stage('upload', fingerprint, ipfs_hash)
+        return ipfs_hash
+
+    def _upload_memory_database(self, codec: Optional[str] = None) -> str:
+        """Encrypt and upload the database built in memory; only the encrypted file is written to disk."""
+        return self._upload_plaintext(self.memory.serialize(), self.context.output_path('db.libsql.pgp'), codec)
+
+    def _upload_plaintext(self, plaintext: bytes, encrypted_path: str, codec: Optional[str] = None) -> str:
+        """Encrypt a database held in memory to a file and upload it, unless this exact content is already pinned."""
+        fingerprint = encryption_fingerprint_bytes(self.settings.REFINEMENT_ENCRYPTION_KEY, plaintext, codec=codec)
+        ipfs_hash = lookup_pinned(fingerprint)
+        if ipfs_hash:
+            logging.info(f"Refinement already pinned with hash: {ipfs_hash}, skipping encryption and upload")
+            return ipfs_hash
+
+        encrypt_bytes(self.settings.REFINEMENT_ENCRYPTION_KEY, plaintext, encrypted_path, codec=codec)
+        del plaintext
+        return upload_file_to_ipfs(encrypted_path, content_key=fingerprint)
+
+    def _upload_parquet(self, transformers: Iterable[DataTransformer]) -> Dict[str, str]:
+        """
+        Export the refined tables to Parquet, then encrypt and upload every file like the database.
+
+        Returns:
+            URL of the encrypted Parquet file of every table
+        """
+        parquet_dir = self.context.output_path('parquet')
+        paths = {}
+        for transformer in transformers:
+            paths.update(transformer.export_parquet(parquet_dir))
+
+        # Parquet pages are compressed already, compressing them again before encryption gains nothing
+        codec = NO_CODEC if self.settings.PARQUET_COMPRESSION.lower() != 'none' else None
+        # Threads of the executor do not inherit the job's settings, they are bound to them
+        upload = self.context.bind(lambda path: self._upload_database(path, codec))
+        with ThreadPoolExecutor() as executor:
+            parquet_hashes = list(executor.map(upload, paths.values()))
+        logging.info(f"Exported and uploaded {len(paths)} tables as Parquet")
+        return {table: ipfs_url(parquet_hash) for table, parquet_hash in zip(paths, parquet_hashes)}
+
+    def _upload_shards(self, schema: str) -> str:
+        """
+        Split the database into time-partitioned shards and upload them in parallel.
+
+        Returns:
+            IPFS hash of the manifest listing every shard with its CID and time range
+        """
+        shard_dir = self.context.output_path('shards')
+        shards = build_shards(self.db_path, shard_dir, self.settings.OUTPUT_SHARDING)
+
+        with ThreadPoolExecutor() as executor:
+            shard_hashes = list(executor.map(self.context.bind(self._upload_database), [shard.path for shard in shards]))
+        for shard, shard_hash in zip(shards, shard_hashes):
+            shard.cid = shard_hash
+            shard.url = ipfs_url(shard_hash)
+            shard.path = os.path.relpath(shard.path, self.settings.OUTPUT_DIR)
+
+        manifest = ShardManifest(granularity=self.settings.OUTPUT_SHARDING, schema=schema, shards=shards)
+        manifest_file = self.context.manifest_path
+        with open(manifest_file, 'w') as f:
+            json.dump(manifest.model_dump(), f, indent=4)
+        manifest_ipfs_hash = upload_json_to_ipfs(manifest.model_dump())
+        logging.info(f"Shard manifest with {len(shards)} shards uploaded to IPFS with hash: {manifest_ipfs_hash}")
+        return manifest_ipfs_hash
+
+    def _upload_delta(self, schema: str) -> str:
+        """
+        Upload only what changed since the refinement DELTA_BASE names, with a manifest pointing at it.
+
+        The base is fetched and decrypted, reconstructed if it is a delta itself,
+        and diffed against the database in SQLite. The whole database is uploaded
+        instead when the delta cannot express the change or saves nothing.
+
+        Returns:
+            IPFS hash of the delta manifest, or of the database
+        """
+        base_cid, base = RefinementReader().fetch(self.settings.DELTA_BASE)
+        delta = build_delta(self.db_path, base)
+        del base
+        if delta is None:
+            logging.info("Uploading the whole refinement instead of a delta")
+            return self._upload_database(self.db_path)
+
+        plaintext, manifest = delta
+        del delta
+        delta_hash = self._upload_plaintext(plaintext, self.context.output_path('delta.libsql.pgp'))
+        manifest.base_cid = base_cid
+        manifest.schema = schema
+        manifest.delta_cid = delta_hash
+        manifest.delta_url = ipfs_url(delta_hash)
+
+        manifest_file = self.context.manifest_path
+        with open(manifest_file, 'w') as f:
+            json.dump(manifest.model_dump(), f, indent=4)
+        manifest_ipfs_hash = upload_json_to_ipfs(manifest.model_dump())
+        logging.info(f"Delta manifest against {base_cid} uploaded to IPFS with hash: {manifest_ipfs_hash}")
+        return manifest_ipfs_hash
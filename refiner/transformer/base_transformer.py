@@ -1,11 +1,37 @@
-from typing import Dict, Any, List
-from sqlalchemy import create_engine
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import BinaryIO, Dict, Any, Callable, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple, TypeVar
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
+from refiner.config import Settings, use_settings
+from refiner.context import JobContext
 from refiner.models.refined import Base
-import sqlite3
+from refiner.planner import DEFAULT_STREAMING_BATCH_SIZE
+from refiner.transformer.mapping import RowBuilder, TableMapping, compile_mapping
+from refiner.utils.categories import CategoryCodec
+from refiner.utils.checkpoint import Checkpoint
+from refiner.utils.database import connect, engine_url, is_memory_database
+from refiner.utils.merge import attach_part, copy_tables
+from refiner.utils.parquet import describe_schema, export_tables
+from refiner.utils.reader import load_json
+import json
+import shutil
+import tempfile
 import os
 import logging
 
+T = TypeVar('T')
+
+
+class Part(NamedTuple):
+    """A group of sections built by a worker process into its own database."""
+    path: str
+    group: Tuple[str, ...]
+    state: Any
+    seen_keys: Dict[str, Set[Any]]
+    duplicate_counts: Dict[str, int]
+    codes: Dict[str, Dict[str, int]]
+
 class DataTransformer:
     """
     Base class for transforming JSON data into SQLAlchemy models.
@@ -13,22 +39,104 @@ class DataTransformer:
     to customize the transformation process for their specific data.
     """
     
-    def __init__(self, db_path: str):
-        """Initialize the transformer with a database path."""
+    # Declarative base holding the tables this transformer writes
+    base = Base
+    
+    # Lookup tables of categorical columns, their codes are available in self.categories by table name
+    lookup_models = ()
+    
+    # Declarative mappings of source records to table rows, compiled once per database into
+    # self.row_builders; sections of a mapped table hold row tuples instead of model instances
+    row_mappings: Tuple[TableMapping, ...] = ()
+    
+    # Groups of sections process_file can build in parallel, each group by its own worker
+    # process into its own database; empty if the transformer only builds serially
+    parallel_groups: Tuple[Tuple[str, ...], ...] = ()
+    
+    def __init__(self, db_path: str, reset: bool = True, checkpoint: Optional[Checkpoint] = None,
+                 context: Optional[JobContext] = None):
+        """
+        Initialize the transformer with a database path.
+        
+        Args:
+            db_path: Path to the SQLite database, or the URI of an in-memory database (see MemoryDatabase)
+            reset: Delete an existing database first; pass False to add to a database
+                another transformer of the same job already wrote to
+            checkpoint: Optional job checkpoint; records are then committed in chunks
+                and sections already committed by an earlier run are skipped
+            context: Settings and directories of the job (defaults to the settings currently in effect)
+        """
+        self.context = context or JobContext()
+        self.settings = self.context.settings
         self.db_path = db_path
-        self._initialize_database()
+        self.checkpoint = checkpoint
+        # Primary keys already written per table, kept for the lifetime of the transformer
+        # so duplicates are caught across all input files of a job
+        self.seen_keys: Dict[str, Set[Any]] = defaultdict(set)
+        self.duplicate_counts: Dict[str, int] = defaultdict(int)
+        # Input being transformed, and the duplicate counts before it started (see input_duplicate_counts)
+        self.input_name = ''
+        self._duplicates_before: Dict[str, int] = {}
+        # Proofs of the inputs transformed so far, by input name, for transformers that generate one
+        self.proofs: Dict[str, Any] = {}
+        self.tables = self._select_tables()
+        self._initialize_database(reset)
     
-    def _initialize_database(self) -> None:
+    def _initialize_database(self, reset: bool = True) -> None:
         """
         Initialize or recreate the database and its tables.
         """
-        if os.path.exists(self.db_path):
+        if reset and os.path.exists(self.db_path):
             os.remove(self.db_path)
             logging.info(f"Deleted existing database at {self.db_path}")
         
-        self.engine = create_engine(f'sqlite:///{self.db_path}')
-        Base.metadata.create_all(self.engine)
+        self.engine = create_engine(engine_url(self.db_path))
+        if self.checkpoint is not None:
+            self.checkpoint.attach(self.engine)
+        self.base.metadata.create_all(
+            self.engine, tables=[table for table in self.base.metadata.sorted_tables if table.name in self.tables]
+        )
         self.Session = sessionmaker(bind=self.engine)
+        
+        self.categories = {
+            model.__tablename__: CategoryCodec(model) for model in self.lookup_models
+            if model.__tablename__ in self.tables
+        }
+        with self.engine.connect() as connection:
+            for codec in self.categories.values():
+                codec.load(connection)
+        
+        tables = self.base.metadata.tables
+        self.row_builders: Dict[str, RowBuilder] = {
+            mapping.table: compile_mapping(mapping, tables[mapping.table], self.engine.dialect, self.categories)
+            for mapping in self.row_mappings if mapping.table in self.tables
+        }
+    
+    def _select_tables(self) -> Set[str]:
+        """
+        Return the names of the tables this transformer produces.
+        
+        REFINED_TABLES restricts them; tables referenced by a foreign key of a
+        produced table are produced as well.
+        """
+        tables = self.base.metadata.tables
+        if not self.settings.REFINED_TABLES:
+            return set(tables)
+        
+        requested = {name.strip() for name in self.settings.REFINED_TABLES.split(',')}
+        selected = requested & set(tables)
+        if not selected:
+            raise ValueError(
+                f"REFINED_TABLES names none of the tables of {type(self).__name__}: {', '.join(sorted(tables))}"
+            )
+        pending = list(selected)
+        while pending:
+            for foreign_key in tables[pending.pop()].foreign_keys:
+                referenced = foreign_key.column.table.name
+                if referenced not in selected:
+                    selected.add(referenced)
+                    pending.append(referenced)
+        return selected
     
     def transform(self, data: Dict[str, Any]) -> List[Base]:
         """
@@ -42,35 +150,375 @@ class DataTransformer:
         """
         raise NotImplementedError("Subclasses must implement transform method")
     
+    def iter_sections(self, data: Dict[str, Any]) -> Iterator[Tuple[str, List[Base]]]:
+        """
+        Transform JSON data into named sections of model instances.
+        
+        Checkpoints count committed records per section, so a section must come
+        out in the same order every time the same data is transformed. Override
+        this to build sections one at a time; by default the whole result of
+        transform is a single section.
+        
+        Args:
+            data: Dictionary containing the JSON data
+        """
+        yield 'records', self.transform(data)
+    
+    def _start_input(self, input_name: str) -> None:
+        self.input_name = input_name
+        self._duplicates_before = dict(self.duplicate_counts)
+    
+    def input_duplicate_counts(self) -> Dict[str, int]:
+        """Records of the current input dropped so far per table, as repeats within it or of earlier inputs."""
+        counts = {table: count - self._duplicates_before.get(table, 0) for table, count in self.duplicate_counts.items()}
+        return {table: count for table, count in counts.items() if count}
+    
+    def _is_duplicate(self, table: str, key: Any) -> bool:
+        """
+        Record a primary key of a table, returning True if it was already recorded.
+        
+        Duplicates are counted, or raise a ValueError when DUPLICATE_POLICY is 'error'.
+        """
+        keys = self.seen_keys[table]
+        if key not in keys:
+            keys.add(key)
+            return False
+        
+        if self.settings.DUPLICATE_POLICY == 'error':
+            raise ValueError(f"Duplicate {table} key in input: {key}")
+        self.duplicate_counts[table] += 1
+        return True
+    
+    def _unique(self, table: str, records: Iterable[T], key: Callable[[T], Any]) -> List[T]:
+        """
+        Drop the records whose primary key was already seen, keeping the first occurrence.
+        
+        Args:
+            table: Table the records are written to
+            records: Source records
+            key: Function returning the primary key of a record
+        """
+        return [record for record in records if not self._is_duplicate(table, key(record))]
+    
+    def _add_rows(self, session, section: str, rows: List[Any]) -> None:
+        """Add rows of a section to the session's transaction, row tuples of mapped tables bypass the ORM."""
+        builder = self.row_builders.get(section)
+        if builder is None:
+            session.add_all(rows)
+        elif rows:
+            session.connection().exec_driver_sql(builder.insert_sql, rows)
+    
+    def _flush_categories(self, session) -> None:
+        """Add the lookup rows of newly seen categorical values to the session's transaction."""
+        for codec in self.categories.values():
+            codec.flush(session)
+    
     def get_schema(self):
-        conn = sqlite3.connect(self.db_path)
+        conn = connect(self.db_path)
         cursor = conn.cursor()
         
-        # Get all table definitions in order
+        # Get all table definitions in order, followed by the views over them
         schema = []
-        for table in cursor.execute("SELECT sql FROM sqlite_master WHERE type='table' ORDER BY name"):
+        for table in cursor.execute(
+            "SELECT sql FROM sqlite_master WHERE type IN ('table', 'view') ORDER BY type = 'view', name"
+        ):
             schema.append(table[0] + ";")
         
         conn.close()
         return "\n\n".join(schema)
 
-    def process(self, data: Dict[str, Any]) -> None:
+    def get_parquet_schema(self) -> Dict[str, List[str]]:
+        """Describe the Arrow schema of the Parquet file of every produced table."""
+        return describe_schema(self._produced_tables())
+    
+    def export_parquet(self, parquet_dir: str) -> Dict[str, str]:
+        """
+        Write every produced table to its own Parquet file, streamed in row groups.
+        
+        Returns:
+            Path of the Parquet file of every table
+        """
+        return export_tables(
+            self.db_path, self._produced_tables(), parquet_dir,
+            compression=self.settings.PARQUET_COMPRESSION, row_group_size=self.settings.PARQUET_ROW_GROUP_SIZE
+        )
+    
+    def _produced_tables(self) -> List[Any]:
+        return [table for table in self.base.metadata.sorted_tables if table.name in self.tables]
+
+    def process(self, data: Dict[str, Any], input_name: str = '') -> None:
         """
         Process the data transformation and save to database.
-        If the database already exists, it will be deleted and recreated.
+        
+        Records are committed every CHECKPOINT_INTERVAL records, or in a single
+        transaction if it is 0.
         
         Args:
             data: Dictionary containing the JSON data
+            input_name: Name of the input the data was read from, keys its checkpoint progress
+        """
+        self._start_input(input_name)
+        self._write_sections(self.iter_sections(data), input_name, self.settings.CHECKPOINT_INTERVAL)
+    
+    def process_file(self, file_path: str, input_name: str = '', streaming: bool = False,
+                     batch_size: Optional[int] = None, processes: int = 1) -> None:
+        """
+        Transform an input file and save it to the database.
+        
+        Args:
+            file_path: Path to the JSON input
+            input_name: Name of the input, keys its checkpoint progress
+            streaming: Read the file in batches instead of loading it whole
+            batch_size: Records committed per transaction, and read per batch when streaming
+                (defaults to CHECKPOINT_INTERVAL, 0 saves everything in a single transaction)
+            processes: Worker processes building the parallel groups of the transformer;
+                with 1, or without parallel groups, everything is built in this process
+        """
+        if batch_size is None:
+            batch_size = self.settings.CHECKPOINT_INTERVAL
+        self._start_input(input_name)
+        if processes > 1 and self.parallel_groups:
+            self._process_parallel(file_path, input_name, processes, batch_size)
+            return
+        if streaming:
+            sections = self.iter_file_sections(file_path, batch_size)
+        else:
+            sections = self.iter_sections(load_json(file_path))
+        self._write_sections(sections, input_name, batch_size)
+    
+    def iter_file_sections(self, file_path: str, batch_size: int) -> Iterator[Tuple[str, List[Base]]]:
         """
+        Stream the sections of an input file without loading it whole.
+        
+        A section may come out in several consecutive parts. Transformers without
+        a streaming reader load the whole file.
+        
+        Args:
+            file_path: Path to the JSON input
+            batch_size: Number of records to read at a time
+        """
+        yield from self.iter_sections(load_json(file_path))
+    
+    def process_stream(self, stream: BinaryIO, input_name: str = '', batch_size: Optional[int] = None) -> None:
+        """
+        Transform an input read from a stream, e.g. an upload still arriving, and save it to the database.
+        
+        Args:
+            stream: Binary stream of the JSON input, read once from start to end
+            input_name: Name of the input, keys its checkpoint progress
+            batch_size: Records read and committed at a time (defaults to CHECKPOINT_INTERVAL)
+        """
+        if batch_size is None:
+            batch_size = self.settings.CHECKPOINT_INTERVAL
+        self._start_input(input_name)
+        self._write_sections(self.iter_stream_sections(stream, batch_size), input_name, batch_size)
+    
+    def iter_stream_sections(self, stream: BinaryIO, batch_size: int) -> Iterator[Tuple[str, List[Base]]]:
+        """
+        Transform an input while it is read from a stream, which cannot be rewound.
+        
+        Transformers without a single-pass reader load the whole stream.
+        
+        Args:
+            stream: Binary stream of the JSON input
+            batch_size: Number of records to read at a time
+        """
+        yield from self.iter_sections(json.load(stream))
+    
+    def parallel_context(self, file_path: str) -> Any:
+        """Read what every worker of a parallel build needs besides its own sections."""
+        return None
+    
+    def build_part(self, file_path: str, group: Tuple[str, ...], context: Any, batch_size: int) -> Any:
+        """
+        Build and save the sections of a parallel group, in a worker process.
+        
+        The transformer writes to a database of its own, primary keys seen and
+        lookup codes assigned by the parent are already loaded.
+        
+        Args:
+            file_path: Path to the JSON input
+            group: Sections to build, one of parallel_groups
+            context: Result of parallel_context
+            batch_size: Records to read and commit at a time
+        
+        Returns:
+            Picklable state the parent needs to build the remaining sections
+        """
+        raise NotImplementedError("Transformers with parallel groups must implement build_part")
+    
+    def iter_merged_sections(self, context: Any, states: List[Any]) -> Iterator[Tuple[str, List[Base]]]:
+        """
+        Build the sections no parallel group covers, once every part is merged.
+        
+        Args:
+            context: Result of parallel_context
+            states: Results of build_part, in parallel_groups order
+        """
+        return iter(())
+    
+    def _process_parallel(self, file_path: str, input_name: str, processes: int, batch_size: int) -> None:
+        """
+        Build the parallel groups of an input in worker processes and merge them into the database.
+        
+        Every group is written to a temporary SQLite file of its own through its own
+        connection, then appended to the database with ATTACH and INSERT ... SELECT.
+        Parts are merged in parallel_groups order, so rows, surrogate keys and lookup
+        codes come out as in a serial build.
+        """
+        context = self.parallel_context(file_path)
+        codes = {table: dict(codec.codes) for table, codec in self.categories.items()}
+        work_dir = (self.context.output_dir if is_memory_database(self.db_path)
+                    else os.path.dirname(os.path.abspath(self.db_path)))
+        part_dir = tempfile.mkdtemp(prefix='parts-', dir=work_dir)
+        try:
+            with ProcessPoolExecutor(min(processes, len(self.parallel_groups))) as executor:
+                futures = [
+                    executor.submit(
+                        _build_part, type(self), self.settings, os.path.join(part_dir, f"part-{index}.libsql"),
+                        file_path, group, context, {table: self.seen_keys[table] for table in group}, codes,
+                        batch_size or DEFAULT_STREAMING_BATCH_SIZE
+                    )
+                    for index, group in enumerate(self.parallel_groups)
+                ]
+                parts = [future.result() for future in futures]
+            self._merge_parts(parts, input_name)
+        finally:
+            shutil.rmtree(part_dir, ignore_errors=True)
+        
+        self._write_sections(self.iter_merged_sections(context, [part.state for part in parts]), input_name, batch_size)
+    
+    def _merge_parts(self, parts: List[Part], input_name: str) -> None:
+        """
+        Append the rows of every part to the database, one transaction per part.
+        
+        With a checkpoint each merge is recorded in its transaction, and parts an
+        earlier run already merged are skipped.
+        """
+        lookups = {model.__tablename__ for model in self.lookup_models}
+        tables = [
+            table for table in self.base.metadata.sorted_tables
+            if table.name in self.tables and table.name not in lookups
+        ]
+        indexes = [index for table in tables for index in table.indexes]
+        
+        with self.engine.connect() as connection:
+            # Rows are appended faster to unindexed tables, indexes are built once all parts are in
+            for index in indexes:
+                index.drop(connection, checkfirst=True)
+            connection.commit()
+            
+            for part in parts:
+                for table, keys in part.seen_keys.items():
+                    self.seen_keys[table] = keys
+                for table, count in part.duplicate_counts.items():
+                    self.duplicate_counts[table] += count
+                remap = {table: self._remap_codes(table, part_codes) for table, part_codes in part.codes.items()}
+                
+                section = f"part:{'+'.join(part.group)}"
+                if self.checkpoint is not None and self.checkpoint.committed(connection, input_name, section):
+                    logging.info(f"Skipping {section} of {input_name or 'input'}, merged by an earlier run")
+                    continue
+                
+                with attach_part(connection, part.path):
+                    counts = copy_tables(connection, tables, remap)
+                    self._flush_categories(connection)
+                    if self.checkpoint is not None:
+                        self.checkpoint.advance(connection, input_name, section, sum(counts.values()))
+                    connection.commit()
+                logging.info(f"Merged {', '.join(f'{count} {table}' for table, count in counts.items() if count)}")
+            
+            for index in indexes:
+                index.create(connection, checkfirst=True)
+            connection.commit()
+    
+    def _remap_codes(self, table: str, part_codes: Dict[str, int]) -> Dict[int, int]:
+        """
+        Register the lookup values of a part, in the order the part assigned them.
+        
+        Returns:
+            Database code of every part code that differs from it
+        """
+        codec = self.categories[table]
+        remap = {}
+        for name, part_code in sorted(part_codes.items(), key=lambda item: item[1]):
+            code = codec.code(name)
+            if code != part_code:
+                remap[part_code] = code
+        return remap
+    
+    def _write_sections(self, sections: Iterable[Tuple[str, List[Base]]], input_name: str, batch_size: int) -> None:
+        """
+        Save sections of model instances or mapped rows, committing every batch_size records.
+        
+        With a checkpoint each commit also records the number of records of the
+        section committed so far, and records an earlier run of the job already
+        committed are skipped.
+        """
+        duplicates_before = sum(self.duplicate_counts.values())
+        # Records of each section seen so far, sections may arrive in several parts
+        positions = defaultdict(int)
         session = self.Session()
         try:
             # Transform data into model instances
-            models = self.transform(data)
-            for model in models:
-                session.add(model)
+            for section, models in sections:
+                first = positions[section]
+                positions[section] += len(models)
+                if not batch_size:
+                    self._add_rows(session, section, models)
+                    continue
+                
+                start = 0
+                if self.checkpoint is not None:
+                    start = max(self.checkpoint.committed(session, input_name, section) - first, 0)
+                    if start and not first:
+                        logging.info(f"Resuming {section} of {input_name or 'input'} after {start} committed records")
+                for offset in range(start, len(models), batch_size):
+                    chunk = models[offset:offset + batch_size]
+                    self._add_rows(session, section, chunk)
+                    self._flush_categories(session)
+                    if self.checkpoint is not None:
+                        self.checkpoint.advance(session, input_name, section, first + offset + len(chunk))
+                    session.commit()
+                    # Committed rows are not needed by the session anymore
+                    session.expunge_all()
+            self._flush_categories(session)
             session.commit()
         except Exception as e:
             session.rollback()
             raise e
         finally:
-            session.close()
\ No newline at end of file
+            session.close()
+        
+        duplicates = sum(self.duplicate_counts.values()) - duplicates_before
+        if duplicates:
+            logging.warning(f"Dropped {duplicates} duplicate records, totals per table: {dict(self.duplicate_counts)}")
+
+
+
+def _disable_durability(dbapi_connection, connection_record) -> None:
+    # Parts are thrown away after the merge, a crash simply rebuilds them
+    dbapi_connection.execute("PRAGMA journal_mode = OFF")
+    dbapi_connection.execute("PRAGMA synchronous = OFF")
+
+
+def _build_part(transformer_class, job_settings: Settings, part_path: str, file_path: str, group: Tuple[str, ...],
+                context: Any, seen_keys: Dict[str, Set[Any]], codes: Dict[str, Dict[str, int]], batch_size: int) -> Part:
+    """Build a parallel group of an input into its own database, in a worker process, with the settings of the job."""
+    with use_settings(job_settings):
+        transformer = transformer_class(part_path, context=JobContext(job_settings))
+        transformer.engine.dispose()
+        event.listen(transformer.engine, "connect", _disable_durability)
+        transformer.seen_keys.update(seen_keys)
+        for table, table_codes in codes.items():
+            transformer.categories[table].codes.update(table_codes)
+        
+        state = transformer.build_part(file_path, group, context, batch_size)
+    return Part(
+        path=part_path,
+        group=group,
+        state=state,
+        seen_keys={table: transformer.seen_keys[table] for table in group},
+        duplicate_counts=dict(transformer.duplicate_counts),
+        codes={table: codec.codes for table, codec in transformer.categories.items()}
+    )
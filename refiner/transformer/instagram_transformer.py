@@ -1,88 +1,503 @@
-from typing import Dict, Any, List
+from typing import BinaryIO, Callable, Dict, Any, Iterable, Iterator, List, Tuple
 from collections import defaultdict
+from operator import attrgetter
 import hashlib
 from datetime import datetime, timedelta
 
 from refiner.models.refined import Base
 from refiner.transformer.base_transformer import DataTransformer
+from refiner.transformer.mapping import Field, TableMapping
 from refiner.models.refined import (
-    UserProfileRefined, PostRefined, MediaRefined, StoryRefined, 
-    CommentRefined, DirectMessageRefined, EngagementMetricRefined,
-    HashtagUsageRefined, ActivityPatternRefined
+    UserProfileRefined, HashtagUsageRefined, ActivityPatternRefined, MediaTypeRefined, MessageTypeRefined
+)
+from refiner.models.unrefined import (
+    InstagramData, InstagramPost, InstagramStory, InstagramComment, InstagramDM, InstagramEngagement
 )
-from refiner.models.unrefined import InstagramData
 from refiner.models.proof import InstagramProof
-from refiner.utils.proof_generator import InstagramProofGenerator
-from refiner.utils.date import parse_timestamp
+from refiner.utils.proof_generator import InstagramProofGenerator, RecordDigest
+from refiner.utils.sketches import Sketch
+from refiner.utils.analytics import ActivityHistogram, engagement_rates
+from refiner.utils.date import TimeWindow, parse_timestamp
+from refiner.utils.integrity import IntegrityChecker
 from refiner.utils.pii import hash_text
+from refiner.utils.reader import JsonField, iter_json_fields, iter_json_items, read_json_fields
 import json
 import os
+import tempfile
+
+ACTIVITY_KINDS = ('post_count', 'story_count', 'comment_count', 'dm_count')
+
+# Activity pattern count every collection adds to
+ACTIVITY_KIND = {
+    'posts': 'post_count',
+    'stories': 'story_count',
+    'comments': 'comment_count',
+    'direct_messages': 'dm_count',
+}
+
+# Record collections of an export in the order their rows are written, with the model validating
+# their items, the field holding their ID and the field holding their time
+COLLECTIONS = {
+    'posts': (InstagramPost, 'post_id', 'timestamp'),
+    'stories': (InstagramStory, 'story_id', 'timestamp'),
+    'comments': (InstagramComment, 'comment_id', 'timestamp'),
+    'direct_messages': (InstagramDM, 'message_id', 'timestamp'),
+    'engagement_metrics': (InstagramEngagement, 'date', 'date'),
+}
+
+# Collections whose ID is only unique within the export of a user, deduplicated by (user ID, ID)
+USER_SCOPED_KEYS = {'engagement_metrics'}
+
+# Collections every refined table is built from
+TABLE_COLLECTIONS = {
+    'posts': ('posts',),
+    'media': ('posts',),
+    'hashtag_usage': ('posts',),
+    'stories': ('stories',),
+    'comments': ('comments',),
+    'direct_messages': ('direct_messages',),
+    'engagement_metrics': ('engagement_metrics',),
+    'activity_patterns': tuple(ACTIVITY_KIND),
+}
+
+# Top-level fields read before records are streamed
+HEADER_FIELDS = ('user_id', 'profile', 'data_export_timestamp')
+
+# Collections built side by side in a parallel build, the small ones share a worker
+PARALLEL_GROUPS = (('posts',), ('comments',), ('direct_messages',), ('stories', 'engagement_metrics'))
+
+
+# Rows of the record tables; per-record inputs (dates, rates, ...) are computed by the transformer for a whole batch
+ROW_MAPPINGS = (
+    TableMapping('posts', (
+        Field('post_id', 'record.post_id'),
+        Field('user_id', 'context.user_id'),
+        Field('caption_length', 'record.caption', 'length'),
+        Field('post_date', 'post_date'),
+        Field('like_count', 'record.like_count'),
+        Field('comment_count', 'record.comment_count'),
+        Field('media_count', 'record.media', 'count'),
+        Field('has_location', 'record.location', 'bool'),
+        Field('hashtag_count', 'record.hashtags', 'count'),
+        Field('engagement_rate', 'engagement_rate'),
+    )),
+    TableMapping('media', (
+        Field('post_id', 'post_id'),
+        Field('media_type_id', 'record.media_type', 'category', lookup='media_types'),
+    )),
+    TableMapping('stories', (
+        Field('story_id', 'record.story_id'),
+        Field('user_id', 'context.user_id'),
+        Field('story_date', 'story_date'),
+        Field('media_type_id', 'record.media_type', 'category', lookup='media_types'),
+        Field('view_count', 'record.view_count'),
+    )),
+    TableMapping('comments', (
+        Field('comment_id', 'record.comment_id'),
+        Field('user_id', 'context.user_id'),
+        Field('post_id', 'record.post_id'),
+        Field('comment_length', 'record.text', 'length'),
+        Field('comment_date', 'comment_date'),
+        Field('like_count', 'record.like_count'),
+        Field('author_username_hash', 'record.author_username', 'hash'),
+    )),
+    TableMapping('direct_messages', (
+        Field('message_id', 'record.message_id'),
+        Field('user_id', 'context.user_id'),
+        Field('conversation_id_hash', 'record.conversation_id', 'hash'),
+        Field('message_length', 'record.message_text', 'length'),
+        Field('message_date', 'message_date'),
+        Field('message_type_id', 'record.message_type', 'category', lookup='message_types'),
+        Field('is_sender', 'is_sender'),
+    )),
+    TableMapping('engagement_metrics', (
+        Field('user_id', 'context.user_id'),
+        Field('metric_date', 'record.date', 'parse_ts'),
+        Field('profile_views', 'record.profile_views'),
+        Field('reach', 'record.reach'),
+        Field('impressions', 'record.impressions'),
+        Field('website_clicks', 'record.website_clicks'),
+    )),
+)
+
+
+def _empty_hashtag_stats() -> Dict[str, Any]:
+    return {'count': 0, 'first_used': None, 'last_used': None}
+
+
+def _field(item: Any, name: str) -> Any:
+    return item.get(name) if isinstance(item, dict) else None
+
+
+def needed_collections(tables: Iterable[str]) -> List[str]:
+    """Collections a set of tables is built from, in COLLECTIONS order; others are never parsed."""
+    needed = {collection for table in tables for collection in TABLE_COLLECTIONS.get(table, ())}
+    return [collection for collection in COLLECTIONS if collection in needed]
+
+
+def read_batches(file_path: str, batch_size: int, collections: Iterable[str],
+                 window: TimeWindow) -> Iterator[Tuple[str, List[Any]]]:
+    """Yield validated batches of collections of an export, records outside the window are never validated."""
+    for collection in collections:
+        for batch in validate_batches(collection, iter_json_items(file_path, f"{collection}.item"), batch_size, window):
+            yield collection, batch
+
+
+def validate_batches(collection: str, items: Iterable[Any], batch_size: int,
+                     window: TimeWindow) -> Iterator[List[Any]]:
+    """Validate the raw records of a collection in batches, records outside the window are never validated."""
+    model, _, time_field = COLLECTIONS[collection]
+    batch = []
+    for item in items:
+        if window and not window.contains(_field(item, time_field)):
+            continue
+        batch.append(model.model_validate(item))
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def record_key(collection: str, user_id: str) -> Callable[[Any], Any]:
+    """Function returning the key records of a collection are deduplicated by."""
+    field = attrgetter(COLLECTIONS[collection][1])
+    if collection in USER_SCOPED_KEYS:
+        return lambda record: (user_id, field(record))
+    return field
+
+
+def admit_records(collection: str, records: List[Any], user_id: str, integrity: IntegrityChecker,
+                  proof_generator: InstagramProofGenerator,
+                  unique: Callable[[str, List[Any], Callable[[Any], Any]], List[Any]]) -> List[Any]:
+    """
+    Check and prove a batch of records as read, then drop those already written.
+
+    The refinement and refiner.verify both go through here, so a proof is
+    recomputed from an export exactly the way it was generated.
+
+    Args:
+        collection: Collection of the records
+        records: Validated records of the batch
+        user_id: ID of the user the export belongs to
+        integrity: Cross-reference checker of the export
+        proof_generator: Proof the records are added to
+        unique: Drops the records whose key was already seen, given the collection, records and key function
+
+    Returns:
+        The records to write rows for
+    """
+    # Every record of the export can be referred to, duplicates included
+    integrity.index(collection, records)
+    # The export is checked and proven as read, records an earlier input already wrote included
+    records = integrity.check(collection, records)
+    proof_generator.add(collection, records)
+    # Drop records repeated by re-exported or merged data before building any rows
+    return unique(collection, records, record_key(collection, user_id))
+
+
+def read_keys(file_path: str, collection: str, window: TimeWindow) -> Iterator[Any]:
+    """Yield the IDs of the records of a collection within the window, without validating the records."""
+    _, key, time_field = COLLECTIONS[collection]
+    for item in iter_json_items(file_path, f"{collection}.item"):
+        if not window or window.contains(_field(item, time_field)):
+            yield _field(item, key)
+
 
 class InstagramTransformer(DataTransformer):
     """
     Transformer for Instagram data with privacy-focused refinement.
     """
     
-    def transform(self, data: Dict[str, Any]) -> List[Base]:
+    lookup_models = (MediaTypeRefined, MessageTypeRefined)
+    row_mappings = ROW_MAPPINGS
+    
+    @property
+    def collections(self) -> List[str]:
+        """Collections the produced tables are built from, in COLLECTIONS order; others are never parsed."""
+        return needed_collections(self.tables)
+    
+    @property
+    def parallel_groups(self) -> Tuple[Tuple[str, ...], ...]:
+        collections = self.collections
+        groups = (tuple(collection for collection in group if collection in collections) for group in PARALLEL_GROUPS)
+        return tuple(group for group in groups if group)
+    
+    def transform(self, data: Dict[str, Any]) -> List[Any]:
         """
-        Transform raw Instagram data into SQLAlchemy model instances.
+        Transform raw Instagram data into table rows.
         
         Args:
             data: Dictionary containing Instagram data
             
         Returns:
-            List of SQLAlchemy model instances
+            SQLAlchemy model instances, and row tuples of the tables built by ROW_MAPPINGS
+        """
+        return [model for _, models in self.iter_sections(data) for model in models]
+    
+    def iter_sections(self, data: Dict[str, Any]) -> Iterator[Tuple[str, List[Base]]]:
+        """
+        Transform raw Instagram data one table at a time.
+        
+        Args:
+            data: Dictionary containing Instagram data
+            
+        Yields:
+            Table name and its rows: row tuples of the tables built by ROW_MAPPINGS,
+            SQLAlchemy model instances of the others
         """
+        # Collections no produced table needs and records outside the time window are dropped before validation
+        window = TimeWindow.from_settings(data.get('data_export_timestamp'), self.settings)
+        collections = self.collections
+        projected = {key: value for key, value in data.items() if key not in COLLECTIONS}
+        for collection in collections:
+            if collection in data:
+                projected[collection] = self._within(collection, data[collection], window)
+        
         # Validate data with Pydantic
-        instagram_data = InstagramData.model_validate(data)
-        export_date = parse_timestamp(instagram_data.data_export_timestamp)
+        instagram_data = InstagramData.model_validate(projected)
+        batches = ((collection, getattr(instagram_data, collection)) for collection in collections)
+        yield from self._build_sections(instagram_data, batches, window)
+    
+    def iter_file_sections(self, file_path: str, batch_size: int) -> Iterator[Tuple[str, List[Base]]]:
+        """
+        Stream an Instagram export from disk, holding one batch of records at a time.
         
-        models = []
+        The profile and export timestamp are read first, then every collection a
+        produced table needs is streamed in its own pass over the file.
         
-        # Create user profile
-        user_profile = self._create_user_profile(instagram_data, export_date)
-        models.append(user_profile)
+        Args:
+            file_path: Path to the JSON export
+            batch_size: Number of records validated and transformed together
+        """
+        header = InstagramData.model_validate(read_json_fields(file_path, HEADER_FIELDS))
+        window = TimeWindow.from_settings(header.data_export_timestamp, self.settings)
+        yield from self._build_sections(header, read_batches(file_path, batch_size, self.collections, window), window)
+    
+    def iter_stream_sections(self, stream: BinaryIO, batch_size: int) -> Iterator[Tuple[str, List[Base]]]:
+        """
+        Refine an Instagram export in a single pass over a stream, as its bytes arrive.
         
-        # Process posts
-        models.extend(self._create_posts(instagram_data))
+        Collections are built while the parser goes through them. A collection
+        that comes before the profile (or before the export timestamp, when
+        RECORDS_MAX_AGE_DAYS counts back from it), or ahead of one it must be
+        built after, is spooled to a temporary file and built once its turn comes.
         
-        # Process stories
-        models.extend(self._create_stories(instagram_data))
+        Args:
+            stream: Binary stream of the JSON export
+            batch_size: Number of records validated and transformed together
+        """
+        fields = iter_json_fields(stream)
+        needed = HEADER_FIELDS if self.settings.RECORDS_MAX_AGE_DAYS is not None else HEADER_FIELDS[:2]
+        header = {}
+        spools = {}
+        try:
+            for key, field in fields:
+                if key in HEADER_FIELDS:
+                    header[key] = field.value()
+                    if all(name in header for name in needed):
+                        break
+                elif key in self.collections:
+                    spools[key] = self._spool(field)
+            
+            # The export timestamp usually comes last, it is only needed once every record is built
+            data = InstagramData.model_validate({'data_export_timestamp': '', **header})
+            window = TimeWindow.from_settings(data.data_export_timestamp, self.settings)
+            batches = self._stream_batches(data, fields, spools, batch_size, window, 'data_export_timestamp' in header)
+            yield from self._build_sections(data, batches, window)
+        finally:
+            for spool in spools.values():
+                spool.close()
+    
+    def _stream_batches(self, data: InstagramData, fields: Iterator[Tuple[str, JsonField]], spools: Dict[str, Any],
+                        batch_size: int, window: TimeWindow, has_timestamp: bool) -> Iterator[Tuple[str, List[Any]]]:
+        """Validated batches of the fields left in the stream and of the spooled collections, in COLLECTIONS order."""
+        pending = list(self.collections)
+        
+        def spooled_turns() -> Iterator[Tuple[str, List[Any]]]:
+            while pending and pending[0] in spools:
+                collection = pending.pop(0)
+                spool = spools.pop(collection)
+                for batch in validate_batches(collection, map(json.loads, spool), batch_size, window):
+                    yield collection, batch
+                spool.close()
+        
+        yield from spooled_turns()
+        for key, field in fields:
+            if key == 'data_export_timestamp':
+                data.data_export_timestamp = field.value()
+                has_timestamp = True
+            elif key in pending and key != pending[0]:
+                spools[key] = self._spool(field)
+            elif key in pending:
+                pending.pop(0)
+                for batch in validate_batches(key, field.items(), batch_size, window):
+                    yield key, batch
+                yield from spooled_turns()
+        
+        if not has_timestamp:
+            raise ValueError("The export has no data_export_timestamp")
+        # Collections missing from the export are simply skipped
+        while pending:
+            if pending[0] not in spools:
+                pending.pop(0)
+            yield from spooled_turns()
+    
+    def _spool(self, field: JsonField) -> Any:
+        """Write the raw records of a collection field to a temporary JSON lines file, rewound for reading."""
+        spool = tempfile.TemporaryFile('w+', dir=self.settings.OUTPUT_DIR)
+        for item in field.items():
+            spool.write(json.dumps(item))
+            spool.write('\n')
+        spool.seek(0)
+        return spool
+    
+    def parallel_context(self, file_path: str) -> InstagramData:
+        """Read the profile and export timestamp every part is built with."""
+        return InstagramData.model_validate(read_json_fields(file_path, HEADER_FIELDS))
+    
+    def build_part(self, file_path: str, group: Tuple[str, ...], context: InstagramData,
+                   batch_size: int) -> Tuple[ActivityHistogram, Dict[str, Dict[str, Any]], Dict[str, RecordDigest],
+                                             Dict[str, Sketch], Dict[str, int]]:
+        """
+        Stream and save the collections of a parallel group.
         
-        # Process comments
-        models.extend(self._create_comments(instagram_data))
+        Returns:
+            The activity, hashtag usage, record digests, sketches and integrity counts of the group's collections
+        """
+        activity = ActivityHistogram(ACTIVITY_KINDS)
+        hashtag_stats = defaultdict(_empty_hashtag_stats)
+        proof_generator = InstagramProofGenerator(context)
+        integrity = self._integrity_checker(context)
+        window = TimeWindow.from_settings(context.data_export_timestamp, self.settings)
+        if 'comments' in group and 'posts' not in group and integrity.check_comments:
+            # Posts are built by another worker, only their IDs are read here
+            integrity.posts.update(read_keys(file_path, 'posts', window))
+        sections = self._build_collections(
+            context, read_batches(file_path, batch_size, group, window), activity, hashtag_stats, proof_generator,
+            integrity
+        )
+        self._write_sections(sections, '', batch_size)
+        digests = {collection: proof_generator.digests[collection] for collection in group}
+        sketches = {name: sketch for name, sketch in proof_generator.sketches.items() if name.split('.')[0] in group}
+        return activity, hashtag_stats, digests, sketches, integrity.counts
+    
+    def iter_merged_sections(self, context: InstagramData, states: List[Any]) -> Iterator[Tuple[str, List[Base]]]:
+        """Build the profile and the analytics over every collection from the states of the parts."""
+        activity = ActivityHistogram(ACTIVITY_KINDS)
+        hashtag_stats = {}
+        proof_generator = InstagramProofGenerator(context)
+        integrity = self._integrity_checker(context)
+        for part_activity, part_hashtag_stats, digests, sketches, integrity_counts in states:
+            activity.merge(part_activity)
+            hashtag_stats.update(part_hashtag_stats)
+            proof_generator.digests.update(digests)
+            proof_generator.sketches.update(sketches)
+            integrity.merge(integrity_counts)
+        
+        window = TimeWindow.from_settings(context.data_export_timestamp, self.settings)
+        yield from self._finish_sections(context, activity, hashtag_stats, proof_generator, integrity, window)
+    
+    def _build_sections(self, data: InstagramData, batches: Iterable[Tuple[str, List[Any]]],
+                        window: TimeWindow) -> Iterator[Tuple[str, List[Base]]]:
+        """
+        Build the rows of an export from batches of its records.
         
-        # Process direct messages
-        models.extend(self._create_direct_messages(instagram_data))
+        Args:
+            data: Export holding at least the user ID, profile and export timestamp
+            batches: Collection name and validated records, collections in COLLECTIONS order
+            window: Time window the records were read with, recorded in the proof
+        """
+        activity = ActivityHistogram(ACTIVITY_KINDS)
+        hashtag_stats = defaultdict(_empty_hashtag_stats)
+        proof_generator = InstagramProofGenerator(data)
+        integrity = self._integrity_checker(data)
         
-        # Process engagement metrics
-        models.extend(self._create_engagement_metrics(instagram_data))
+        yield from self._build_collections(data, batches, activity, hashtag_stats, proof_generator, integrity)
+        yield from self._finish_sections(data, activity, hashtag_stats, proof_generator, integrity, window)
+    
+    def _integrity_checker(self, data: InstagramData) -> IntegrityChecker:
+        """Checker of the cross-references of an export; comments are only checked if posts are read."""
+        return IntegrityChecker(
+            data.profile.username, check_comments='posts' in self.collections, drop_orphans=self.settings.DROP_ORPHANS
+        )
+    
+    def _within(self, collection: str, items: Any, window: TimeWindow) -> Any:
+        """Drop the raw records of a collection outside the time window."""
+        if not window or not isinstance(items, list):
+            return items
+        time_field = COLLECTIONS[collection][2]
+        return [item for item in items if window.contains(_field(item, time_field))]
+    
+    def _create_user_profiles(self, data: InstagramData,
+                              proof_generator: InstagramProofGenerator) -> List[UserProfileRefined]:
+        """Create the user profile, once per user across the inputs of a job."""
+        if 'user_profiles' not in self.tables or self._is_duplicate('user_profiles', data.user_id):
+            return []
+        return [self._create_user_profile(data, parse_timestamp(data.data_export_timestamp), proof_generator)]
+    
+    def _build_collections(self, data: InstagramData, batches: Iterable[Tuple[str, List[Any]]],
+                           activity: ActivityHistogram, hashtag_stats: Dict[str, Dict[str, Any]],
+                           proof_generator: InstagramProofGenerator,
+                           integrity: IntegrityChecker) -> Iterator[Tuple[str, List[Base]]]:
+        """Build the rows of batches of records, adding them to the running analytics, integrity checks and proof."""
+        for collection, records in batches:
+            records = admit_records(collection, records, data.user_id, integrity, proof_generator, self._unique)
+            
+            if collection == 'posts' and 'hashtag_usage' in self.tables:
+                self._count_hashtags(records, hashtag_stats)
+            if collection not in self.tables:
+                # Read for the analytics only
+                if 'activity_patterns' in self.tables and collection in ACTIVITY_KIND:
+                    activity.extend(ACTIVITY_KIND[collection], (parse_timestamp(record.timestamp) for record in records))
+                continue
+            
+            if collection == 'posts':
+                yield from self._create_posts(data, records, activity)
+            elif collection == 'stories':
+                yield collection, self._create_stories(data, records, activity)
+            elif collection == 'comments':
+                yield collection, self._create_comments(data, records, activity)
+            elif collection == 'direct_messages':
+                yield collection, self._create_direct_messages(data, records, activity)
+            else:
+                yield collection, self._create_engagement_metrics(data, records)
+    
+    def _finish_sections(self, data: InstagramData, activity: ActivityHistogram,
+                         hashtag_stats: Dict[str, Dict[str, Any]], proof_generator: InstagramProofGenerator,
+                         integrity: IntegrityChecker, window: TimeWindow) -> Iterator[Tuple[str, List[Base]]]:
+        """Build the profile and analytics tables once every record was seen, then save the proof."""
+        # Create the profile with the statistics sketched over its records
+        yield 'user_profiles', self._create_user_profiles(data, proof_generator)
         
         # Create hashtag usage analytics
-        models.extend(self._create_hashtag_usage(instagram_data))
+        if 'hashtag_usage' in self.tables:
+            yield 'hashtag_usage', self._create_hashtag_usage(data, hashtag_stats)
         
-        # Create activity patterns
-        models.extend(self._create_activity_patterns(instagram_data))
+        # Create activity patterns, once every record has been binned
+        if 'activity_patterns' in self.tables:
+            yield 'activity_patterns', self._create_activity_patterns(data, activity)
         
         # Generate and save proof
-        self._generate_proof(instagram_data)
-        
-        return models
+        self._generate_proof(proof_generator, integrity, window)
     
-    def _generate_proof(self, data: InstagramData) -> None:
-        """Generate proof file for data verification."""
-        proof_generator = InstagramProofGenerator(data)
-        proof = proof_generator.generate_proof()
-        
-        # Save proof to output directory
-        from refiner.config import settings
-        proof_path = os.path.join(settings.OUTPUT_DIR, "proof.json")
-        with open(proof_path, 'w') as f:
-            json.dump(proof.model_dump(), f, indent=2)
+    def _generate_proof(self, proof_generator: InstagramProofGenerator, integrity: IntegrityChecker,
+                        window: TimeWindow) -> None:
+        """Generate the proof of the current input, written to proof.json with those of the other inputs."""
+        proof = proof_generator.generate_proof(
+            duplicate_counts=self.input_duplicate_counts(),
+            refined_tables=sorted(self.tables) if self.settings.REFINED_TABLES else None,
+            window=window,
+            integrity=integrity.result(),
+            orphans_dropped=integrity.drop_orphans
+        )
+        self.proofs[self.input_name] = proof
     
-    def _create_user_profile(self, data: InstagramData, export_date: datetime) -> UserProfileRefined:
+    def _create_user_profile(self, data: InstagramData, export_date: datetime,
+                             proof_generator: InstagramProofGenerator) -> UserProfileRefined:
         """Create user profile with privacy-focused data."""
         profile = data.profile
+        sketches = proof_generator.sketches
         
         return UserProfileRefined(
             user_id=data.user_id,
@@ -94,127 +509,62 @@ class InstagramTransformer(DataTransformer):
             post_count=profile.post_count,
             is_verified=profile.is_verified,
             is_private=profile.is_private,
-            data_export_date=export_date
+            data_export_date=export_date,
+            distinct_commenters=proof_generator.distinct('comments.author_username'),
+            distinct_conversations=proof_generator.distinct('direct_messages.conversation_id'),
+            median_post_likes=sketches['posts.like_count'].quantile(0.5),
+            median_story_views=sketches['stories.view_count'].quantile(0.5),
+            median_engagement_rate=sketches['posts.engagement_rate'].quantile(0.5)
         )
     
-    def _create_posts(self, data: InstagramData) -> List[Base]:
-        """Create post records with media information."""
-        models = []
+    def _create_posts(self, data: InstagramData, posts: List[InstagramPost], activity: ActivityHistogram) -> Iterator[Tuple[str, List[tuple]]]:
+        """Create post rows, followed by the rows of their media."""
+        post_dates = [parse_timestamp(post.timestamp) for post in posts]
+        activity.extend('post_count', post_dates)
+        
+        # Calculate engagement rates for the whole batch at once
+        rates = engagement_rates(
+            [post.like_count for post in posts],
+            [post.comment_count for post in posts],
+            data.profile.follower_count
+        )
+        yield 'posts', self.row_builders['posts'].build(posts, data, post_date=post_dates, engagement_rate=rates)
         
-        for post in data.posts:
-            post_date = parse_timestamp(post.timestamp)
-            
-            # Calculate engagement rate
-            total_followers = data.profile.follower_count
-            engagement_rate = ((post.like_count + post.comment_count) / total_followers * 100) if total_followers > 0 else 0
-            
-            post_refined = PostRefined(
-                post_id=post.post_id,
-                user_id=data.user_id,
-                caption_length=len(post.caption) if post.caption else 0,
-                post_date=post_date,
-                like_count=post.like_count,
-                comment_count=post.comment_count,
-                media_count=len(post.media),
-                has_location=bool(post.location),
-                hashtag_count=len(post.hashtags),
-                engagement_rate=engagement_rate
+        if 'media' in self.tables:
+            media = [(post.post_id, item) for post in posts for item in post.media]
+            yield 'media', self.row_builders['media'].build(
+                [item for _, item in media], data, post_id=[post_id for post_id, _ in media]
             )
-            models.append(post_refined)
-            
-            # Create media records
-            for media in post.media:
-                media_refined = MediaRefined(
-                    post_id=post.post_id,
-                    media_type=media.media_type
-                )
-                models.append(media_refined)
-        
-        return models
     
-    def _create_stories(self, data: InstagramData) -> List[StoryRefined]:
-        """Create story records."""
-        models = []
-        
-        for story in data.stories:
-            story_date = parse_timestamp(story.timestamp)
-            
-            story_refined = StoryRefined(
-                story_id=story.story_id,
-                user_id=data.user_id,
-                story_date=story_date,
-                media_type=story.media_type,
-                view_count=story.view_count
-            )
-            models.append(story_refined)
-        
-        return models
+    def _create_stories(self, data: InstagramData, stories: List[InstagramStory], activity: ActivityHistogram) -> List[tuple]:
+        """Create story rows."""
+        story_dates = [parse_timestamp(story.timestamp) for story in stories]
+        activity.extend('story_count', story_dates)
+        return self.row_builders['stories'].build(stories, data, story_date=story_dates)
     
-    def _create_comments(self, data: InstagramData) -> List[CommentRefined]:
-        """Create comment records with privacy protection."""
-        models = []
-        
-        for comment in data.comments:
-            comment_date = parse_timestamp(comment.timestamp)
-            
-            comment_refined = CommentRefined(
-                comment_id=comment.comment_id,
-                user_id=data.user_id,
-                post_id=comment.post_id,
-                comment_length=len(comment.text),
-                comment_date=comment_date,
-                like_count=comment.like_count,
-                author_username_hash=hash_text(comment.author_username)
-            )
-            models.append(comment_refined)
-        
-        return models
+    def _create_comments(self, data: InstagramData, comments: List[InstagramComment], activity: ActivityHistogram) -> List[tuple]:
+        """Create comment rows with privacy protection."""
+        comment_dates = [parse_timestamp(comment.timestamp) for comment in comments]
+        activity.extend('comment_count', comment_dates)
+        return self.row_builders['comments'].build(comments, data, comment_date=comment_dates)
     
-    def _create_direct_messages(self, data: InstagramData) -> List[DirectMessageRefined]:
-        """Create direct message records with privacy protection."""
-        models = []
-        
-        for dm in data.direct_messages:
-            message_date = parse_timestamp(dm.timestamp)
-            
-            dm_refined = DirectMessageRefined(
-                message_id=dm.message_id,
-                user_id=data.user_id,
-                conversation_id_hash=hash_text(dm.conversation_id),
-                message_length=len(dm.message_text) if dm.message_text else 0,
-                message_date=message_date,
-                message_type=dm.message_type,
-                is_sender=(dm.sender_username == data.profile.username)
-            )
-            models.append(dm_refined)
-        
-        return models
+    def _create_direct_messages(self, data: InstagramData, direct_messages: List[InstagramDM], activity: ActivityHistogram) -> List[tuple]:
+        """Create direct message rows with privacy protection."""
+        message_dates = [parse_timestamp(dm.timestamp) for dm in direct_messages]
+        activity.extend('dm_count', message_dates)
+        username = data.profile.username
+        return self.row_builders['direct_messages'].build(
+            direct_messages, data, message_date=message_dates,
+            is_sender=[dm.sender_username == username for dm in direct_messages]
+        )
     
-    def _create_engagement_metrics(self, data: InstagramData) -> List[EngagementMetricRefined]:
-        """Create engagement metric records."""
-        models = []
-        
-        for metric in data.engagement_metrics:
-            metric_date = parse_timestamp(metric.date)
-            
-            engagement_refined = EngagementMetricRefined(
-                user_id=data.user_id,
-                metric_date=metric_date,
-                profile_views=metric.profile_views,
-                reach=metric.reach,
-                impressions=metric.impressions,
-                website_clicks=metric.website_clicks
-            )
-            models.append(engagement_refined)
-        
-        return models
+    def _create_engagement_metrics(self, data: InstagramData, metrics: List[InstagramEngagement]) -> List[tuple]:
+        """Create engagement metric rows."""
+        return self.row_builders['engagement_metrics'].build(metrics, data)
     
-    def _create_hashtag_usage(self, data: InstagramData) -> List[HashtagUsageRefined]:
-        """Analyze hashtag usage patterns."""
-        models = []
-        hashtag_stats = defaultdict(lambda: {'count': 0, 'first_used': None, 'last_used': None})
-        
-        for post in data.posts:
+    def _count_hashtags(self, posts: List[InstagramPost], hashtag_stats: Dict[str, Dict[str, Any]]) -> None:
+        """Add the hashtags of a batch of posts to the running usage statistics."""
+        for post in posts:
             post_date = parse_timestamp(post.timestamp)
             for hashtag in post.hashtags:
                 hashtag_hash = hash_text(hashtag.lower())
@@ -225,6 +575,10 @@ class InstagramTransformer(DataTransformer):
                     stats['first_used'] = post_date
                 if stats['last_used'] is None or post_date > stats['last_used']:
                     stats['last_used'] = post_date
+    
+    def _create_hashtag_usage(self, data: InstagramData, hashtag_stats: Dict[str, Dict[str, Any]]) -> List[HashtagUsageRefined]:
+        """Analyze hashtag usage patterns."""
+        models = []
         
         for hashtag_hash, stats in hashtag_stats.items():
             hashtag_usage = HashtagUsageRefined(
@@ -238,46 +592,20 @@ class InstagramTransformer(DataTransformer):
         
         return models
     
-    def _create_activity_patterns(self, data: InstagramData) -> List[ActivityPatternRefined]:
+    def _create_activity_patterns(self, data: InstagramData, activity: ActivityHistogram) -> List[ActivityPatternRefined]:
         """Analyze user activity patterns by hour and day."""
         models = []
-        activity_patterns = defaultdict(lambda: {
-            'post_count': 0, 'story_count': 0, 'comment_count': 0, 'dm_count': 0
-        })
-        
-        # Analyze posts
-        for post in data.posts:
-            post_date = parse_timestamp(post.timestamp)
-            key = (post_date.hour, post_date.weekday())
-            activity_patterns[key]['post_count'] += 1
-        
-        # Analyze stories
-        for story in data.stories:
-            story_date = parse_timestamp(story.timestamp)
-            key = (story_date.hour, story_date.weekday())
-            activity_patterns[key]['story_count'] += 1
-        
-        # Analyze comments
-        for comment in data.comments:
-            comment_date = parse_timestamp(comment.timestamp)
-            key = (comment_date.hour, comment_date.weekday())
-            activity_patterns[key]['comment_count'] += 1
-        
-        # Analyze DMs
-        for dm in data.direct_messages:
-            dm_date = parse_timestamp(dm.timestamp)
-            key = (dm_date.hour, dm_date.weekday())
-            activity_patterns[key]['dm_count'] += 1
         
-        for (hour, day), counts in activity_patterns.items():
+        # Timestamps were binned while creating the records, only the histogram is left
+        for row in activity.rows():
             pattern = ActivityPatternRefined(
                 user_id=data.user_id,
-                hour_of_day=hour,
-                day_of_week=day,
-                post_count=counts['post_count'],
-                story_count=counts['story_count'],
-                comment_count=counts['comment_count'],
-                dm_count=counts['dm_count']
+                hour_of_day=row['hour_of_day'],
+                day_of_week=row['day_of_week'],
+                post_count=row['post_count'],
+                story_count=row['story_count'],
+                comment_count=row['comment_count'],
+                dm_count=row['dm_count']
             )
             models.append(pattern)
         
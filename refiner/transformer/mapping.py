@@ -0,0 +1,143 @@
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple, Union
+
+from sqlalchemy import Table
+from sqlalchemy.engine import Dialect
+
+from refiner.utils.categories import CategoryCodec
+from refiner.utils.date import parse_timestamp
+from refiner.utils.pii import hash_text
+
+# Named transforms, as expression templates around the source value
+TRANSFORMS = {
+    'hash': 'hash_text({})',
+    'length': 'len({} or ())',  # Length of an optional string, 0 when missing
+    'count': 'len({})',
+    'bool': 'bool({})',
+    'parse_ts': 'parse_timestamp({})',
+    'category': '{lookup}({})',  # Code of the value in a lookup table
+}
+
+
+class Field(NamedTuple):
+    """
+    A refined column and where its value comes from.
+
+    The source is a dotted path rooted at `record` (the source record) or
+    `context` (the same for every record of a batch, e.g. the export), or the
+    name of a per-record input: a sequence aligned with the records, computed
+    by the transformer for the whole batch (e.g. engagement rates).
+    """
+    column: str
+    source: str
+    transform: Union[str, Callable[[Any], Any], None] = None  # Name in TRANSFORMS or a function of the value
+    lookup: Optional[str] = None  # Lookup table of the 'category' transform
+
+
+class TableMapping(NamedTuple):
+    """Declarative mapping of source records to the rows of a refined table."""
+    table: str
+    fields: Tuple[Field, ...]
+
+
+class RowBuilder(NamedTuple):
+    """A table mapping compiled for one database."""
+    table: str
+    columns: Tuple[str, ...]
+    inputs: Tuple[str, ...]
+    build: Callable[..., List[tuple]]  # build(records, context, **inputs) -> row tuples
+    insert_sql: str
+    source: str  # Generated code, for debugging
+
+
+def compile_mapping(mapping: TableMapping, table: Table, dialect: Dialect,
+                    categories: Optional[Dict[str, CategoryCodec]] = None) -> RowBuilder:
+    """
+    Compile a table mapping into a function building the rows of a batch.
+
+    The function is generated once: attribute paths, transforms and the
+    column conversions of the dialect (e.g. datetimes to text on SQLite) are
+    inlined into a single list comprehension, and context values are computed
+    once per batch. Rows come out ready for the DB-API driver, in the column
+    order of the mapping.
+
+    Args:
+        mapping: Table mapping
+        table: SQLAlchemy table the rows are inserted into
+        dialect: Dialect of the database the rows are written to
+        categories: Lookup codecs by table name, for 'category' transforms
+    """
+    namespace: Dict[str, Any] = {'hash_text': hash_text, 'parse_timestamp': parse_timestamp}
+    hoisted: List[str] = []
+    inputs: List[str] = []
+    values: List[str] = []
+
+    for index, field in enumerate(mapping.fields):
+        if field.column not in table.columns:
+            raise ValueError(f"Table {table.name} has no column {field.column}")
+        root, *path = field.source.split('.')
+        if not all(part.isidentifier() for part in (root, *path)):
+            raise ValueError(f"Invalid source {field.source!r} of {table.name}.{field.column}")
+
+        if root == 'record':
+            expression = '.'.join(['r', *path])
+        elif root == 'context':
+            expression = '.'.join(['context', *path])
+        elif path:
+            raise ValueError(f"Source {field.source!r} of {table.name}.{field.column} must start with record or context")
+        else:
+            if root not in inputs:
+                inputs.append(root)
+            expression = f"i{inputs.index(root)}"
+
+        expression = _apply_transform(field, expression, index, namespace, categories or {})
+        column_type = table.columns[field.column].type
+        processor = column_type.dialect_impl(dialect).bind_processor(dialect)
+        if processor is not None:
+            namespace[f'p{index}'] = processor
+            expression = f"p{index}({expression})"
+
+        if root == 'context':
+            hoisted.append(f"    c{index} = {expression}")
+            expression = f"c{index}"
+        values.append(expression)
+
+    row = f"({', '.join(values)},)"
+    if inputs:
+        aligned = ', '.join(f"inputs[{name!r}]" for name in inputs)
+        loop = f"for r, {', '.join(f'i{index}' for index in range(len(inputs)))} in zip(records, {aligned})"
+    else:
+        loop = "for r in records"
+    source = "\n".join([
+        f"def build_{table.name}(records, context, **inputs):",
+        *hoisted,
+        f"    return [{row} {loop}]",
+    ])
+    exec(compile(source, f"<mapping {table.name}>", 'exec'), namespace)
+
+    columns = tuple(field.column for field in mapping.fields)
+    return RowBuilder(
+        table=table.name,
+        columns=columns,
+        inputs=tuple(inputs),
+        build=namespace[f'build_{table.name}'],
+        insert_sql=f"INSERT INTO {table.name} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+        source=source
+    )
+
+
+def _apply_transform(field: Field, expression: str, index: int, namespace: Dict[str, Any],
+                     categories: Dict[str, CategoryCodec]) -> str:
+    if field.transform is None:
+        return expression
+    if callable(field.transform):
+        namespace[f't{index}'] = field.transform
+        return f"t{index}({expression})"
+    if field.transform not in TRANSFORMS:
+        raise ValueError(f"Unknown transform {field.transform!r} of column {field.column}")
+    if field.transform == 'category':
+        if field.lookup not in categories:
+            raise ValueError(f"Column {field.column} is coded in {field.lookup}, which is not a produced lookup table")
+        namespace[f'l{index}'] = categories[field.lookup].code
+        return TRANSFORMS['category'].format(expression, lookup=f'l{index}')
+    return TRANSFORMS[field.transform].format(expression)
+
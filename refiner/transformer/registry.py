@@ -0,0 +1,155 @@
+import importlib
+import logging
+from importlib.metadata import entry_points
+from typing import FrozenSet, Iterable, List, Optional, Type
+
+ENTRY_POINT_GROUP = "refiner.transformers"
+
+# Only the head of a file is inspected to detect its type
+SNIFF_BYTES = 16 * 1024
+
+
+class TransformerSpec:
+    """
+    Registry entry describing a transformer without importing it.
+
+    The detector is declared here rather than on the transformer class, so
+    inputs can be matched before any transformer module is imported.
+    """
+
+    def __init__(self, name: str, target: str, keys: Iterable[str]):
+        """
+        Args:
+            name: Short name of the input type
+            target: Transformer class as "module:ClassName"
+            keys: Top-level keys that must all appear near the start of an input of this type
+        """
+        self.name = name
+        self.target = target
+        self.keys: FrozenSet[str] = frozenset(keys)
+        self._transformer_class = None
+
+    def matches(self, top_level_keys: FrozenSet[str]) -> bool:
+        return bool(self.keys) and self.keys <= top_level_keys
+
+    def load(self) -> Type:
+        """Import the transformer class."""
+        if self._transformer_class is None:
+            module_name, class_name = self.target.split(':')
+            self._transformer_class = getattr(importlib.import_module(module_name), class_name)
+        return self._transformer_class
+
+    def __repr__(self) -> str:
+        return f"TransformerSpec({self.name!r}, {self.target!r})"
+
+
+BUILTIN_TRANSFORMERS = [
+    TransformerSpec(
+        'instagram',
+        'refiner.transformer.instagram_transformer:InstagramTransformer',
+        ('user_id', 'profile')
+    ),
+    TransformerSpec(
+        'user',
+        'refiner.transformer.user_transformer:UserTransformer',
+        ('userId', 'email')
+    ),
+]
+
+_registry: Optional[List[TransformerSpec]] = None
+
+
+def get_registry() -> List[TransformerSpec]:
+    """
+    Return the known transformers, most specific first.
+
+    Plugins register a `TransformerSpec` under the `refiner.transformers` entry
+    point group; loading the entry point only imports the spec, not the transformer.
+    """
+    global _registry
+    if _registry is None:
+        specs = list(BUILTIN_TRANSFORMERS)
+        for entry_point in entry_points(group=ENTRY_POINT_GROUP):
+            try:
+                specs.append(entry_point.load())
+            except Exception as e:
+                logging.warning(f"Skipping transformer plugin {entry_point.name}: {e}")
+        _registry = sorted(specs, key=lambda spec: len(spec.keys), reverse=True)
+    return _registry
+
+
+def detect_transformer(file_path: str) -> Optional[TransformerSpec]:
+    """
+    Find the transformer for an input file by sniffing its top-level keys.
+
+    Args:
+        file_path: Path to a JSON input file
+
+    Returns:
+        The matching transformer spec, or None if no transformer recognises the file
+    """
+    with open(file_path, 'rb') as f:
+        head = f.read(SNIFF_BYTES)
+    return match_transformer(head)
+
+
+def match_transformer(head: bytes) -> Optional[TransformerSpec]:
+    """
+    Find the transformer for an input from the first SNIFF_BYTES of its content.
+
+    Args:
+        head: Head of a JSON input, e.g. of an upload still arriving
+
+    Returns:
+        The matching transformer spec, or None if no transformer recognises the input
+    """
+    keys = sniff_top_level_keys(head.decode('utf-8', errors='ignore'))
+    return next((spec for spec in get_registry() if spec.matches(keys)), None)
+
+
+def sniff_top_level_keys(head: str) -> FrozenSet[str]:
+    """
+    Collect the keys of the top-level JSON object found in the head of a document.
+
+    The head may be cut anywhere, keys after the cut are simply not reported.
+    """
+    keys = set()
+    depth = 0
+    position = 0
+    length = len(head)
+    while position < length:
+        char = head[position]
+        if char == '"':
+            end = _string_end(head, position)
+            if end is None:
+                break
+            if depth == 1:
+                # A string at the top level of the object is a key if a colon follows
+                after = end + 1
+                while after < length and head[after] in ' \t\r\n':
+                    after += 1
+                if after < length and head[after] == ':':
+                    keys.add(head[position + 1:end])
+            position = end + 1
+            continue
+        if char in '{[':
+            depth += 1
+        elif char in '}]':
+            depth -= 1
+        position += 1
+    return frozenset(keys)
+
+
+def _string_end(text: str, start: int) -> Optional[int]:
+    """Return the index of the quote closing the string opened at `start`."""
+    position = start + 1
+    while True:
+        position = text.find('"', position)
+        if position == -1:
+            return None
+        backslashes = 0
+        while text[position - 1 - backslashes] == '\\':
+            backslashes += 1
+        if backslashes % 2 == 0:
+            return position
+        position += 1
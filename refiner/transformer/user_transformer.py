@@ -1,7 +1,7 @@
 from typing import Dict, Any, List
 from refiner.models.refined import Base
 from refiner.transformer.base_transformer import DataTransformer
-from refiner.models.refined import UserRefined, StorageMetric, AuthSource
+from refiner.models.refined import UserBase, UserRefined, StorageMetric, AuthSource
 from refiner.models.unrefined import User
 from refiner.utils.date import parse_timestamp
 from refiner.utils.pii import mask_email
@@ -11,6 +11,8 @@ class UserTransformer(DataTransformer):
     Transformer for user data as defined in the example.
     """
     
+    base = UserBase
+    
     def transform(self, data: Dict[str, Any]) -> List[Base]:
         """
         Transform raw user data into SQLAlchemy model instances.
@@ -25,16 +27,18 @@ class UserTransformer(DataTransformer):
         unrefined_user = User.model_validate(data)
         created_at = parse_timestamp(unrefined_user.timestamp)
         
-        # Create user instance
-        user = UserRefined(
-            user_id=unrefined_user.userId,
-            email=mask_email(unrefined_user.email),  # Apply any PII masking (optional)
-            name=unrefined_user.profile.name,
-            locale=unrefined_user.profile.locale,
-            created_at=created_at
-        )
+        models = []
         
-        models = [user]
+        # Create user instance, keeping the first one when several inputs describe the same user
+        if not self._is_duplicate('users', unrefined_user.userId):
+            user = UserRefined(
+                user_id=unrefined_user.userId,
+                email=mask_email(unrefined_user.email),  # Apply any PII masking (optional)
+                name=unrefined_user.profile.name,
+                locale=unrefined_user.profile.locale,
+                created_at=created_at
+            )
+            models.append(user)
         
         if unrefined_user.storage:
             storage_metric = StorageMetric(
@@ -0,0 +1,92 @@
+from array import array
+from datetime import datetime
+from typing import Dict, Iterable, List, Sequence
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional, fall back to pure Python
+    np = None
+
+HOURS_PER_DAY = 24
+DAYS_PER_WEEK = 7
+ACTIVITY_BINS = HOURS_PER_DAY * DAYS_PER_WEEK
+
+
+def engagement_rates(like_counts: Sequence[int], comment_counts: Sequence[int], follower_count: int) -> List[float]:
+    """
+    Calculate the engagement rate of every post in one pass.
+
+    Args:
+        like_counts: Like count per post
+        comment_counts: Comment count per post, aligned with like_counts
+        follower_count: Follower count of the profile
+
+    Returns:
+        Engagement rate per post as a percentage of followers
+    """
+    if follower_count <= 0:
+        return [0] * len(like_counts)
+
+    if np is not None and len(like_counts) > 0:
+        likes = np.asarray(like_counts, dtype=np.float64)
+        comments = np.asarray(comment_counts, dtype=np.float64)
+        return ((likes + comments) / follower_count * 100).tolist()
+
+    return [(likes + comments) / follower_count * 100 for likes, comments in zip(like_counts, comment_counts)]
+
+
+class ActivityHistogram:
+    """
+    Columnar accumulator for hour-of-day x day-of-week activity counts.
+
+    Timestamps are reduced to a single bin index (hour * 7 + weekday) as they
+    are added, so each record is parsed once and binned in bulk at the end.
+    """
+
+    def __init__(self, kinds: Iterable[str]):
+        self._bins: Dict[str, array] = {kind: array('q') for kind in kinds}
+
+    def add(self, kind: str, moment: datetime) -> None:
+        """Record a single activity of the given kind."""
+        self._bins[kind].append(moment.hour * DAYS_PER_WEEK + moment.weekday())
+
+    def extend(self, kind: str, moments: Iterable[datetime]) -> None:
+        """Record many activities of the given kind."""
+        self._bins[kind].extend(moment.hour * DAYS_PER_WEEK + moment.weekday() for moment in moments)
+
+    def merge(self, other: "ActivityHistogram") -> None:
+        """Add the activities recorded by another histogram, e.g. one built in another process."""
+        for kind, bins in other._bins.items():
+            self._bins[kind].extend(bins)
+
+    def counts(self) -> Dict[str, List[int]]:
+        """Return the per-kind activity counts, indexed by hour * 7 + weekday."""
+        return {kind: _bincount(bins) for kind, bins in self._bins.items()}
+
+    def rows(self) -> List[Dict[str, int]]:
+        """
+        Return one row per (hour, weekday) cell that saw any activity.
+
+        Rows are ordered by hour then weekday and carry a `<kind>` count for every kind.
+        """
+        counts = self.counts()
+        rows = []
+        for index in range(ACTIVITY_BINS):
+            cell = {kind: kind_counts[index] for kind, kind_counts in counts.items()}
+            if any(cell.values()):
+                hour, day = divmod(index, DAYS_PER_WEEK)
+                rows.append({'hour_of_day': hour, 'day_of_week': day, **cell})
+        return rows
+
+
+def _bincount(bins: array) -> List[int]:
+    """Count occurrences of every activity bin."""
+    if np is not None:
+        if len(bins) == 0:
+            return [0] * ACTIVITY_BINS
+        return np.bincount(np.frombuffer(bins, dtype=np.int64), minlength=ACTIVITY_BINS).tolist()
+
+    counts = [0] * ACTIVITY_BINS
+    for index in bins:
+        counts[index] += 1
+    return counts
@@ -0,0 +1,51 @@
+import sys
+from typing import Dict, List, Tuple
+
+from sqlalchemy import insert, select
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+
+class CategoryCodec:
+    """
+    Maps the values of a categorical field to the integer codes of a lookup table.
+
+    Lookup models have an integer primary key and a unique `name` column. Codes
+    of values already in the table are loaded up front, new values get the next
+    free code in the order they are first seen, so transforming the same data
+    again, for example after resuming from a checkpoint, yields the same codes.
+    """
+
+    def __init__(self, model):
+        """
+        Args:
+            model: SQLAlchemy model of the lookup table
+        """
+        self.table = model.__table__
+        self.key = self.table.primary_key.columns.values()[0]
+        self.codes: Dict[str, int] = {}
+        self.pending: List[Tuple[int, str]] = []
+
+    def load(self, connection: Connection) -> None:
+        """Load the codes already stored in the lookup table."""
+        for code, name in connection.execute(select(self.key, self.table.c.name)):
+            self.codes[sys.intern(name)] = code
+
+    def code(self, value: str) -> int:
+        """Return the code of a value, assigning a new one if the value was not seen yet."""
+        code = self.codes.get(value)
+        if code is None:
+            code = max(self.codes.values(), default=0) + 1
+            self.codes[sys.intern(value)] = code
+            self.pending.append((code, value))
+        return code
+
+    def flush(self, session: Session) -> None:
+        """Write the newly assigned codes, as part of the session's transaction."""
+        if not self.pending:
+            return
+        session.execute(
+            insert(self.table).prefix_with('OR IGNORE'),
+            [{self.key.name: code, 'name': name} for code, name in self.pending]
+        )
+        self.pending = []
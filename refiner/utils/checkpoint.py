@@ -0,0 +1,153 @@
+import hashlib
+import os
+import sqlite3
+from contextlib import closing
+from typing import Dict, Optional
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+
+# Name the checkpoint database is attached under on transformer connections
+SCHEMA = "checkpoint"
+
+# Bumped when the layout of the checkpoint database changes
+FORMAT_VERSION = 1
+
+TABLES = (
+    "CREATE TABLE IF NOT EXISTS {schema}meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS {schema}inputs (name TEXT PRIMARY KEY, sha256 TEXT NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS {schema}progress ("
+    "input TEXT NOT NULL, section TEXT NOT NULL, committed INTEGER NOT NULL, PRIMARY KEY (input, section))",
+    "CREATE TABLE IF NOT EXISTS {schema}stages ("
+    "stage TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, PRIMARY KEY (stage, key))",
+)
+
+
+def file_sha256(file_path: str) -> str:
+    """Hash a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def code_version(schema_version: str = "") -> str:
+    """
+    Hash the refiner's source code, the checkpoint format and a schema version.
+
+    Rows committed by another version of the code may differ from those this
+    version would write, so a checkpoint is only resumed by the version that
+    started it.
+    """
+    package_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    digest = hashlib.sha256(f"{FORMAT_VERSION}\0{schema_version}\0".encode())
+    for directory, subdirectories, filenames in os.walk(package_dir):
+        subdirectories.sort()
+        for filename in sorted(filenames):
+            if filename.endswith('.py'):
+                path = os.path.join(directory, filename)
+                digest.update(os.path.relpath(path, package_dir).encode() + b"\0")
+                with open(path, 'rb') as f:
+                    digest.update(hashlib.sha256(f.read()).digest())
+    return digest.hexdigest()
+
+
+class Checkpoint:
+    """
+    Durable progress of a refinement job, kept in a SQLite database next to the refinement.
+
+    The checkpoint records the version of the code that started it, the hash
+    of every input, how many records of each section of an input are
+    committed, and the results of the encrypt and upload stages keyed by the
+    artifact they were computed for. It is removed once the job completes.
+
+    Record counts are written through the transformer's own connection, which
+    has the checkpoint database attached, so they commit in the same transaction
+    as the rows they count: after a crash the refinement never holds rows the
+    checkpoint does not account for.
+    """
+
+    def __init__(self, db_path: str):
+        """
+        Args:
+            db_path: Path to the refinement database the checkpoint belongs to
+        """
+        self.path = f"{db_path}.checkpoint"
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=30)
+        for table in TABLES:
+            connection.execute(table.format(schema=""))
+        return connection
+
+    def resumable(self, inputs: Dict[str, str], version: str) -> bool:
+        """
+        Check whether the checkpoint was started for exactly these inputs, by this version of the code.
+
+        Args:
+            inputs: SHA-256 hash of every input file, by file name
+            version: Version of the code and schema, see code_version
+        """
+        if not os.path.exists(self.path):
+            return False
+        with closing(self._connect()) as connection:
+            recorded = dict(connection.execute("SELECT name, sha256 FROM inputs"))
+            recorded_version = connection.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        return bool(recorded) and recorded == inputs and recorded_version == (version,)
+
+    def start(self, inputs: Dict[str, str], version: str) -> None:
+        """Replace any previous checkpoint with an empty one for these inputs and this version of the code."""
+        self.clear()
+        with closing(self._connect()) as connection:
+            connection.execute("INSERT INTO meta (key, value) VALUES ('version', ?)", (version,))
+            connection.executemany("INSERT INTO inputs (name, sha256) VALUES (?, ?)", inputs.items())
+            connection.commit()
+
+    def clear(self) -> None:
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def attach(self, engine: Engine) -> None:
+        """Attach the checkpoint database to every connection the engine opens."""
+        path = self.path
+
+        @event.listens_for(engine, "connect")
+        def attach_checkpoint(dbapi_connection, connection_record):
+            dbapi_connection.execute(f"ATTACH DATABASE ? AS {SCHEMA}", (path,))
+            for table in TABLES:
+                dbapi_connection.execute(table.format(schema=f"{SCHEMA}."))
+
+    @staticmethod
+    def committed(session: Session, input_name: str, section: str) -> int:
+        """Return how many records of a section of an input are already committed."""
+        row = session.execute(
+            text(f"SELECT committed FROM {SCHEMA}.progress WHERE input = :input AND section = :section"),
+            {"input": input_name, "section": section}
+        ).first()
+        return row[0] if row else 0
+
+    @staticmethod
+    def advance(session: Session, input_name: str, section: str, committed: int) -> None:
+        """Record the committed record count of a section, as part of the session's transaction."""
+        session.execute(
+            text(f"INSERT OR REPLACE INTO {SCHEMA}.progress (input, section, committed) "
+                 "VALUES (:input, :section, :committed)"),
+            {"input": input_name, "section": section, "committed": committed}
+        )
+
+    def stage(self, stage: str, key: str) -> Optional[str]:
+        """Return the recorded result of a stage for an artifact, if the stage completed."""
+        with closing(self._connect()) as connection:
+            row = connection.execute("SELECT value FROM stages WHERE stage = ? AND key = ?", (stage, key)).fetchone()
+        return row[0] if row else None
+
+    def complete_stage(self, stage: str, key: str, value: str) -> None:
+        """Record the result of a stage for an artifact."""
+        with closing(self._connect()) as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO stages (stage, key, value) VALUES (?, ?, ?)", (stage, key, value)
+            )
+            connection.commit()
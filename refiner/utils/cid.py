@@ -0,0 +1,144 @@
+import base64
+import hashlib
+from typing import BinaryIO, Iterable, List, Tuple
+
+# Defaults of the IPFS importer used by Pinata (and `ipfs add`): fixed-size
+# 256 KiB chunks laid out as a balanced DAG of at most 174 links per node
+CHUNK_SIZE = 256 * 1024
+MAX_LINKS = 174
+
+DAG_PB_CODEC = 0x70
+RAW_CODEC = 0x55
+SHA2_256 = 0x12
+UNIXFS_FILE = 2
+
+BASE58_ALPHABET = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+
+
+def bytes_cid(data: bytes, version: int = 0) -> str:
+    """
+    Compute the IPFS CID that pinning `data` as a file would produce.
+
+    Args:
+        data: File content
+        version: CID version, 0 (dag-pb leaves) or 1 (raw leaves)
+
+    Returns:
+        CID string (base58btc for v0, base32 for v1)
+    """
+    return _file_cid(_split(data), version)
+
+
+def file_cid(file_path: str, version: int = 0) -> str:
+    """
+    Compute the IPFS CID of a file, reading it one chunk at a time.
+
+    Args:
+        file_path: Path to the file
+        version: CID version, 0 (dag-pb leaves) or 1 (raw leaves)
+
+    Returns:
+        CID string (base58btc for v0, base32 for v1)
+    """
+    with open(file_path, 'rb') as f:
+        return _file_cid(_read_chunks(f), version)
+
+
+def _split(data: bytes) -> Iterable[bytes]:
+    view = memoryview(data)
+    if not view:
+        yield b""
+    for offset in range(0, len(view), CHUNK_SIZE):
+        yield view[offset:offset + CHUNK_SIZE]
+
+
+def _read_chunks(f: BinaryIO) -> Iterable[bytes]:
+    chunk = f.read(CHUNK_SIZE)
+    yield chunk
+    while len(chunk) == CHUNK_SIZE:
+        chunk = f.read(CHUNK_SIZE)
+        if chunk:
+            yield chunk
+
+
+def _file_cid(chunks: Iterable[bytes], version: int) -> str:
+    if version not in (0, 1):
+        raise ValueError(f"Unsupported CID version: {version}")
+
+    # Every node is tracked as (cid bytes, file bytes below it, cumulative block size)
+    level = [_leaf(chunk, version) for chunk in chunks]
+    while len(level) > 1:
+        level = [_parent(level[i:i + MAX_LINKS], version) for i in range(0, len(level), MAX_LINKS)]
+    return _encode_cid(level[0][0], version)
+
+
+def _leaf(chunk: bytes, version: int) -> Tuple[bytes, int, int]:
+    if version == 1:
+        # CIDv1 imports use raw leaves holding the chunk bytes as-is
+        return _cid_bytes(RAW_CODEC, chunk, version), len(chunk), len(chunk)
+
+    # Every dag-pb leaf is a UnixFS File node, as kubo's balanced importer writes them (see tests/test_cid.py)
+    unixfs = _field_varint(1, UNIXFS_FILE)
+    if chunk:
+        unixfs += _field_bytes(2, chunk)
+    unixfs += _field_varint(3, len(chunk))
+    block = _field_bytes(1, unixfs)
+    return _cid_bytes(DAG_PB_CODEC, block, version), len(chunk), len(block)
+
+
+def _parent(children: List[Tuple[bytes, int, int]], version: int) -> Tuple[bytes, int, int]:
+    unixfs = _field_varint(1, UNIXFS_FILE) + _field_varint(3, sum(size for _, size, _ in children))
+    for _, size, _ in children:
+        unixfs += _field_varint(4, size)
+
+    # dag-pb serializes links before data
+    block = b"".join(
+        _field_bytes(2, _field_bytes(1, cid) + _field_bytes(2, b"") + _field_varint(3, total))
+        for cid, _, total in children
+    )
+    block += _field_bytes(1, unixfs)
+    return _cid_bytes(DAG_PB_CODEC, block, version), sum(size for _, size, _ in children), \
+        len(block) + sum(total for _, _, total in children)
+
+
+def _cid_bytes(codec: int, block: bytes, version: int) -> bytes:
+    multihash = _varint(SHA2_256) + _varint(32) + hashlib.sha256(block).digest()
+    if version == 0:
+        return multihash
+    return _varint(1) + _varint(codec) + multihash
+
+
+def _encode_cid(cid: bytes, version: int) -> str:
+    if version == 0:
+        return _base58(cid)
+    return "b" + base64.b32encode(cid).decode().lower().rstrip("=")
+
+
+def _base58(data: bytes) -> str:
+    number = int.from_bytes(data, 'big')
+    encoded = ""
+    while number:
+        number, remainder = divmod(number, 58)
+        encoded = BASE58_ALPHABET[remainder] + encoded
+    leading_zeros = len(data) - len(data.lstrip(b"\0"))
+    return BASE58_ALPHABET[0] * leading_zeros + encoded
+
+
+def _varint(value: int) -> bytes:
+    encoded = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            encoded.append(byte | 0x80)
+        else:
+            encoded.append(byte)
+            return bytes(encoded)
+
+
+def _field_varint(field: int, value: int) -> bytes:
+    return _varint(field << 3) + _varint(value)
+
+
+def _field_bytes(field: int, value: bytes) -> bytes:
+    return _varint(field << 3 | 2) + _varint(len(value)) + bytes(value)
@@ -0,0 +1,127 @@
+import os
+import struct
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+try:
+    import zstandard
+except ImportError:  # zstandard is optional, only needed for the zstd codec
+    zstandard = None
+
+# Codecs understood by encrypt_file:
+#   pgp  - legacy behaviour, pgpy compresses the message with zlib at its default level
+#   none - the plaintext is encrypted as-is
+#   zlib - framed container compressed in parallel chunks before encryption
+#   zstd - framed container compressed in parallel chunks before encryption
+PGP_CODEC = "pgp"
+NO_CODEC = "none"
+FRAMED_CODECS = {"zlib": 1, "zstd": 2}
+CODECS = (PGP_CODEC, NO_CODEC, *FRAMED_CODECS)
+
+# magic, format version, codec id, level, chunk size, original size, chunk count
+MAGIC = b"VRCZ"
+FORMAT_VERSION = 1
+HEADER = struct.Struct(">4sBBbIQI")
+CHUNK_LENGTH = struct.Struct(">I")
+
+DEFAULT_LEVELS = {"zlib": 6, "zstd": 3}
+
+# A multiple of the SQLite page size, so chunks split the database on page boundaries
+DEFAULT_CHUNK_SIZE = 4 * 1024 * 1024
+
+
+def compress(data: bytes, codec: str, level: Optional[int] = None, chunk_size: int = DEFAULT_CHUNK_SIZE,
+             threads: Optional[int] = None) -> bytes:
+    """
+    Compress data into a framed container, chunk by chunk in parallel.
+
+    Args:
+        data: Plaintext bytes, typically the SQLite database
+        codec: One of the framed codecs ("zlib", "zstd")
+        level: Compression level (defaults to the codec's default level)
+        chunk_size: Size of each independently compressed chunk
+        threads: Number of compression threads (defaults to the CPU count)
+
+    Returns:
+        Header followed by length-prefixed compressed chunks
+    """
+    if codec not in FRAMED_CODECS:
+        raise ValueError(f"Unsupported compression codec: {codec}")
+    if level is None:
+        level = DEFAULT_LEVELS[codec]
+
+    view = memoryview(data)
+    chunks = [view[offset:offset + chunk_size] for offset in range(0, len(view), chunk_size)]
+    compress_chunk = _chunk_compressor(codec, level)
+
+    # zlib and zstd release the GIL while compressing, so threads run in parallel
+    with ThreadPoolExecutor(max_workers=threads or os.cpu_count()) as executor:
+        compressed = list(executor.map(compress_chunk, chunks))
+
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, FRAMED_CODECS[codec], level, chunk_size, len(data), len(compressed))
+    return b"".join([header, *(CHUNK_LENGTH.pack(len(chunk)) + chunk for chunk in compressed)])
+
+
+def decompress(data: bytes) -> bytes:
+    """
+    Decompress a framed container produced by `compress`.
+
+    Args:
+        data: Header followed by length-prefixed compressed chunks
+
+    Returns:
+        The original plaintext bytes
+    """
+    magic, version, codec_id, _, _, original_size, chunk_count = HEADER.unpack_from(data)
+    if magic != MAGIC or version != FORMAT_VERSION:
+        raise ValueError("Data is not a supported compressed container")
+    codec = next(name for name, identifier in FRAMED_CODECS.items() if identifier == codec_id)
+    decompress_chunk = _chunk_decompressor(codec)
+
+    view = memoryview(data)
+    chunks = []
+    offset = HEADER.size
+    for _ in range(chunk_count):
+        (length,) = CHUNK_LENGTH.unpack_from(view, offset)
+        offset += CHUNK_LENGTH.size
+        chunks.append(decompress_chunk(view[offset:offset + length]))
+        offset += length
+
+    plaintext = b"".join(chunks)
+    if len(plaintext) != original_size:
+        raise ValueError(f"Decompressed {len(plaintext)} bytes, expected {original_size}")
+    return plaintext
+
+
+def is_compressed(data: bytes) -> bool:
+    """Check whether data starts with a compressed container header."""
+    return len(data) >= HEADER.size and bytes(data[:len(MAGIC)]) == MAGIC
+
+
+def codec_of(data: bytes) -> Optional[str]:
+    """Return the codec of a compressed container, or None for plain data."""
+    if not is_compressed(data):
+        return None
+    codec_id = HEADER.unpack_from(data)[2]
+    return next((name for name, identifier in FRAMED_CODECS.items() if identifier == codec_id), None)
+
+
+def _chunk_compressor(codec: str, level: int):
+    if codec == "zlib":
+        return lambda chunk: zlib.compress(chunk, level)
+
+    if zstandard is None:
+        raise ImportError("The zstd codec requires the zstandard package")
+    # ZstdCompressor instances are not thread-safe, so every chunk gets its own
+    return lambda chunk: zstandard.ZstdCompressor(level=level).compress(chunk)
+
+
+def _chunk_decompressor(codec: str):
+    if codec == "zlib":
+        return zlib.decompress
+
+    if zstandard is None:
+        raise ImportError("The zstd codec requires the zstandard package")
+    return lambda chunk: zstandard.ZstdDecompressor().decompress(chunk)
+
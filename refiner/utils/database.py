@@ -0,0 +1,43 @@
+import sqlite3
+import uuid
+
+
+def is_memory_database(db_path: str) -> bool:
+    """Whether a database path is the URI of an in-memory database (see MemoryDatabase)."""
+    return db_path.startswith('file:') and 'mode=memory' in db_path
+
+
+def connect(db_path: str, **kwargs) -> sqlite3.Connection:
+    """Open a database by path, or by URI if it is an in-memory database; URI connections can also attach them."""
+    return sqlite3.connect(db_path, uri=is_memory_database(db_path), **kwargs)
+
+
+def engine_url(db_path: str) -> str:
+    """SQLAlchemy URL of a database path."""
+    if is_memory_database(db_path):
+        return f"sqlite:///{db_path}&uri=true"
+    return f"sqlite:///{db_path}"
+
+
+class MemoryDatabase:
+    """
+    An in-memory SQLite database that connections of the process open by URI.
+
+    The database lives in the shared cache, so the transformer's engine and the
+    sqlite3 connections reading it afterwards (schema, Parquet, shards) all see
+    the same pages, as they would a file. It is kept alive by a connection of
+    its own until closed, and serialized from that connection, so the
+    plaintext never has to be written to disk.
+    """
+
+    def __init__(self):
+        self.uri = f"file:refinement-{uuid.uuid4().hex}?mode=memory&cache=shared"
+        self._connection = sqlite3.connect(self.uri, uri=True, check_same_thread=False)
+
+    def serialize(self) -> bytes:
+        """The database as the bytes of a SQLite file."""
+        return self._connection.serialize()
+
+    def close(self) -> None:
+        """Free the database, once no other connection holds it either."""
+        self._connection.close()
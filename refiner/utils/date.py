@@ -1,8 +1,57 @@
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+from typing import Any, Optional
+
+from refiner.config import Settings, settings
 
 
 def parse_timestamp(timestamp):
     """Parse a timestamp to a datetime object."""
     if isinstance(timestamp, int):
         return datetime.fromtimestamp(timestamp / 1000.0)
-    return datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
\ No newline at end of file
+    return datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+
+
+def _aware(moment: datetime) -> datetime:
+    """Read naive datetimes as UTC, so they compare with timezone-aware ones."""
+    return moment if moment.tzinfo is not None else moment.replace(tzinfo=timezone.utc)
+
+
+class TimeWindow:
+    """Half-open time range [since, until) records are kept in, either bound may be open."""
+
+    def __init__(self, since: Optional[datetime] = None, until: Optional[datetime] = None):
+        self.since = _aware(since) if since is not None else None
+        self.until = _aware(until) if until is not None else None
+
+    @classmethod
+    def from_settings(cls, export_timestamp: Optional[str] = None,
+                      job_settings: Optional[Settings] = None) -> "TimeWindow":
+        """
+        Build the window set by RECORDS_SINCE, RECORDS_UNTIL and RECORDS_MAX_AGE_DAYS.
+
+        Args:
+            export_timestamp: Export timestamp RECORDS_MAX_AGE_DAYS counts back from
+            job_settings: Settings of the job (defaults to the settings currently in effect)
+        """
+        config = job_settings or settings
+        since = parse_timestamp(config.RECORDS_SINCE) if config.RECORDS_SINCE else None
+        until = parse_timestamp(config.RECORDS_UNTIL) if config.RECORDS_UNTIL else None
+        if config.RECORDS_MAX_AGE_DAYS is not None and export_timestamp:
+            oldest = _aware(parse_timestamp(export_timestamp)) - timedelta(days=config.RECORDS_MAX_AGE_DAYS)
+            since = oldest if since is None else max(_aware(since), oldest)
+        return cls(since, until)
+
+    def __bool__(self) -> bool:
+        return self.since is not None or self.until is not None
+
+    def contains(self, timestamp: Any) -> bool:
+        """
+        Check whether a raw timestamp falls in the window.
+
+        Timestamps that cannot be parsed are kept, so validation reports them as before.
+        """
+        try:
+            moment = _aware(parse_timestamp(timestamp))
+        except (AttributeError, TypeError, ValueError):
+            return True
+        return (self.since is None or moment >= self.since) and (self.until is None or moment < self.until)
@@ -0,0 +1,148 @@
+import json
+import logging
+import sqlite3
+from typing import Dict, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+from refiner.utils.database import connect
+
+MANIFEST_KIND = 'delta'
+
+# Keys of the rows a delta removes from a table are kept in a table of this name
+DELETED_SUFFIX = '__deleted'
+
+
+class DeltaManifest(BaseModel):
+    version: int = 1
+    kind: str = MANIFEST_KIND
+    base_cid: str  # Refinement the delta applies to, itself a database or a delta manifest
+    schema: str
+    delta_cid: Optional[str] = None
+    delta_url: Optional[str] = None
+    upserted: Dict[str, int] = {}  # Rows inserted or replaced, by table
+    deleted: Dict[str, int] = {}  # Rows removed, by table
+    row_counts: Dict[str, int] = {}  # Rows of every table once the delta is applied
+
+
+def read_delta_manifest(content: bytes) -> Optional[DeltaManifest]:
+    """Parse fetched content as a delta manifest, None if it is something else, such as an encrypted database."""
+    if content.lstrip()[:1] != b'{':
+        return None
+    try:
+        data = json.loads(content)
+    except ValueError:
+        return None
+    if not isinstance(data, dict) or data.get('kind') != MANIFEST_KIND:
+        return None
+    return DeltaManifest.model_validate(data)
+
+
+def build_delta(db_path: str, base: bytes) -> Optional[Tuple[bytes, DeltaManifest]]:
+    """
+    Compute the changes turning a previous refinement into this one.
+
+    For every table, the delta database holds the rows that are new or differ
+    from the base, in a table of the same name, and the primary keys of the
+    base rows that are gone, in a `<table>__deleted` table. Both are computed
+    by SQLite with the base attached, and the delta is built in memory.
+
+    Args:
+        db_path: Path to the refinement database, or the URI of an in-memory one
+        base: Plaintext database of the previous refinement
+
+    Returns:
+        The delta database as the bytes of a SQLite file, and a manifest holding
+        its row counts; None when the tables or their definitions changed, which
+        a delta cannot express, or when the delta is no smaller than the refinement
+    """
+    connection = connect(db_path)
+    try:
+        connection.execute("ATTACH DATABASE ':memory:' AS base")
+        connection.deserialize(base, name='base')
+        tables = _tables(connection, 'main')
+        if tables != _tables(connection, 'base'):
+            logging.warning("Tables of the refinement differ from the base, a delta cannot express the change")
+            return None
+        keys = {table: _primary_key(connection, table) for table in tables}
+        keyless = [table for table, key in keys.items() if not key]
+        if keyless:
+            logging.warning(f"Tables without a primary key cannot be diffed: {', '.join(keyless)}")
+            return None
+
+        connection.execute("ATTACH DATABASE ':memory:' AS delta")
+        manifest = DeltaManifest(base_cid='', schema='')
+        for table, key in keys.items():
+            columns = ', '.join(key)
+            connection.execute(
+                f'CREATE TABLE delta."{table}" AS SELECT * FROM main."{table}" EXCEPT SELECT * FROM base."{table}"'
+            )
+            connection.execute(
+                f'CREATE TABLE delta."{table}{DELETED_SUFFIX}" AS '
+                f'SELECT {columns} FROM base."{table}" EXCEPT SELECT {columns} FROM main."{table}"'
+            )
+            manifest.upserted[table] = _count(connection, f'delta."{table}"')
+            manifest.deleted[table] = _count(connection, f'delta."{table}{DELETED_SUFFIX}"')
+            manifest.row_counts[table] = _count(connection, f'main."{table}"')
+        connection.commit()
+        delta = connection.serialize(name='delta')
+        size = connection.execute("PRAGMA main.page_count").fetchone()[0] * \
+            connection.execute("PRAGMA main.page_size").fetchone()[0]
+        connection.execute("DETACH DATABASE delta")
+        connection.execute("DETACH DATABASE base")
+    finally:
+        connection.close()
+
+    if len(delta) >= size:
+        logging.info(f"Delta of {len(delta)} bytes is no smaller than the {size} bytes refinement")
+        return None
+
+    logging.info(
+        f"Delta against the base: {sum(manifest.upserted.values())} rows upserted, "
+        f"{sum(manifest.deleted.values())} deleted, {len(delta)} bytes"
+    )
+    return delta, manifest
+
+
+def apply_delta(connection: sqlite3.Connection, delta: bytes) -> None:
+    """
+    Apply a delta to the base refinement open on a connection, turning it into the refinement the delta was built from.
+
+    Removed rows are deleted first, then new and changed rows are inserted or
+    replaced by primary key.
+
+    Args:
+        connection: Writable connection to the base database
+        delta: Plaintext delta database, as built by build_delta
+    """
+    connection.execute("ATTACH DATABASE ':memory:' AS delta")
+    try:
+        connection.deserialize(delta, name='delta')
+        tables = _tables(connection, 'delta')
+        for table in sorted(name for name in tables if not name.endswith(DELETED_SUFFIX)):
+            key = _primary_key(connection, table)
+            connection.execute(
+                f'DELETE FROM main."{table}" WHERE ({", ".join(key)}) IN '
+                f'(SELECT {", ".join(key)} FROM delta."{table}{DELETED_SUFFIX}")'
+            )
+            connection.execute(f'INSERT OR REPLACE INTO main."{table}" SELECT * FROM delta."{table}"')
+        connection.commit()
+    finally:
+        connection.execute("DETACH DATABASE delta")
+
+
+def _tables(connection: sqlite3.Connection, schema: str) -> Dict[str, str]:
+    """Definitions of the tables of an attached database, by name."""
+    return dict(connection.execute(
+        f"SELECT name, sql FROM {schema}.sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+    ))
+
+
+def _count(connection: sqlite3.Connection, table: str) -> int:
+    return connection.execute(f"SELECT count(*) FROM {table}").fetchone()[0]
+
+
+def _primary_key(connection: sqlite3.Connection, table: str) -> List[str]:
+    """Primary key columns of a table of the main database, in key order."""
+    columns = connection.execute(f'PRAGMA main.table_info("{table}")').fetchall()
+    return [f'"{name}"' for _, name, _, _, _, pk in sorted(columns, key=lambda column: column[5]) if pk]
@@ -1,27 +1,60 @@
+import hashlib
+import hmac
 import pgpy
 from pgpy.constants import CompressionAlgorithm, HashAlgorithm
 import os
 from refiner.config import settings
+from refiner.utils.compression import CODECS, FRAMED_CODECS, PGP_CODEC, compress, decompress, is_compressed
 
 
-def encrypt_file(encryption_key: str, file_path: str, output_path: str = None) -> str:
+def encrypt_file(encryption_key: str, file_path: str, output_path: str = None, codec: str = None,
+                 level: int = None) -> str:
     """Symmetrically encrypts a file with an encryption key.
 
     Args:
         encryption_key: The passphrase to encrypt with
         file_path: Path to the file to encrypt
         output_path: Optional path to save encrypted file (defaults to file_path + .pgp)
+        codec: Optional compression codec (defaults to settings.REFINEMENT_COMPRESSION)
+        level: Optional compression level (defaults to settings.REFINEMENT_COMPRESSION_LEVEL)
 
     Returns:
         Path to encrypted file
     """
     if output_path is None:
         output_path = f"{file_path}.pgp"
-    
     with open(file_path, 'rb') as f:
         buffer = f.read()
+    return encrypt_bytes(encryption_key, buffer, output_path, codec=codec, level=level)
+
+
+def encrypt_bytes(encryption_key: str, buffer: bytes, output_path: str, codec: str = None,
+                  level: int = None) -> str:
+    """Symmetrically encrypts plaintext held in memory, e.g. a serialized database, into a file.
+
+    Args:
+        encryption_key: The passphrase to encrypt with
+        buffer: The plaintext
+        output_path: Path to save the encrypted file to
+        codec: Optional compression codec (defaults to settings.REFINEMENT_COMPRESSION)
+        level: Optional compression level (defaults to settings.REFINEMENT_COMPRESSION_LEVEL)
+
+    Returns:
+        Path to encrypted file
+    """
+    if codec is None:
+        codec = settings.REFINEMENT_COMPRESSION
+    if level is None:
+        level = settings.REFINEMENT_COMPRESSION_LEVEL
+    if codec not in CODECS:
+        raise ValueError(f"Unsupported compression codec: {codec}")
     
-    message = pgpy.PGPMessage.new(buffer, compression=CompressionAlgorithm.ZLIB)
+    compression = CompressionAlgorithm.ZLIB if codec == PGP_CODEC else CompressionAlgorithm.Uncompressed
+    if codec in FRAMED_CODECS:
+        # Compressed containers carry their codec in a header so consumers can decode them
+        buffer = compress(buffer, codec, level=level, threads=settings.COMPRESSION_THREADS)
+    
+    message = pgpy.PGPMessage.new(buffer, compression=compression)
     encrypted_message = message.encrypt(
         passphrase=encryption_key, hash=HashAlgorithm.SHA512
     )
@@ -32,6 +65,66 @@ def encrypt_file(encryption_key: str, file_path: str, output_path: str = None) -
     return output_path
 
 
+def encryption_fingerprint(encryption_key: str, file_path: str, codec: str = None, level: int = None) -> str:
+    """Fingerprints the artifact that encrypt_file would produce for a file.
+
+    PGP encryption is salted, so the same plaintext encrypts to different bytes
+    (and a different CID) on every run. The fingerprint is keyed on the plaintext,
+    the encryption key and the compression settings instead, so an identical
+    refinement can be recognised before it is encrypted and uploaded again.
+
+    Args:
+        encryption_key: The passphrase the file would be encrypted with
+        file_path: Path to the plaintext file
+        codec: Optional compression codec (defaults to settings.REFINEMENT_COMPRESSION)
+        level: Optional compression level (defaults to settings.REFINEMENT_COMPRESSION_LEVEL)
+
+    Returns:
+        Fingerprint string
+    """
+    mac = _fingerprint_mac(encryption_key, codec, level)
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            mac.update(chunk)
+    return f"hmac-sha256:{mac.hexdigest()}"
+
+
+def encryption_fingerprint_bytes(encryption_key: str, buffer: bytes, codec: str = None, level: int = None) -> str:
+    """Fingerprints the artifact that encrypt_bytes would produce for plaintext held in memory.
+
+    The fingerprint is the one encryption_fingerprint gives a file holding the same bytes.
+    """
+    mac = _fingerprint_mac(encryption_key, codec, level)
+    mac.update(buffer)
+    return f"hmac-sha256:{mac.hexdigest()}"
+
+
+def _fingerprint_mac(encryption_key: str, codec: str = None, level: int = None) -> hmac.HMAC:
+    if codec is None:
+        codec = settings.REFINEMENT_COMPRESSION
+    if level is None:
+        level = settings.REFINEMENT_COMPRESSION_LEVEL
+    return hmac.new(encryption_key.encode(), f"{codec}:{level}".encode(), hashlib.sha256)
+
+
+def decrypt_bytes(encryption_key: str, encrypted_data: bytes) -> bytes:
+    """Symmetrically decrypts an encrypted refinement held in memory.
+
+    Args:
+        encryption_key: The passphrase to decrypt with
+        encrypted_data: The PGP message, armored or binary
+
+    Returns:
+        The plaintext, decompressed if it was compressed before encryption
+    """
+    message = pgpy.PGPMessage.from_blob(encrypted_data)
+    decrypted_message = message.decrypt(encryption_key)
+    plaintext = bytes(decrypted_message.message)
+    if is_compressed(plaintext):
+        plaintext = decompress(plaintext)
+    return plaintext
+
+
 def decrypt_file(encryption_key: str, file_path: str, output_path: str = None) -> str:
     """Symmetrically decrypts a file with an encryption key.
 
@@ -52,11 +145,10 @@ def decrypt_file(encryption_key: str, file_path: str, output_path: str = None) -
     with open(file_path, 'rb') as f:
         encrypted_data = f.read()
     
-    message = pgpy.PGPMessage.from_blob(encrypted_data)
-    decrypted_message = message.decrypt(encryption_key)
+    plaintext = decrypt_bytes(encryption_key, encrypted_data)
     
     with open(output_path, 'wb') as f:
-        f.write(decrypted_message.message)
+        f.write(plaintext)
     
     return output_path
 
@@ -0,0 +1,135 @@
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional, fall back to a set of fingerprints
+    np = None
+
+# Counts recorded in the proof: records checked, and the orphans and inconsistencies found among them
+INTEGRITY_COUNTS = (
+    'comments_checked', 'orphan_comments',
+    'direct_messages_checked', 'orphan_direct_messages', 'conversation_conflicts',
+)
+
+
+class KeyIndex:
+    """
+    Compact membership index of the IDs of a collection.
+
+    IDs are kept as 8-byte fingerprints (their hash, which is stable within a
+    process) rather than as strings. Fingerprints are sorted once the first
+    lookup comes, and whole batches are looked up at a time.
+    """
+
+    def __init__(self):
+        self._pending = array('q')
+        self._sorted = None
+
+    def update(self, keys: Iterable[str]) -> None:
+        self._pending.extend(map(hash, keys))
+
+    def __len__(self) -> int:
+        return len(self._pending) + (len(self._sorted) if self._sorted is not None else 0)
+
+    def contains(self, keys: Sequence[str]) -> List[bool]:
+        """Whether every key of a batch was added to the index."""
+        self._freeze()
+        if np is None:
+            return [hash(key) in self._sorted for key in keys]
+        if not len(self._sorted):
+            return [False] * len(keys)
+        probes = np.fromiter(map(hash, keys), dtype=np.int64, count=len(keys))
+        positions = np.minimum(np.searchsorted(self._sorted, probes), len(self._sorted) - 1)
+        return (self._sorted[positions] == probes).tolist()
+
+    def _freeze(self) -> None:
+        if not self._pending and self._sorted is not None:
+            return
+        if np is None:
+            self._sorted = (self._sorted or set()) | set(self._pending)
+        else:
+            added = np.frombuffer(self._pending, dtype=np.int64)
+            self._sorted = np.union1d(self._sorted, added) if self._sorted is not None else np.unique(added)
+        self._pending = array('q')
+
+
+class IntegrityChecker:
+    """
+    Check the cross-references of an export while its collections stream by.
+
+    Post IDs are indexed as posts are read, so comments (read after them)
+    are checked against the posts of the export a batch at a time instead of
+    with a join over unindexed tables after the load. A direct message must
+    have the profile user as its sender or recipient, and all messages of a
+    conversation must be with the same counterpart.
+    """
+
+    def __init__(self, username: str, check_comments: bool = True, drop_orphans: bool = False):
+        """
+        Args:
+            username: Username of the profile the export belongs to
+            check_comments: Check comments against the posts; only possible if posts are read
+            drop_orphans: Leave orphaned comments and messages out of the records returned by check
+        """
+        self.username = username
+        self.check_comments = check_comments
+        self.drop_orphans = drop_orphans
+        self.posts = KeyIndex()
+        # Counterpart of every conversation, by conversation fingerprint
+        self.counterparts: Dict[int, str] = {}
+        self.counts: Dict[str, int] = dict.fromkeys(INTEGRITY_COUNTS, 0)
+
+    def index(self, collection: str, records: Iterable[Any]) -> None:
+        """Add the IDs of records other collections refer to."""
+        if collection == 'posts':
+            self.posts.update(post.post_id for post in records)
+
+    def check(self, collection: str, records: List[Any]) -> List[Any]:
+        """
+        Count the orphans of a batch of records.
+
+        Returns:
+            The records, without the orphans if they are dropped
+        """
+        if collection == 'comments' and self.check_comments:
+            valid = self.posts.contains([comment.post_id for comment in records])
+        elif collection == 'direct_messages':
+            valid = self._check_messages(records)
+        else:
+            return records
+
+        orphans = len(valid) - sum(valid)
+        self.counts[f'{collection}_checked'] += len(records)
+        self.counts[f'orphan_{collection}'] += orphans
+        if self.drop_orphans and orphans:
+            return [record for record, is_valid in zip(records, valid) if is_valid]
+        return records
+
+    def merge(self, counts: Dict[str, int]) -> None:
+        """Add the counts of another checker, e.g. one that checked other collections in another process."""
+        for name, count in counts.items():
+            self.counts[name] += count
+
+    def result(self) -> Optional[Dict[str, int]]:
+        """Counts for the proof, None if nothing was checked."""
+        if not self.counts['comments_checked'] and not self.counts['direct_messages_checked']:
+            return None
+        return dict(self.counts)
+
+    def _check_messages(self, messages: List[Any]) -> List[bool]:
+        username, counterparts = self.username, self.counterparts
+        valid = []
+        for dm in messages:
+            if dm.sender_username == username:
+                counterpart = dm.recipient_username
+            elif dm.recipient_username == username:
+                counterpart = dm.sender_username
+            else:
+                valid.append(False)
+                continue
+            valid.append(True)
+            known = counterparts.setdefault(hash(dm.conversation_id), counterpart)
+            if known != counterpart:
+                self.counts['conversation_conflicts'] += 1
+        return valid
@@ -1,47 +1,99 @@
 import json
 import logging
 import os
+import threading
 import requests
+from typing import Optional
 from refiner.config import settings
+from refiner.utils.cid import bytes_cid, file_cid
+from refiner.utils.storage import get_storage
 
-PINATA_FILE_API_ENDPOINT = "https://api.pinata.cloud/pinning/pinFileToIPFS"
-PINATA_JSON_API_ENDPOINT = "https://api.pinata.cloud/pinning/pinJSONToIPFS"
+_pin_index_lock = threading.Lock()
+
+def _load_pin_index():
+    if not settings.IPFS_PIN_INDEX or not os.path.exists(settings.IPFS_PIN_INDEX):
+        return {}
+    with open(settings.IPFS_PIN_INDEX, 'r') as f:
+        return json.load(f)
+
+def _record_pin(content_key, ipfs_hash):
+    """
+    Remember that content is pinned under an IPFS hash.
+    :param content_key: Local CID of the content, or another stable fingerprint of it
+    :param ipfs_hash: IPFS hash returned by the pinning service
+    """
+    if not settings.IPFS_PIN_INDEX:
+        return
+    with _pin_index_lock:
+        index = _load_pin_index()
+        index[content_key] = ipfs_hash
+        tmp_path = f"{settings.IPFS_PIN_INDEX}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(index, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, settings.IPFS_PIN_INDEX)
+
+def is_pinned_remotely(cid):
+    """
+    Checks whether a CID is already stored by the storage backend.
+    :param cid: CID to look up
+    :return: True if the CID is pinned
+    """
+    return get_storage().has(cid)
+
+def lookup_pinned(content_key, cid=None) -> Optional[str]:
+    """
+    Finds the IPFS hash of content that is already pinned.
+    The local pin index is checked first, then (if enabled) the pinning service itself.
+    :param content_key: Local CID of the content, or another stable fingerprint of it
+    :param cid: Precomputed CID to check against the pinning service
+    :return: IPFS hash of the pinned content, or None if it has to be uploaded
+    """
+    ipfs_hash = _load_pin_index().get(content_key)
+    if ipfs_hash:
+        return ipfs_hash
+
+    if cid and settings.IPFS_CHECK_REMOTE_PINS:
+        try:
+            if is_pinned_remotely(cid):
+                _record_pin(content_key, cid)
+                return cid
+        except requests.exceptions.RequestException as e:
+            logging.warning(f"Could not check remote pins for {cid}: {e}")
+    return None
 
 def upload_json_to_ipfs(data):
     """
-    Uploads JSON data to IPFS using Pinata API.
+    Uploads JSON data to IPFS through the configured storage backend (Pinata by default).
+    The serialized document is pinned byte for byte, so its CID is known before uploading
+    and content that is already pinned is not uploaded again.
     :param data: JSON data to upload (dictionary or list)
     :return: IPFS hash
     """
-    if not settings.PINATA_API_KEY or not settings.PINATA_API_SECRET:
-        raise Exception("Error: Pinata IPFS API credentials not found, please check your environment variables")
-
-    headers = {
-        "Content-Type": "application/json",
-        "pinata_api_key": settings.PINATA_API_KEY,
-        "pinata_secret_api_key": settings.PINATA_API_SECRET
-    }
+    payload = json.dumps(data)
+    local_cid = bytes_cid(payload.encode(), settings.IPFS_CID_VERSION)
+    pinned_hash = lookup_pinned(local_cid, local_cid)
+    if pinned_hash:
+        logging.info(f"JSON already pinned with hash: {pinned_hash}, skipping upload")
+        return pinned_hash
 
     try:
-        response = requests.post(
-            PINATA_JSON_API_ENDPOINT,
-            data=json.dumps(data),
-            headers=headers
-        )
-        response.raise_for_status()
-
-        result = response.json()
-        logging.info(f"Successfully uploaded JSON to IPFS with hash: {result['IpfsHash']}")
-        return result['IpfsHash']
+        ipfs_hash = get_storage().put_json(payload.encode(), local_cid)
+        logging.info(f"Successfully uploaded JSON to IPFS with hash: {ipfs_hash}")
+        if ipfs_hash != local_cid:
+            logging.warning(f"Pinned hash {ipfs_hash} differs from the precomputed CID {local_cid}")
+        _record_pin(local_cid, ipfs_hash)
+        return ipfs_hash
 
     except requests.exceptions.RequestException as e:
         logging.error(f"An error occurred while uploading JSON to IPFS: {e}")
         raise e
 
-def upload_file_to_ipfs(file_path=None):
+def upload_file_to_ipfs(file_path=None, content_key=None):
     """
-    Uploads a file to IPFS using Pinata API (https://pinata.cloud/)
+    Uploads a file to IPFS through the configured storage backend (Pinata by default, https://pinata.cloud/)
+    Content that is already pinned is not uploaded again.
     :param file_path: Path to the file to upload (defaults to encrypted database)
+    :param content_key: Optional stable fingerprint of the content (defaults to its local CID)
     :return: IPFS hash
     """
     if file_path is None:
@@ -50,41 +102,40 @@ def upload_file_to_ipfs(file_path=None):
     
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"File not found: {file_path}")
-        
-    if not settings.PINATA_API_KEY or not settings.PINATA_API_SECRET:
-        raise Exception("Error: Pinata IPFS API credentials not found, please check your environment variables")
-
-    headers = {
-        "pinata_api_key": settings.PINATA_API_KEY,
-        "pinata_secret_api_key": settings.PINATA_API_SECRET
-    }
 
-    try:
-        with open(file_path, 'rb') as file:
-            files = {
-                'file': file
-            }
-            response = requests.post(
-                PINATA_FILE_API_ENDPOINT,
-                files=files,
-                headers=headers
-            )
+    local_cid = file_cid(file_path, settings.IPFS_CID_VERSION)
+    pinned_hash = lookup_pinned(content_key or local_cid, local_cid)
+    if pinned_hash:
+        logging.info(f"File already pinned with hash: {pinned_hash}, skipping upload")
+        return pinned_hash
         
-        response.raise_for_status()
-        result = response.json()
-        logging.info(f"Successfully uploaded file to IPFS with hash: {result['IpfsHash']}")
-        return result['IpfsHash']
+    try:
+        ipfs_hash = get_storage().put_file(file_path, local_cid)
+        logging.info(f"Successfully uploaded file to IPFS with hash: {ipfs_hash}")
+        if ipfs_hash != local_cid:
+            logging.warning(f"Pinned hash {ipfs_hash} differs from the precomputed CID {local_cid}")
+        _record_pin(content_key or local_cid, ipfs_hash)
+        return ipfs_hash
 
     except requests.exceptions.RequestException as e:
         logging.error(f"An error occurred while uploading file to IPFS: {e}")
         raise e
 
+def ipfs_url(ipfs_hash: str) -> str:
+    """
+    URL uploaded content can be read from, as given by the configured storage backend:
+    an IPFS gateway URL, or a file:// URL into the local store.
+    :param ipfs_hash: Hash the content was uploaded under
+    :return: URL of the content
+    """
+    return get_storage().url(ipfs_hash)
+
 # Test with: python -m refiner.utils.ipfs
 if __name__ == "__main__":
     ipfs_hash = upload_file_to_ipfs()
     print(f"File uploaded to IPFS with hash: {ipfs_hash}")
-    print(f"Access at: {settings.IPFS_GATEWAY_URL}/{ipfs_hash}")
+    print(f"Access at: {ipfs_url(ipfs_hash)}")
 
     ipfs_hash = upload_json_to_ipfs()
     print(f"JSON uploaded to IPFS with hash: {ipfs_hash}")
-    print(f"Access at: {settings.IPFS_GATEWAY_URL}/{ipfs_hash}")
\ No newline at end of file
+    print(f"Access at: {ipfs_url(ipfs_hash)}")
\ No newline at end of file
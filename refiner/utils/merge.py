@@ -0,0 +1,73 @@
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, Mapping, Optional
+
+from sqlalchemy import Column, Integer, Table
+from sqlalchemy.engine import Connection
+
+# Name a part database is attached under while it is merged
+SCHEMA = "part"
+
+
+@contextmanager
+def attach_part(connection: Connection, part_path: str) -> Iterator[None]:
+    """
+    Attach a part database to a connection for the duration of a merge.
+
+    SQLite cannot detach a database inside a transaction, so the merge must
+    commit before leaving the block; anything left uncommitted is rolled back.
+    """
+    connection.exec_driver_sql(f"ATTACH DATABASE ? AS {SCHEMA}", (part_path,))
+    try:
+        yield
+    finally:
+        connection.rollback()
+        connection.exec_driver_sql(f"DETACH DATABASE {SCHEMA}")
+
+
+def surrogate_key(table: Table) -> Optional[Column]:
+    """Return the integer primary key SQLite assigns to the rows of a table, None if the key is natural."""
+    columns = list(table.primary_key.columns)
+    if len(columns) == 1 and isinstance(columns[0].type, Integer):
+        return columns[0]
+    return None
+
+
+def copy_tables(connection: Connection, tables: Iterable[Table],
+                remap: Mapping[str, Mapping[int, int]]) -> Dict[str, int]:
+    """
+    Append the rows of the attached part database to the same tables of the main database.
+
+    Rows are appended in the order they were written to the part. Surrogate keys
+    are assigned again, so rows of parts built from an empty database follow the
+    rows already in the main database, as if they had been written there.
+
+    Args:
+        connection: Connection with the part attached (see attach_part)
+        tables: Tables to copy
+        remap: Codes to translate in columns referencing a lookup table, by lookup
+            table name and part code
+
+    Returns:
+        Number of rows copied per table
+    """
+    counts = {}
+    for table in tables:
+        key = surrogate_key(table)
+        columns = [column for column in table.columns if column is not key]
+        names = ", ".join(column.name for column in columns)
+        values = ", ".join(_remapped(column, remap) for column in columns)
+        result = connection.exec_driver_sql(
+            f"INSERT INTO main.{table.name} ({names}) SELECT {values} FROM {SCHEMA}.{table.name} ORDER BY rowid"
+        )
+        counts[table.name] = result.rowcount
+    return counts
+
+
+def _remapped(column: Column, remap: Mapping[str, Mapping[int, int]]) -> str:
+    """Return the SQL expression selecting a column, translating lookup codes that changed."""
+    for foreign_key in column.foreign_keys:
+        codes = remap.get(foreign_key.column.table.name)
+        if codes:
+            cases = " ".join(f"WHEN {int(old)} THEN {int(new)}" for old, new in codes.items())
+            return f"CASE {column.name} {cases} ELSE {column.name} END"
+    return column.name
@@ -0,0 +1,109 @@
+import os
+import sqlite3
+from typing import Dict, Iterable, List, Sequence
+
+from sqlalchemy import Boolean, DateTime, Float, Integer, Table
+from sqlalchemy.types import TypeEngine
+
+from refiner.utils.database import connect
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # pyarrow is optional, only needed for the Parquet export
+    pyarrow = None
+
+# Rows read from SQLite and written per Parquet row group
+DEFAULT_ROW_GROUP_SIZE = 65536
+
+
+def arrow_schema(table: Table) -> "pyarrow.Schema":
+    """Derive the Arrow schema of a refined table from its SQLAlchemy columns."""
+    _require_pyarrow()
+    return pyarrow.schema([
+        pyarrow.field(column.name, _arrow_type(column.type), nullable=bool(column.nullable))
+        for column in table.columns
+    ])
+
+
+def describe_schema(tables: Iterable[Table]) -> Dict[str, List[str]]:
+    """Describe the Arrow schema of every table, one `name: type` entry per column."""
+    return {
+        table.name: [f"{field.name}: {field.type}{'' if field.nullable else ' not null'}" for field in arrow_schema(table)]
+        for table in tables
+    }
+
+
+def export_tables(db_path: str, tables: Sequence[Table], parquet_dir: str, compression: str = "zstd",
+                  row_group_size: int = DEFAULT_ROW_GROUP_SIZE) -> Dict[str, str]:
+    """
+    Write tables of a SQLite database to one Parquet file each.
+
+    Rows are read with a cursor and written one row group at a time, so memory
+    use depends on the row group size rather than on the size of the table.
+    Columns are dictionary-encoded, falling back to plain encoding for columns
+    whose dictionary grows too large.
+
+    Args:
+        db_path: Path to the SQLite database, or the URI of an in-memory database
+        tables: Tables to export
+        parquet_dir: Directory the `<table>.parquet` files are written to
+        compression: Parquet compression codec (zstd, snappy, gzip, ... or none)
+        row_group_size: Number of rows per row group
+
+    Returns:
+        Path of the Parquet file of every table
+    """
+    _require_pyarrow()
+    os.makedirs(parquet_dir, exist_ok=True)
+    paths = {}
+    connection = connect(db_path)
+    try:
+        for table in tables:
+            paths[table.name] = os.path.join(parquet_dir, f"{table.name}.parquet")
+            _write_table(connection, table, paths[table.name], compression, row_group_size)
+    finally:
+        connection.close()
+    return paths
+
+
+def _write_table(connection: sqlite3.Connection, table: Table, path: str, compression: str,
+                 row_group_size: int) -> None:
+    schema = arrow_schema(table)
+    cursor = connection.execute(f"SELECT {', '.join(schema.names)} FROM {table.name} ORDER BY rowid")
+    with pyarrow.parquet.ParquetWriter(path, schema, compression=compression, use_dictionary=True) as writer:
+        while True:
+            rows = cursor.fetchmany(row_group_size)
+            if not rows:
+                break
+            columns = zip(*rows)
+            arrays = [_column_array(values, field.type) for values, field in zip(columns, schema)]
+            writer.write_batch(pyarrow.RecordBatch.from_arrays(arrays, schema=schema), row_group_size=row_group_size)
+
+
+def _arrow_type(column_type: TypeEngine) -> "pyarrow.DataType":
+    # Boolean before Integer: SQLite stores both as integers, but only one is a flag
+    if isinstance(column_type, Boolean):
+        return pyarrow.bool_()
+    if isinstance(column_type, Integer):
+        return pyarrow.int64()
+    if isinstance(column_type, Float):
+        return pyarrow.float64()
+    if isinstance(column_type, DateTime):
+        return pyarrow.timestamp('us')
+    return pyarrow.string()
+
+
+def _column_array(values: Sequence, arrow_type: "pyarrow.DataType") -> "pyarrow.Array":
+    """Convert the values SQLite returns for a column to an Arrow array of the column's type."""
+    if pyarrow.types.is_timestamp(arrow_type):
+        # SQLAlchemy stores datetimes as ISO 8601 text, which Arrow parses natively
+        return pyarrow.array(values, pyarrow.string()).cast(arrow_type)
+    if pyarrow.types.is_boolean(arrow_type):
+        return pyarrow.array(values, pyarrow.int64()).cast(arrow_type)
+    return pyarrow.array(values, arrow_type)
+
+
+def _require_pyarrow() -> None:
+    if pyarrow is None:
+        raise ImportError("The Parquet export requires the pyarrow package")
@@ -1,35 +1,178 @@
 import hashlib
 import json
 from datetime import datetime
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 
 from refiner.models.proof import InstagramProof
 from refiner.models.unrefined import InstagramData
+from refiner.utils.analytics import engagement_rates
+from refiner.utils.date import TimeWindow
 from refiner.utils.pii import hash_text
+from refiner.utils.sketches import HyperLogLog, KLLSketch, Sketch
+
+def _post_info(post) -> Dict[str, Any]:
+    """Posts hash'ine giren alanlar."""
+    return {
+        "post_id": post.post_id,
+        "timestamp": post.timestamp,
+        "like_count": post.like_count,
+        "comment_count": post.comment_count,
+        "media_count": len(post.media)
+    }
+
+def _story_info(story) -> Dict[str, Any]:
+    """Stories hash'ine giren alanlar."""
+    return {
+        "story_id": story.story_id,
+        "timestamp": story.timestamp,
+        "view_count": story.view_count,
+        "media_type": story.media_type
+    }
+
+def _comment_info(comment) -> Dict[str, Any]:
+    """Comments hash'ine giren alanlar."""
+    return {
+        "comment_id": comment.comment_id,
+        "post_id": comment.post_id,
+        "timestamp": comment.timestamp,
+        "like_count": comment.like_count
+    }
+
+def _dm_info(dm) -> Dict[str, Any]:
+    """Direct messages hash'ine giren alanlar."""
+    return {
+        "message_id": dm.message_id,
+        "conversation_id": dm.conversation_id,
+        "timestamp": dm.timestamp,
+        "message_type": dm.message_type
+    }
+
+# Koleksiyon başına hash'lenen alanlar; engagement metrikleri yalnızca sayılır
+RECORD_INFO = {
+    "posts": _post_info,
+    "stories": _story_info,
+    "comments": _comment_info,
+    "direct_messages": _dm_info,
+    "engagement_metrics": lambda metric: {},
+}
+
+# Koleksiyon başına akış halinde sketch'i tutulan alanlar: farklı değer sayısı (HyperLogLog) veya dağılım (KLL)
+SKETCH_FIELDS = {
+    "posts": (("like_count", KLLSketch), ("comment_count", KLLSketch)),
+    "stories": (("view_count", KLLSketch),),
+    "comments": (("like_count", KLLSketch), ("author_username", HyperLogLog)),
+    "direct_messages": (("conversation_id", HyperLogLog),),
+}
+
+# Proof'a yazılan dağılım noktaları
+QUANTILES = {"p50": 0.5, "p90": 0.9, "p99": 0.99}
+
+# Kontrol edilen etkileşimlerin en fazla bu oranı sahipsiz ya da tutarsız olabilir
+ORPHAN_TOLERANCE = 0.01
+
+class RecordDigest:
+    """
+    Kayıt listesinin SHA-256 hash'ini parça parça hesaplar.
+    Sonuç, listenin tamamının json.dumps(..., sort_keys=True) çıktısının hash'iyle aynıdır.
+    """
+    
+    def __init__(self):
+        self.count = 0
+        self._hash = hashlib.sha256(b"[")
+    
+    def update(self, infos: List[Dict[str, Any]]) -> None:
+        if not infos:
+            return
+        # Listenin json.dumps çıktısı öğeleri ", " ile ayırır; köşeli parantezler olmadan tek seferde hash'lenir
+        if self.count:
+            self._hash.update(b", ")
+        self._hash.update(json.dumps(infos, sort_keys=True)[1:-1].encode())
+        self.count += len(infos)
+    
+    def __getstate__(self):
+        # hashlib nesneleri pickle edilemez, başka bir sürece gönderilen özet kesinleşmiş olur
+        return {'count': self.count, 'digest': self.hexdigest()}
+    
+    def __setstate__(self, state):
+        self.count = state['count']
+        self._hash = None
+        self._digest = state['digest']
+    
+    def hexdigest(self) -> str:
+        if self._hash is None:
+            return self._digest
+        digest = self._hash.copy()
+        digest.update(b"]")
+        return digest.hexdigest()
 
 class InstagramProofGenerator:
     """
     Instagram verisi için proof oluşturucu.
     Verinin gerçekliğini ve sahipliğini kanıtlayan proof dosyası üretir.
+    
+    Kayıtlar add ile parça parça eklenir, böylece büyük export'lar belleğe
+    tamamen yüklenmeden de proof üretilebilir.
     """
     
     def __init__(self, data: InstagramData):
+        # Profil ve zaman damgası bilgileri data'dan, kayıtlar add ile eklenenlerden okunur
         self.data = data
+        self.digests = {collection: RecordDigest() for collection in RECORD_INFO}
+        # Sketch'ler "koleksiyon.alan" adıyla tutulur, bellek kullanımı kayıt sayısından bağımsızdır
+        self.sketches: Dict[str, Sketch] = {
+            f"{collection}.{field}": sketch_type()
+            for collection, fields in SKETCH_FIELDS.items() for field, sketch_type in fields
+        }
+        self.sketches["posts.engagement_rate"] = KLLSketch()
+    
+    def add(self, collection: str, records: List[Any]) -> None:
+        """Bir kayıt koleksiyonunun (posts, stories, ...) sıradaki kayıtlarını ekler."""
+        self.digests[collection].update([RECORD_INFO[collection](record) for record in records])
+        for field, _ in SKETCH_FIELDS.get(collection, ()):
+            self.sketches[f"{collection}.{field}"].update(getattr(record, field) for record in records)
+        if collection == "posts":
+            self.sketches["posts.engagement_rate"].update(engagement_rates(
+                [post.like_count for post in records],
+                [post.comment_count for post in records],
+                self.data.profile.follower_count
+            ))
+    
+    def count(self, collection: str) -> int:
+        return self.digests[collection].count
+    
+    def distinct(self, name: str) -> int:
+        """Bir alanın tahmini farklı değer sayısı (ör. "comments.author_username")."""
+        return self.sketches[name].estimate()
     
-    def generate_proof(self) -> InstagramProof:
+    def quantiles(self) -> Dict[str, Dict[str, float]]:
+        """Değer görülmüş her dağılım sketch'inin p50/p90/p99 tahminleri."""
+        return {
+            name: {point: sketch.quantile(q) for point, q in QUANTILES.items()}
+            for name, sketch in self.sketches.items()
+            if isinstance(sketch, KLLSketch) and sketch.count
+        }
+    
+    def generate_proof(self, duplicate_counts: Optional[Dict[str, int]] = None,
+                       refined_tables: Optional[List[str]] = None,
+                       window: Optional[TimeWindow] = None,
+                       integrity: Optional[Dict[str, int]] = None,
+                       orphans_dropped: bool = False) -> InstagramProof:
         """
         Instagram verisi için comprehensive proof oluşturur.
+        
+        Args:
+            duplicate_counts: Tablo başına atılan tekrarlı kayıt sayıları
+            refined_tables: Yalnızca bu tablolar üretildiyse tablo adları
+            window: Kayıtların okunduğu zaman aralığı
+            integrity: Referans bütünlüğü kontrollerinin sayıları (IntegrityChecker.result)
+            orphans_dropped: Sahipsiz kayıtlar refinement'tan çıkarıldıysa True
         """
         
         # Veri hash'lerini hesapla
         profile_hash = self._hash_profile_data()
-        posts_hash = self._hash_posts_data()
-        stories_hash = self._hash_stories_data()
-        comments_hash = self._hash_comments_data()
-        dms_hash = self._hash_dms_data()
         
         # Güvenilirlik skorunu hesapla
-        confidence_score = self._calculate_confidence_score()
+        confidence_score = self._calculate_confidence_score(integrity)
         
         # Doğrulama metodunu belirle
         verification_method = self._determine_verification_method()
@@ -41,10 +184,22 @@ class InstagramProofGenerator:
             proof_generation_timestamp=datetime.now().isoformat(),
             
             # Veri sayıları
-            total_posts=len(self.data.posts),
-            total_stories=len(self.data.stories),
-            total_comments=len(self.data.comments),
-            total_dms=len(self.data.direct_messages),
+            total_posts=self.count('posts'),
+            total_stories=self.count('stories'),
+            total_comments=self.count('comments'),
+            total_dms=self.count('direct_messages'),
+            duplicates_dropped=dict(sorted(duplicate_counts.items())) if duplicate_counts else None,
+            
+            # Akış halinde hesaplanan tahmini istatistikler ve birleştirilebilir sketch'leri
+            distinct_commenters=self.distinct('comments.author_username'),
+            distinct_conversations=self.distinct('direct_messages.conversation_id'),
+            quantiles=self.quantiles(),
+            sketches={name: sketch.to_dict() for name, sketch in sorted(self.sketches.items())},
+            refined_tables=refined_tables,
+            records_since=window.since.isoformat() if window and window.since else None,
+            records_until=window.until.isoformat() if window and window.until else None,
+            integrity=integrity,
+            orphans_dropped=orphans_dropped,
             
             # Hesap bilgileri
             follower_count=self.data.profile.follower_count,
@@ -54,10 +209,10 @@ class InstagramProofGenerator:
             
             # Hash'ler
             profile_hash=profile_hash,
-            posts_hash=posts_hash,
-            stories_hash=stories_hash,
-            comments_hash=comments_hash,
-            dms_hash=dms_hash,
+            posts_hash=self.digests['posts'].hexdigest(),
+            stories_hash=self.digests['stories'].hexdigest(),
+            comments_hash=self.digests['comments'].hexdigest(),
+            dms_hash=self.digests['direct_messages'].hexdigest(),
             
             # Güvenilirlik
             confidence_score=confidence_score,
@@ -79,64 +234,7 @@ class InstagramProofGenerator:
         }
         return hashlib.sha256(json.dumps(profile_data, sort_keys=True).encode()).hexdigest()
     
-    def _hash_posts_data(self) -> str:
-        """Posts verisi için hash oluştur."""
-        posts_data = []
-        for post in self.data.posts:
-            post_info = {
-                "post_id": post.post_id,
-                "timestamp": post.timestamp,
-                "like_count": post.like_count,
-                "comment_count": post.comment_count,
-                "media_count": len(post.media)
-            }
-            posts_data.append(post_info)
-        
-        return hashlib.sha256(json.dumps(posts_data, sort_keys=True).encode()).hexdigest()
-    
-    def _hash_stories_data(self) -> str:
-        """Stories verisi için hash oluştur."""
-        stories_data = []
-        for story in self.data.stories:
-            story_info = {
-                "story_id": story.story_id,
-                "timestamp": story.timestamp,
-                "view_count": story.view_count,
-                "media_type": story.media_type
-            }
-            stories_data.append(story_info)
-        
-        return hashlib.sha256(json.dumps(stories_data, sort_keys=True).encode()).hexdigest()
-    
-    def _hash_comments_data(self) -> str:
-        """Comments verisi için hash oluştur."""
-        comments_data = []
-        for comment in self.data.comments:
-            comment_info = {
-                "comment_id": comment.comment_id,
-                "post_id": comment.post_id,
-                "timestamp": comment.timestamp,
-                "like_count": comment.like_count
-            }
-            comments_data.append(comment_info)
-        
-        return hashlib.sha256(json.dumps(comments_data, sort_keys=True).encode()).hexdigest()
-    
-    def _hash_dms_data(self) -> str:
-        """Direct messages verisi için hash oluştur."""
-        dms_data = []
-        for dm in self.data.direct_messages:
-            dm_info = {
-                "message_id": dm.message_id,
-                "conversation_id": dm.conversation_id,
-                "timestamp": dm.timestamp,
-                "message_type": dm.message_type
-            }
-            dms_data.append(dm_info)
-        
-        return hashlib.sha256(json.dumps(dms_data, sort_keys=True).encode()).hexdigest()
-    
-    def _calculate_confidence_score(self) -> float:
+    def _calculate_confidence_score(self, integrity: Optional[Dict[str, int]] = None) -> float:
         """
         Verinin güvenilirlik skorunu hesaplar.
         Çeşitli faktörlere göre 0.0-1.0 arası skor verir.
@@ -147,25 +245,27 @@ class InstagramProofGenerator:
         if self.data.profile:
             score += 0.2
         
-        if len(self.data.posts) > 0:
+        if self.count('posts') > 0:
             score += 0.2
         
-        if len(self.data.engagement_metrics) > 0:
+        if self.count('engagement_metrics') > 0:
             score += 0.2
         
         # Veri tutarlılığı kontrolü
-        if self.data.profile.post_count == len(self.data.posts):
+        if self.data.profile.post_count == self.count('posts'):
             score += 0.1
-        elif abs(self.data.profile.post_count - len(self.data.posts)) <= 5:
+        elif abs(self.data.profile.post_count - self.count('posts')) <= 5:
             score += 0.05  # Küçük fark kabul edilebilir
         
         # Zaman damgası tutarlılığı
         if self.data.data_export_timestamp:
             score += 0.1
         
-        # Etkileşim verisi tutarlılığı
-        if len(self.data.comments) > 0 or len(self.data.direct_messages) > 0:
-            score += 0.1
+        # Etkileşim verisi tutarlılığı: tekrar eden etkileşimler tek bir kişiden ya da tek bir konuşmadan gelmemeli,
+        # yorumlar export'taki gönderilere, mesajlar profil kullanıcısına bağlanmalı
+        if self.count('comments') > 0 or self.count('direct_messages') > 0:
+            checks = (self._interactions_are_diverse(), self._references_are_consistent(integrity))
+            score += 0.05 * sum(checks)
         
         # Doğrulanmış hesap bonusu
         if self.data.profile.is_verified:
@@ -173,22 +273,38 @@ class InstagramProofGenerator:
         
         return min(score, 1.0)
     
+    def _interactions_are_diverse(self) -> bool:
+        """Birden fazla yorum veya mesaj varsa, bunlar birden fazla yorumcuya veya konuşmaya dağılmış mı."""
+        for collection, name in (('comments', 'comments.author_username'),
+                                 ('direct_messages', 'direct_messages.conversation_id')):
+            if self.count(collection) > 1 and self.distinct(name) < 2:
+                return False
+        return True
+    
+    def _references_are_consistent(self, integrity: Optional[Dict[str, int]]) -> bool:
+        """Sahipsiz yorum ve mesajlar ile karşı tarafı değişen konuşmalar, kontrol edilen etkileşimlerin küçük bir kısmı mı."""
+        if not integrity:
+            return True
+        checked = integrity['comments_checked'] + integrity['direct_messages_checked']
+        problems = integrity['orphan_comments'] + integrity['orphan_direct_messages'] + integrity['conversation_conflicts']
+        return problems <= ORPHAN_TOLERANCE * checked
+    
     def _determine_verification_method(self) -> str:
         """
         Verinin nasıl doğrulandığını belirler.
         """
         # Engagement metrics varsa muhtemelen resmi export
-        if len(self.data.engagement_metrics) > 0:
+        if self.count('engagement_metrics') > 0:
             return "official_data_export"
         
         # Sadece temel veriler varsa scraping olabilir
-        if len(self.data.posts) > 0 and len(self.data.stories) == 0:
+        if self.count('posts') > 0 and self.count('stories') == 0:
             return "api_scraping"
         
         # Comprehensive veri varsa data export
-        if (len(self.data.posts) > 0 and 
-            len(self.data.comments) > 0 and 
-            len(self.data.direct_messages) > 0):
+        if (self.count('posts') > 0 and 
+            self.count('comments') > 0 and 
+            self.count('direct_messages') > 0):
             return "comprehensive_data_export"
         
         return "manual_verification"
\ No newline at end of file
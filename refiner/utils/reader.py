@@ -0,0 +1,190 @@
+import json
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, Optional, Tuple
+
+try:
+    import ijson
+except ImportError:  # ijson is optional, streaming falls back to a full load
+    ijson = None
+
+# Errors raised on malformed JSON, by the incremental parser or by the full load
+JSON_ERRORS = (ValueError,) if ijson is None else (ValueError, ijson.JSONError)
+
+
+def load_json(file_path: str) -> Any:
+    """
+    Load a whole JSON file.
+
+    Args:
+        file_path: Path to the JSON file
+
+    Returns:
+        The decoded JSON document
+    """
+    with open(file_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def iter_json_items(file_path: str, prefix: str) -> Iterator[Any]:
+    """
+    Stream the values found at `prefix` in a JSON file without loading the document.
+
+    The incremental parser reads the file in small buffers, so only the item
+    being built is held in memory. (Parsing a memory mapping of the file
+    instead counts every page read towards the RSS, up to the file size.)
+    Without ijson installed the whole document is loaded instead.
+
+    Args:
+        file_path: Path to the JSON file
+        prefix: ijson prefix of the values to yield, e.g. "posts.item"
+
+    Returns:
+        Iterator over the values at the prefix
+    """
+    if ijson is None:
+        yield from _walk_prefix(load_json(file_path), prefix.split('.') if prefix else [])
+        return
+
+    with open(file_path, 'rb') as f:
+        if f.seek(0, 2) == 0:
+            return
+        f.seek(0)
+        yield from ijson.items(f, prefix, use_float=True)
+
+
+def read_json_fields(file_path: str, keys: Iterable[str]) -> Dict[str, Any]:
+    """
+    Read a few top-level fields of a JSON object without loading the rest of it.
+
+    Every field is looked up in its own pass of the incremental parser, which
+    filters by prefix in the parser itself and stops at the field; the values in
+    between are skipped without being built. Without ijson installed the whole
+    document is loaded instead.
+
+    Args:
+        file_path: Path to the JSON file
+        keys: Top-level keys to read
+
+    Returns:
+        The values of the requested keys that are present in the document
+    """
+    if ijson is None:
+        wanted = set(keys)
+        document = load_json(file_path)
+        return {key: value for key, value in document.items() if key in wanted}
+
+    fields = {}
+    with open(file_path, 'rb') as f:
+        if f.seek(0, 2) == 0:
+            return fields
+        for key in keys:
+            f.seek(0)
+            for value in ijson.items(f, key, use_float=True):
+                fields[key] = value
+                break
+    return fields
+
+
+class JsonField:
+    """
+    A top-level field of a JSON object being parsed from a stream.
+
+    The value is read straight from the events of the incremental parser, so
+    a field must be read before the next one is requested; a field left unread
+    is skipped without being built.
+    """
+
+    def __init__(self, key: str, events: Optional[Iterator[Tuple[str, str, Any]]] = None, value: Any = None):
+        """
+        Args:
+            key: Key of the field
+            events: Parser events following the key, None if the document was loaded whole
+            value: Value of the field of a loaded document
+        """
+        self.key = key
+        self._events = events
+        self._loaded = value
+        self._run = None
+        self._boundary = None
+
+    def value(self) -> Any:
+        """Build the whole value of the field."""
+        if self._events is None:
+            return self._loaded
+        return next(ijson.items(self._read(), self.key), None)
+
+    def items(self) -> Iterator[Any]:
+        """Stream the items of an array field one at a time."""
+        if self._events is None:
+            yield from _walk_prefix(self._loaded, ['item'])
+            return
+        yield from ijson.items(self._read(), f"{self.key}.item")
+
+    def skip(self) -> Optional[Tuple[str, str, Any]]:
+        """Skip what is left of the field, returning the parser event that follows it."""
+        if self._events is not None:
+            for _ in self._run or self._read():
+                pass
+        return self._boundary
+
+    def _read(self) -> Iterator[Tuple[str, str, Any]]:
+        if self._run is not None:
+            raise ValueError(f"Field {self.key} was already read")
+        self._run = self._field_events()
+        return self._run
+
+    def _field_events(self) -> Iterator[Tuple[str, str, Any]]:
+        # Events of the field have a prefix, the next key or the end of the object has none
+        for event in self._events:
+            if not event[0]:
+                self._boundary = event
+                return
+            yield event
+
+
+def iter_json_fields(stream: BinaryIO) -> Iterator[Tuple[str, JsonField]]:
+    """
+    Walk the top-level fields of a JSON object in a single pass over a stream.
+
+    Unlike read_json_fields and iter_json_items, which seek back to the start
+    of a file for every field, the stream is read once, front to back, so it
+    can be a network upload or a decompressing reader. Without ijson installed
+    the whole document is loaded instead.
+
+    Args:
+        stream: Binary stream of the JSON document
+
+    Yields:
+        Key and field of every top-level field, in document order
+    """
+    if ijson is None:
+        document = json.load(stream)
+        if not isinstance(document, dict):
+            raise ValueError("The document is not a JSON object")
+        for key, value in document.items():
+            yield key, JsonField(key, value=value)
+        return
+
+    events = ijson.parse(stream, use_float=True)
+    first = next(events, None)
+    if first is None or first[1] != 'start_map':
+        raise ValueError("The document is not a JSON object")
+    event = next(events)
+    while event is not None and event[1] == 'map_key':
+        field = JsonField(event[2], events)
+        yield event[2], field
+        event = field.skip()
+
+
+def _walk_prefix(value: Any, path: list) -> Iterator[Any]:
+    """Yield the values of an already loaded document that match an ijson prefix."""
+    if not path:
+        yield value
+        return
+
+    head, rest = path[0], path[1:]
+    if head == 'item':
+        if isinstance(value, list):
+            for item in value:
+                yield from _walk_prefix(item, rest)
+    elif isinstance(value, dict) and head in value:
+        yield from _walk_prefix(value[head], rest)
@@ -0,0 +1,140 @@
+import logging
+import os
+import sqlite3
+from typing import Dict, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+from refiner.utils.database import connect, is_memory_database
+
+# Tables split by time, with the column holding each row's timestamp
+TIME_PARTITIONED_TABLES = {
+    'posts': 'post_date',
+    'stories': 'story_date',
+    'comments': 'comment_date',
+    'direct_messages': 'message_date',
+    'engagement_metrics': 'metric_date',
+}
+
+# Tables stored alongside the rows of a time-partitioned parent table
+CHILD_TABLES = {
+    'media': ('posts', 'post_id'),
+}
+
+# Lookup tables needed to read the rows of any shard
+SHARED_TABLES = ('media_types', 'message_types')
+
+GRANULARITIES = ('year', 'quarter')
+PROFILE_SHARD = 'profile'
+
+
+class Shard(BaseModel):
+    name: str
+    path: str
+    start: Optional[str] = None  # Inclusive, None for the profile shard
+    end: Optional[str] = None  # Exclusive, None for the profile shard
+    row_counts: Dict[str, int] = {}
+    cid: Optional[str] = None
+    url: Optional[str] = None
+
+
+class ShardManifest(BaseModel):
+    version: int = 1
+    granularity: str
+    schema: str
+    shards: List[Shard]
+
+
+def build_shards(db_path: str, shard_dir: str, granularity: str) -> List[Shard]:
+    """
+    Split a refinement into time-partitioned SQLite shards plus a profile shard.
+
+    Every shard carries the full schema and the lookup tables. Time shards hold
+    the rows of the time-partitioned tables (and their child rows) that fall in
+    their period, the profile shard holds every other table.
+
+    Args:
+        db_path: Path to the complete refinement database
+        shard_dir: Directory to write the shard databases to
+        granularity: Partition size, "year" or "quarter"
+
+    Returns:
+        The shards, profile shard first and time shards in chronological order
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Unsupported shard granularity: {granularity}")
+    os.makedirs(shard_dir, exist_ok=True)
+
+    source = connect(db_path)
+    try:
+        schema = [sql for (sql,) in source.execute(
+            "SELECT sql FROM sqlite_master WHERE sql IS NOT NULL "
+            "ORDER BY CASE type WHEN 'table' THEN 0 WHEN 'index' THEN 1 ELSE 2 END, name"
+        )]
+        tables = {name for (name,) in source.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+        periods = sorted({
+            _period(timestamp, granularity)
+            for table, column in TIME_PARTITIONED_TABLES.items() if table in tables
+            for (timestamp,) in source.execute(f"SELECT DISTINCT substr({column}, 1, 10) FROM {table}")
+        })
+    finally:
+        source.close()
+
+    partitioned = set(TIME_PARTITIONED_TABLES) | set(CHILD_TABLES)
+    profile = Shard(name=PROFILE_SHARD, path=os.path.join(shard_dir, f"db-{PROFILE_SHARD}.libsql"))
+    profile.row_counts = _write_shard(db_path, profile.path, schema, {
+        table: f"SELECT * FROM source.{table}" for table in sorted(tables - partitioned)
+    })
+    shards = [profile]
+
+    for name, start, end in periods:
+        shard = Shard(name=name, path=os.path.join(shard_dir, f"db-{name}.libsql"), start=start, end=end)
+        selects = {table: f"SELECT * FROM source.{table}" for table in SHARED_TABLES if table in tables}
+        for table, column in TIME_PARTITIONED_TABLES.items():
+            if table in tables:
+                selects[table] = f"SELECT * FROM source.{table} WHERE {column} >= '{start}' AND {column} < '{end}'"
+        for table, (parent, key) in CHILD_TABLES.items():
+            if table in tables and parent in selects:
+                selects[table] = (
+                    f"SELECT * FROM source.{table} WHERE {key} IN "
+                    f"(SELECT {key} FROM source.{parent} WHERE {TIME_PARTITIONED_TABLES[parent]} >= '{start}' "
+                    f"AND {TIME_PARTITIONED_TABLES[parent]} < '{end}')"
+                )
+        shard.row_counts = _write_shard(db_path, shard.path, schema, selects)
+        shards.append(shard)
+
+    logging.info(f"Split {db_path} into {len(shards)} shards by {granularity}")
+    return shards
+
+
+def _period(date: str, granularity: str) -> Tuple[str, str, str]:
+    """Return the (name, start, end) of the period containing a YYYY-MM-DD date."""
+    year, month = int(date[:4]), int(date[5:7])
+    if granularity == 'year':
+        return f"{year}", f"{year:04d}-01-01", f"{year + 1:04d}-01-01"
+
+    quarter = (month - 1) // 3 + 1
+    start_month = (quarter - 1) * 3 + 1
+    end_year, end_month = (year + 1, 1) if quarter == 4 else (year, start_month + 3)
+    return f"{year}-Q{quarter}", f"{year:04d}-{start_month:02d}-01", f"{end_year:04d}-{end_month:02d}-01"
+
+
+def _write_shard(db_path: str, shard_path: str, schema: List[str], selects: Dict[str, str]) -> Dict[str, int]:
+    """Create a shard database and copy the selected rows into it."""
+    if os.path.exists(shard_path):
+        os.remove(shard_path)
+
+    # Only a connection opened with URIs enabled can attach an in-memory refinement
+    shard = sqlite3.connect(shard_path, uri=is_memory_database(db_path))
+    try:
+        for sql in schema:
+            shard.execute(sql)
+        shard.execute("ATTACH DATABASE ? AS source", (db_path,))
+        row_counts = {}
+        for table, select in selects.items():
+            row_counts[table] = shard.execute(f"INSERT INTO {table} {select}").rowcount
+        shard.commit()
+        shard.execute("DETACH DATABASE source")
+    finally:
+        shard.close()
+    return row_counts
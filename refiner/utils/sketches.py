@@ -0,0 +1,214 @@
+import base64
+import hashlib
+import math
+import zlib
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+# 2^12 one-byte registers: 4 KiB per sketch, about 1.6% standard error
+DEFAULT_PRECISION = 12
+
+# Size of the largest KLL compactor; the rank error is around 1.7 / k
+DEFAULT_K = 200
+
+# Capacity ratio between a KLL compactor and the one above it, and the smallest capacity of a compactor
+_CAPACITY_RATIO = 2 / 3
+_MIN_CAPACITY = 8
+
+
+class HyperLogLog:
+    """
+    Estimate the number of distinct values of a stream in fixed memory.
+
+    Sketches of the same precision merge into the sketch of the combined
+    stream, so sketches built on different inputs or processes can be added up.
+    """
+
+    def __init__(self, precision: int = DEFAULT_PRECISION):
+        if not 4 <= precision <= 16:
+            raise ValueError(f"HyperLogLog precision must be between 4 and 16, got {precision}")
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+
+    def add(self, value: Any) -> None:
+        self.update((value,))
+
+    def update(self, values: Iterable[Any]) -> None:
+        precision, registers = self.precision, self.registers
+        bits = 64 - precision
+        mask = (1 << bits) - 1
+        for value in values:
+            if value is None:
+                continue
+            # A stable hash, Python's own hash of strings changes between processes
+            hashed = int.from_bytes(hashlib.blake2b(str(value).encode(), digest_size=8).digest(), 'big')
+            index = hashed >> bits
+            rank = bits - (hashed & mask).bit_length() + 1
+            if rank > registers[index]:
+                registers[index] = rank
+
+    def merge(self, other: "HyperLogLog") -> None:
+        if other.precision != self.precision:
+            raise ValueError(f"Cannot merge HyperLogLog sketches of precision {self.precision} and {other.precision}")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def estimate(self) -> int:
+        """Estimated number of distinct values added."""
+        m = len(self.registers)
+        raw = 0.7213 / (1 + 1.079 / m) * m * m / sum(2.0 ** -register for register in self.registers)
+        zeros = self.registers.count(0)
+        if raw <= 2.5 * m and zeros:
+            # Linear counting is more accurate while most registers are empty
+            return round(m * math.log(m / zeros))
+        return round(raw)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'type': 'hll',
+            'precision': self.precision,
+            'registers': base64.b64encode(zlib.compress(bytes(self.registers))).decode()
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "HyperLogLog":
+        sketch = cls(data['precision'])
+        sketch.registers = bytearray(zlib.decompress(base64.b64decode(data['registers'])))
+        return sketch
+
+
+class KLLSketch:
+    """
+    Estimate the quantiles of a stream of numbers in fixed memory.
+
+    Values are kept in a hierarchy of compactors; a full compactor sorts its
+    values and promotes every other one to the level above, where each value
+    stands for twice as many. Compactions alternate between promoting the even
+    and the odd positions instead of choosing at random, so the same stream
+    always yields the same sketch.
+    """
+
+    def __init__(self, k: int = DEFAULT_K):
+        if k < 8:
+            raise ValueError(f"KLL sketch size must be at least 8, got {k}")
+        self.k = k
+        self.count = 0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+        self.compactors: List[List[float]] = []
+        self.offsets: List[int] = []
+        self._size = 0
+        self._grow()
+
+    def add(self, value: Union[int, float]) -> None:
+        self.update((value,))
+
+    def update(self, values: Iterable[Union[int, float]]) -> None:
+        level = self.compactors[0]
+        for value in values:
+            if value is None:
+                continue
+            value = float(value)
+            self.count += 1
+            if self.min is None or value < self.min:
+                self.min = value
+            if self.max is None or value > self.max:
+                self.max = value
+            level.append(value)
+            self._size += 1
+            if self._size >= self._max_size:
+                self._compress()
+                level = self.compactors[0]
+
+    def merge(self, other: "KLLSketch") -> None:
+        while len(self.compactors) < len(other.compactors):
+            self._grow()
+        for level, values in enumerate(other.compactors):
+            self.compactors[level].extend(values)
+        self._size += other._size
+        self.count += other.count
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+        while self._size >= self._max_size:
+            self._compress()
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimated value at rank q (0.0-1.0) of the values added, None if none were."""
+        if not self.count:
+            return None
+        if q <= 0:
+            return self.min
+        if q >= 1:
+            return self.max
+        weighted = sorted(
+            (value, 1 << level) for level, values in enumerate(self.compactors) for value in values
+        )
+        target = q * sum(weight for _, weight in weighted)
+        seen = 0
+        for value, weight in weighted:
+            seen += weight
+            if seen >= target:
+                return value
+        return self.max
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'type': 'kll',
+            'k': self.k,
+            'count': self.count,
+            'min': self.min,
+            'max': self.max,
+            'compactors': self.compactors,
+            'offsets': self.offsets
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "KLLSketch":
+        sketch = cls(data['k'])
+        sketch.count = data['count']
+        sketch.min = data['min']
+        sketch.max = data['max']
+        while len(sketch.compactors) < len(data['compactors']):
+            sketch._grow()
+        sketch.compactors = [list(values) for values in data['compactors']]
+        sketch.offsets = list(data['offsets'])
+        sketch._size = sum(len(values) for values in sketch.compactors)
+        return sketch
+
+    def _grow(self) -> None:
+        """Add a compactor on top; every level below shrinks by the capacity ratio."""
+        self.compactors.append([])
+        self.offsets.append(0)
+        depth = len(self.compactors)
+        self._capacities = [
+            max(int(math.ceil(self.k * _CAPACITY_RATIO ** (depth - level - 1))), _MIN_CAPACITY) for level in range(depth)
+        ]
+        self._max_size = sum(self._capacities)
+
+    def _compress(self) -> None:
+        """Compact full levels, lowest first, until the sketch is back under its size limit."""
+        for level in range(len(self.compactors)):
+            if len(self.compactors[level]) < self._capacities[level]:
+                continue
+            if level + 1 == len(self.compactors):
+                self._grow()
+            values = sorted(self.compactors[level])
+            kept = [values.pop()] if len(values) % 2 else []
+            promoted = values[self.offsets[level]::2]
+            self.compactors[level + 1].extend(promoted)
+            self.offsets[level] ^= 1
+            self.compactors[level] = kept
+            self._size -= len(values) - len(promoted)
+            if self._size < self._max_size:
+                break
+
+
+Sketch = Union[HyperLogLog, KLLSketch]
+
+
+def load_sketch(data: Dict[str, Any]) -> Sketch:
+    """Rebuild a sketch from its to_dict form, e.g. to merge the sketches of several proofs."""
+    if data.get('type') == 'hll':
+        return HyperLogLog.from_dict(data)
+    if data.get('type') == 'kll':
+        return KLLSketch.from_dict(data)
+    raise ValueError(f"Unknown sketch type: {data.get('type')}")
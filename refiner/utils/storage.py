@@ -0,0 +1,364 @@
+import json
+import logging
+import os
+import shutil
+import threading
+from email import policy
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import requests
+
+from refiner.config import settings
+from refiner.utils.cid import bytes_cid
+
+PINATA_FILE_API_PATH = "/pinning/pinFileToIPFS"
+PINATA_PIN_LIST_API_PATH = "/data/pinList"
+GATEWAY_PATH = "/ipfs/"
+
+STORAGE_BACKENDS = ("pinata", "local", "stub")
+
+
+class StorageBackend:
+    """
+    Store for refinement artifacts, addressed by IPFS CID.
+
+    Callers precompute the CID of what they store (see refiner.utils.cid), so
+    backends can skip content they already hold without transferring it.
+    """
+
+    def put_file(self, file_path: str, cid: str) -> str:
+        """
+        Store a file.
+
+        Args:
+            file_path: Path to the file
+            cid: Precomputed CID of the file
+
+        Returns:
+            Hash the content is stored under
+        """
+        raise NotImplementedError
+
+    def put_json(self, payload: bytes, cid: str) -> str:
+        """Store a serialized JSON document, returning the hash it is stored under."""
+        raise NotImplementedError
+
+    def has(self, cid: str) -> bool:
+        """Check whether content is already stored."""
+        raise NotImplementedError
+
+    def get(self, cid: str) -> Optional[bytes]:
+        """Return stored content if the backend can read it without the network, None otherwise."""
+        return None
+
+    def url(self, cid: str) -> str:
+        """URL stored content can be read from, by the hash it is stored under (defaults to the IPFS gateway)."""
+        return f"{settings.IPFS_GATEWAY_URL}/{cid}"
+
+
+class PinataStorage(StorageBackend):
+    """Pins content on Pinata (https://pinata.cloud/), or on a server speaking its API."""
+
+    def __init__(self, api_url: Optional[str] = None, api_key: Optional[str] = None,
+                 api_secret: Optional[str] = None, gateway_url: Optional[str] = None):
+        self.api_url = api_url or settings.PINATA_API_URL
+        self.api_key = api_key or settings.PINATA_API_KEY
+        self.api_secret = api_secret or settings.PINATA_API_SECRET
+        self.gateway_url = gateway_url
+
+    def _headers(self) -> Dict[str, str]:
+        if not self.api_key or not self.api_secret:
+            raise Exception("Error: Pinata IPFS API credentials not found, please check your environment variables")
+        return {
+            "pinata_api_key": self.api_key,
+            "pinata_secret_api_key": self.api_secret
+        }
+
+    def put_file(self, file_path: str, cid: str) -> str:
+        with open(file_path, 'rb') as file:
+            return self._pin_file(file)
+
+    def put_json(self, payload: bytes, cid: str) -> str:
+        # Pinned as a file rather than through pinJSONToIPFS, which re-serializes the
+        # document: the pinned bytes, and so their CID, are then exactly the payload's
+        return self._pin_file((f"{cid}.json", payload, "application/json"))
+
+    def _pin_file(self, file) -> str:
+        headers = self._headers()
+        response = requests.post(
+            f"{self.api_url}{PINATA_FILE_API_PATH}",
+            files={'file': file},
+            data={'pinataOptions': json.dumps({'cidVersion': settings.IPFS_CID_VERSION})},
+            headers=headers
+        )
+        response.raise_for_status()
+        return response.json()['IpfsHash']
+
+    def has(self, cid: str) -> bool:
+        response = requests.get(
+            f"{self.api_url}{PINATA_PIN_LIST_API_PATH}",
+            params={"hashContains": cid, "status": "pinned", "pageLimit": 1},
+            headers=self._headers()
+        )
+        response.raise_for_status()
+        return response.json().get('count', 0) > 0
+
+    def url(self, cid: str) -> str:
+        return f"{self.gateway_url}/{cid}" if self.gateway_url else super().url(cid)
+
+
+class LocalStorage(StorageBackend):
+    """
+    Content-addressed store in a local directory.
+
+    Every blob is a file named after its CID, so identical content is only
+    ever stored once.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def path(self, cid: str) -> str:
+        return os.path.join(self.root, cid)
+
+    def put_file(self, file_path: str, cid: str) -> str:
+        if not self.has(cid):
+            os.makedirs(self.root, exist_ok=True)
+            tmp_path = f"{self.path(cid)}.{threading.get_ident()}.tmp"
+            shutil.copyfile(file_path, tmp_path)
+            os.replace(tmp_path, self.path(cid))
+        return cid
+
+    def put_json(self, payload: bytes, cid: str) -> str:
+        return self.put_bytes(payload, cid)
+
+    def put_bytes(self, data: bytes, cid: str) -> str:
+        if not self.has(cid):
+            os.makedirs(self.root, exist_ok=True)
+            tmp_path = f"{self.path(cid)}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, self.path(cid))
+        return cid
+
+    def has(self, cid: str) -> bool:
+        return os.path.exists(self.path(cid))
+
+    def get(self, cid: str) -> Optional[bytes]:
+        if not self.has(cid):
+            return None
+        with open(self.path(cid), 'rb') as f:
+            return f.read()
+
+    def url(self, cid: str) -> str:
+        # The store is not served by any gateway, its content is read from the file
+        return Path(self.path(cid)).resolve().as_uri()
+
+
+class WriteThroughStorage(StorageBackend):
+    """
+    Local store in front of a remote backend.
+
+    Content is stored remotely first and then kept locally under its local
+    CID, so storing it again is answered from the local store without any
+    upload. When the remote backend returns another hash for the content, the
+    local CID is mapped to it, like the pin index does (see refiner.utils.ipfs).
+    """
+
+    # Local CIDs mapped to the hashes the remote backend stored the content under, when they differ
+    REMOTE_HASHES = "remote_hashes.json"
+
+    def __init__(self, local: LocalStorage, remote: StorageBackend):
+        self.local = local
+        self.remote = remote
+        self._lock = threading.Lock()
+
+    def put_file(self, file_path: str, cid: str) -> str:
+        if self.local.has(cid):
+            return self._remote_hashes().get(cid, cid)
+        ipfs_hash = self.remote.put_file(file_path, cid)
+        self.local.put_file(file_path, cid)
+        self._record_remote_hash(cid, ipfs_hash)
+        return ipfs_hash
+
+    def put_json(self, payload: bytes, cid: str) -> str:
+        if self.local.has(cid):
+            return self._remote_hashes().get(cid, cid)
+        ipfs_hash = self.remote.put_json(payload, cid)
+        self.local.put_json(payload, cid)
+        self._record_remote_hash(cid, ipfs_hash)
+        return ipfs_hash
+
+    def has(self, cid: str) -> bool:
+        return self._local_cid(cid) is not None or self.remote.has(cid)
+
+    def get(self, cid: str) -> Optional[bytes]:
+        local_cid = self._local_cid(cid)
+        return self.local.get(local_cid) if local_cid else None
+
+    def url(self, cid: str) -> str:
+        # Content is always stored remotely, the local store is only a cache of it
+        return self.remote.url(cid)
+
+    def _local_cid(self, cid: str) -> Optional[str]:
+        """Local CID of content stored locally under a local CID or a remote hash, None if it is not."""
+        if self.local.has(cid):
+            return cid
+        for local_cid, remote_hash in self._remote_hashes().items():
+            if remote_hash == cid and self.local.has(local_cid):
+                return local_cid
+        return None
+
+    def _remote_hashes(self) -> Dict[str, str]:
+        path = self.local.path(self.REMOTE_HASHES)
+        if not os.path.exists(path):
+            return {}
+        with open(path, 'r') as f:
+            return json.load(f)
+
+    def _record_remote_hash(self, cid: str, ipfs_hash: str) -> None:
+        if ipfs_hash == cid:
+            return
+        with self._lock:
+            hashes = self._remote_hashes()
+            hashes[cid] = ipfs_hash
+            tmp_path = f"{self.local.path(self.REMOTE_HASHES)}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(hashes, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.local.path(self.REMOTE_HASHES))
+
+
+class StubPinataServer:
+    """
+    In-process HTTP server implementing the parts of the Pinata API the refiner
+    uses, plus a gateway serving pinned content under /ipfs/<cid>.
+
+    Content is kept in memory and CIDs are computed locally, so the complete
+    upload path, HTTP included, runs without network access or credentials.
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0):
+        self.pinned: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StubPinataServer":
+        self.thread.start()
+        return self
+
+    def shutdown(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def pin(self, content: bytes, version: int) -> str:
+        cid = bytes_cid(content, version)
+        with self._lock:
+            self.pinned[cid] = content
+        return cid
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                path = urlparse(self.path).path
+                if path == PINATA_FILE_API_PATH:
+                    content, options = _parse_file_upload(self.headers.get('Content-Type', ''), body)
+                    cid = stub.pin(content, options.get('cidVersion', 0))
+                else:
+                    self._respond(404, {'error': f"Unknown endpoint {path}"})
+                    return
+                self._respond(200, {'IpfsHash': cid, 'PinSize': len(body)})
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path == PINATA_PIN_LIST_API_PATH:
+                    cid = parse_qs(url.query).get('hashContains', [''])[0]
+                    self._respond(200, {'count': int(cid in stub.pinned)})
+                elif url.path.startswith(GATEWAY_PATH) and url.path[len(GATEWAY_PATH):] in stub.pinned:
+                    content = stub.pinned[url.path[len(GATEWAY_PATH):]]
+                    self.send_response(200)
+                    self.send_header('Content-Length', str(len(content)))
+                    self.end_headers()
+                    self.wfile.write(content)
+                else:
+                    self._respond(404, {'error': "Not found"})
+
+            def _respond(self, status: int, body: dict):
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                logging.debug(f"Stub Pinata server: {format % args}")
+
+        return Handler
+
+
+def _parse_file_upload(content_type: str, body: bytes) -> Tuple[bytes, dict]:
+    """Extract the file and the pinataOptions of a multipart pinFileToIPFS request."""
+    message = BytesParser(policy=policy.default).parsebytes(
+        f"Content-Type: {content_type}\r\n\r\n".encode() + body
+    )
+    content, options = b"", {}
+    for part in message.iter_parts():
+        name = part.get_param('name', header='content-disposition')
+        if name == 'file':
+            content = part.get_payload(decode=True)
+        elif name == 'pinataOptions':
+            options = json.loads(part.get_payload(decode=True))
+    return content, options
+
+
+_storages: Dict[tuple, StorageBackend] = {}
+_stub_server: Optional[StubPinataServer] = None
+_storage_lock = threading.Lock()
+
+
+def get_storage() -> StorageBackend:
+    """Return the storage backend selected by STORAGE_BACKEND and STORAGE_CACHE."""
+    store_dir = settings.LOCAL_STORE_DIR or os.path.join(settings.OUTPUT_DIR, 'store')
+    # Jobs of one process may use different backends or credentials, each combination gets its own instance
+    key = (settings.STORAGE_BACKEND, settings.STORAGE_CACHE, store_dir, settings.PINATA_API_URL,
+           settings.PINATA_API_KEY, settings.PINATA_API_SECRET)
+    with _storage_lock:
+        storage = _storages.get(key)
+        if storage is None:
+            storage = _create_storage(settings.STORAGE_BACKEND, settings.STORAGE_CACHE, store_dir)
+            _storages[key] = storage
+    return storage
+
+
+def _create_storage(backend: str, cache: bool, store_dir: str) -> StorageBackend:
+    global _stub_server
+    if backend not in STORAGE_BACKENDS:
+        raise ValueError(f"Unsupported storage backend: {backend}")
+
+    if backend == "local":
+        return LocalStorage(store_dir)
+
+    if backend == "stub":
+        if _stub_server is None:
+            _stub_server = StubPinataServer().start()
+            logging.info(f"Started stub Pinata server at {_stub_server.url}")
+        remote = PinataStorage(
+            _stub_server.url, api_key="stub", api_secret="stub", gateway_url=f"{_stub_server.url}{GATEWAY_PATH.rstrip('/')}"
+        )
+    else:
+        remote = PinataStorage()
+
+    return WriteThroughStorage(LocalStorage(store_dir), remote) if cache else remote
@@ -0,0 +1,287 @@
+import io
+import struct
+import zlib
+from typing import BinaryIO, Iterator, Optional, Tuple
+
+# Signatures of the zip records met when reading an archive front to back
+LOCAL_FILE_HEADER = b"PK\x03\x04"
+DATA_DESCRIPTOR = b"PK\x07\x08"
+CENTRAL_DIRECTORY = b"PK\x01\x02"
+END_OF_CENTRAL_DIRECTORY = b"PK\x05\x06"
+
+_LOCAL_HEADER = struct.Struct("<4sHHHHHLLLHH")
+_ZIP64_EXTRA = 0x0001
+_STORED, _DEFLATED = 0, 8
+_ENCRYPTED, _HAS_DESCRIPTOR = 0x1, 0x8
+
+# Bytes read from the underlying stream at a time
+CHUNK_SIZE = 64 * 1024
+
+
+class ChunkedBody(io.RawIOBase):
+    """Decode an HTTP/1.1 `Transfer-Encoding: chunked` request body as it arrives."""
+
+    def __init__(self, rfile: BinaryIO):
+        self.rfile = rfile
+        self.remaining = 0
+        self.finished = False
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        if self.finished:
+            return 0
+        if not self.remaining:
+            line = self.rfile.readline()
+            if not line:
+                raise ValueError("Chunked body ended without its last chunk")
+            self.remaining = int(line.split(b';')[0].strip(), 16)
+            if not self.remaining:
+                # Skip the trailer section
+                while self.rfile.readline() not in (b"\r\n", b"\n", b""):
+                    pass
+                self.finished = True
+                return 0
+        data = self.rfile.read(min(len(buffer), self.remaining))
+        if not data:
+            raise ValueError("Chunked body ended in the middle of a chunk")
+        buffer[:len(data)] = data
+        self.remaining -= len(data)
+        if not self.remaining:
+            self.rfile.readline()  # CRLF closing the chunk
+        return len(data)
+
+
+class LimitedBody(io.RawIOBase):
+    """Read a request body of known `Content-Length`, never past its end."""
+
+    def __init__(self, rfile: BinaryIO, length: int):
+        self.rfile = rfile
+        self.remaining = length
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        if not self.remaining:
+            return 0
+        data = self.rfile.read(min(len(buffer), self.remaining))
+        if not data:
+            raise ValueError(f"Request body ended {self.remaining} bytes early")
+        buffer[:len(data)] = data
+        self.remaining -= len(data)
+        return len(data)
+
+
+class _Prepended(io.RawIOBase):
+    """A stream with the bytes already read from its head put back in front."""
+
+    def __init__(self, head: bytes, stream: BinaryIO):
+        self.head = head
+        self.stream = stream
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        if self.head:
+            data, self.head = self.head[:len(buffer)], self.head[len(buffer):]
+        else:
+            data = self.stream.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def peek_head(stream: BinaryIO, size: int) -> Tuple[bytes, BinaryIO]:
+    """
+    Read the head of a stream without consuming it.
+
+    Unlike BufferedReader.peek, which returns whatever a single read brought
+    in, the head is read until `size` bytes or the end of the stream.
+
+    Returns:
+        The head, and a stream starting with it
+    """
+    head = b""
+    while len(head) < size:
+        data = stream.read(size - len(head))
+        if not data:
+            break
+        head += data
+    return head, io.BufferedReader(_Prepended(head, stream), CHUNK_SIZE)
+
+
+class _ZipMember(io.RawIOBase):
+    """Decompressed content of the zip member the archive stream is positioned at."""
+
+    def __init__(self, archive: "ZipStream", name: str, method: int, compressed_size: Optional[int], crc: int,
+                 has_descriptor: bool, zip64: bool):
+        self.archive = archive
+        self.name = name
+        self.method = method
+        self.remaining = compressed_size
+        self.crc = crc
+        self.has_descriptor = has_descriptor
+        self.zip64 = zip64
+        self.decompressor = zlib.decompressobj(-zlib.MAX_WBITS) if method == _DEFLATED else None
+        self.pending = b""
+        self.computed_crc = 0
+        self.finished = False
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self.pending and not self.finished:
+            self._fill()
+        data, self.pending = self.pending[:len(buffer)], self.pending[len(buffer):]
+        buffer[:len(data)] = data
+        return len(data)
+
+    def drain(self) -> None:
+        """Skip the rest of the member, so the archive stream reaches the next one."""
+        while not self.finished:
+            self.pending = b""
+            self._fill()
+        self.pending = b""
+
+    def _fill(self) -> None:
+        if self.decompressor is None:
+            data = self.archive.read(min(CHUNK_SIZE, self.remaining)) if self.remaining else b""
+            if self.remaining and not data:
+                raise ValueError(f"Archive ended inside {self.name}")
+            self.remaining -= len(data)
+            ended = not self.remaining
+        else:
+            size = CHUNK_SIZE if self.remaining is None else min(CHUNK_SIZE, self.remaining)
+            compressed = self.archive.read(size) if size else b""
+            if self.remaining is not None:
+                self.remaining -= len(compressed)
+            try:
+                data = self.decompressor.decompress(compressed)
+            except zlib.error as e:
+                raise ValueError(f"{self.name} cannot be decompressed, the archive is corrupt: {e}") from e
+            ended = self.decompressor.eof
+            if ended:
+                # Deflate streams end by themselves, bytes past the end belong to the next record
+                self.archive.unread(self.decompressor.unused_data)
+            elif not compressed:
+                raise ValueError(f"Archive ended inside {self.name}")
+        self.computed_crc = zlib.crc32(data, self.computed_crc)
+        self.pending += data
+        if ended:
+            self._finish()
+
+    def _finish(self) -> None:
+        self.finished = True
+        if self.has_descriptor:
+            if self.archive.read_exactly(4) != DATA_DESCRIPTOR:
+                self.archive.unread(self.archive.last_read)
+            self.crc = struct.unpack("<L", self.archive.read_exactly(4))[0]
+            self.archive.read_exactly(16 if self.zip64 else 8)
+        if self.computed_crc != self.crc:
+            raise ValueError(f"CRC mismatch in {self.name}, the archive is corrupt")
+
+
+class ZipStream:
+    """
+    Read a zip archive front to back, as it arrives, without seeking.
+
+    Members are read from their local headers rather than from the central
+    directory at the end of the archive. Each member must be consumed before
+    the next one is requested; stored members must record their size, which
+    every zip writer does unless it streams without seeking itself.
+    """
+
+    def __init__(self, stream: BinaryIO):
+        self.stream = stream
+        self.buffer = b""
+        self.last_read = b""
+
+    def read(self, size: int) -> bytes:
+        if self.buffer:
+            data, self.buffer = self.buffer[:size], self.buffer[size:]
+        else:
+            data = self.stream.read(size)
+        self.last_read = data
+        return data
+
+    def read_exactly(self, size: int) -> bytes:
+        data = b""
+        while len(data) < size:
+            chunk = self.read(size - len(data))
+            if not chunk:
+                raise ValueError("Archive ended in the middle of a record")
+            data += chunk
+        self.last_read = data
+        return data
+
+    def unread(self, data: bytes) -> None:
+        self.buffer = data + self.buffer
+
+    def members(self) -> Iterator[Tuple[str, BinaryIO]]:
+        """Yield the name and a stream of the decompressed content of every file in the archive."""
+        while True:
+            signature = self.read(4)
+            if len(signature) < 4:
+                signature += self.read_exactly(4 - len(signature)) if signature else b""
+            if signature in (CENTRAL_DIRECTORY, END_OF_CENTRAL_DIRECTORY, b""):
+                # The central directory repeats the local headers, nothing more to extract
+                while self.read(CHUNK_SIZE):
+                    pass
+                return
+            if signature != LOCAL_FILE_HEADER:
+                raise ValueError("Not a zip archive, or a corrupt one")
+
+            fields = _LOCAL_HEADER.unpack(signature + self.read_exactly(_LOCAL_HEADER.size - 4))
+            _, _, flags, method, _, _, crc, compressed_size, _, name_length, extra_length = fields
+            name = self.read_exactly(name_length).decode('utf-8', errors='replace')
+            extra = self.read_exactly(extra_length)
+            zip64 = compressed_size == 0xFFFFFFFF
+            if zip64:
+                compressed_size = _zip64_compressed_size(extra)
+
+            if flags & _ENCRYPTED:
+                raise ValueError(f"{name} is encrypted, encrypted archives are not supported")
+            if method not in (_STORED, _DEFLATED):
+                raise ValueError(f"{name} uses compression method {method}, only stored and deflated are supported")
+            has_descriptor = bool(flags & _HAS_DESCRIPTOR)
+            if has_descriptor and method == _STORED:
+                raise ValueError(f"{name} is stored without its size and cannot be read as a stream")
+
+            member = _ZipMember(self, name, method, None if has_descriptor else compressed_size, crc,
+                                has_descriptor, zip64)
+            if name.endswith('/'):
+                member.drain()
+                continue
+            yield name, io.BufferedReader(member, CHUNK_SIZE)
+            member.drain()
+
+
+def _zip64_compressed_size(extra: bytes) -> int:
+    position = 0
+    while position + 4 <= len(extra):
+        header_id, size = struct.unpack("<HH", extra[position:position + 4])
+        if header_id == _ZIP64_EXTRA:
+            # Uncompressed size first, then the compressed size
+            return struct.unpack("<Q", extra[position + 12:position + 20])[0]
+        position += 4 + size
+    raise ValueError("Zip64 member without its zip64 extra field")
+
+
+def iter_documents(stream: BinaryIO, name: str) -> Iterator[Tuple[str, BinaryIO]]:
+    """
+    Yield the JSON documents of an upload: the files of a zip archive, or the upload itself.
+
+    Args:
+        stream: Stream of the upload, its head tells zip archives apart
+        name: Name the upload is known by, used for a JSON document uploaded as is
+    """
+    head, stream = peek_head(stream, len(LOCAL_FILE_HEADER))
+    if head == LOCAL_FILE_HEADER:
+        for member_name, member in ZipStream(stream).members():
+            if member_name.lower().endswith('.json'):
+                yield member_name, member
+    else:
+        yield name, stream
@@ -0,0 +1,242 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+import traceback
+from collections import defaultdict
+from operator import attrgetter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple, Union
+
+from refiner.models.proof import CombinedProof, InstagramProof
+from refiner.models.unrefined import InstagramData
+from refiner.planner import DEFAULT_STREAMING_BATCH_SIZE
+from refiner.transformer.instagram_transformer import (
+    COLLECTIONS, HEADER_FIELDS, admit_records, needed_collections, read_batches
+)
+from refiner.utils.date import TimeWindow, parse_timestamp
+from refiner.utils.integrity import IntegrityChecker
+from refiner.utils.proof_generator import InstagramProofGenerator
+from refiner.utils.reader import read_json_fields
+
+logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+# Proof fields describing when the proof was made rather than the export
+UNVERIFIED_FIELDS = ('proof_generation_timestamp',)
+
+# proof_type of the proof of a refinement of several exports
+COMBINED_PROOF_TYPE = CombinedProof.model_fields['proof_type'].default
+
+
+def recompute_proof(export_path: str, refined_tables: Optional[List[str]] = None,
+                    window: Optional[TimeWindow] = None, drop_orphans: bool = False,
+                    batch_size: int = DEFAULT_STREAMING_BATCH_SIZE,
+                    seen_keys: Optional[Dict[str, Set[Any]]] = None) -> InstagramProof:
+    """
+    Recompute the proof of an export from the raw export.
+
+    Records are streamed and validated like the transformer does, with the same
+    time window, duplicate dropping and integrity checks, but no rows are built
+    and nothing is written to SQLite.
+
+    Args:
+        export_path: Path to the JSON export
+        refined_tables: Tables the refinement was restricted to, None if it produced all of them
+        window: Time window the records were read with
+        drop_orphans: Whether the refinement left orphaned records out
+        batch_size: Number of records validated together
+        seen_keys: Keys of the records the earlier exports of the same refinement wrote, by
+            table; updated with those of this export (defaults to none, a single-export refinement)
+    """
+    header = InstagramData.model_validate(read_json_fields(export_path, HEADER_FIELDS))
+    collections = needed_collections(refined_tables) if refined_tables is not None else list(COLLECTIONS)
+    window = window or TimeWindow()
+
+    proof_generator = InstagramProofGenerator(header)
+    integrity = IntegrityChecker(header.profile.username, check_comments='posts' in collections, drop_orphans=drop_orphans)
+    seen_keys = defaultdict(set) if seen_keys is None else seen_keys
+    duplicate_counts = defaultdict(int)
+
+    def unique(collection: str, records: List[Any], key: Callable[[Any], Any]) -> List[Any]:
+        kept = []
+        keys = seen_keys.setdefault(collection, set())
+        for record in records:
+            value = key(record)
+            if value in keys:
+                duplicate_counts[collection] += 1
+            else:
+                keys.add(value)
+                kept.append(record)
+        return kept
+
+    for collection, records in read_batches(export_path, batch_size, collections, window):
+        admit_records(collection, records, header.user_id, integrity, proof_generator, unique)
+    # The profile of a user is written once per refinement, like the transformer does
+    unique('user_profiles', [header], attrgetter('user_id'))
+
+    return proof_generator.generate_proof(
+        duplicate_counts=dict(duplicate_counts), refined_tables=refined_tables, window=window,
+        integrity=integrity.result(), orphans_dropped=drop_orphans
+    )
+
+
+def compare_proofs(claimed: Dict[str, Any], recomputed: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """
+    Compare a claimed proof with the recomputed one, field by field.
+
+    Nested objects (duplicate counts, quantiles, sketches) are compared key by
+    key, mismatches are reported under dotted paths such as `quantiles.posts.like_count`.
+
+    Returns:
+        Claimed and recomputed value of every mismatching field
+    """
+    mismatches = {}
+    for path, claimed_value, recomputed_value in _diff(claimed, recomputed, ''):
+        if path.split('.')[0] not in UNVERIFIED_FIELDS:
+            mismatches[path] = {'claimed': claimed_value, 'recomputed': recomputed_value}
+    return mismatches
+
+
+def verify_proof(export_path: str, proof: Union[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Verify a proof against the export it claims to describe.
+
+    The proof of a refinement of several exports (see CombinedProof) is
+    verified against the directory holding them: every export is recomputed in
+    the order it was refined, records earlier exports wrote counting as dropped
+    duplicates, and mismatches are reported under `<input name>:<field>`.
+
+    Args:
+        export_path: Path to the JSON export, or to the input directory of a combined proof
+        proof: Path to the proof.json file, or the proof itself
+
+    Returns:
+        Verification result: `verified`, `mismatch` with the mismatching fields, or `error`
+    """
+    started = time.perf_counter()
+    result = {'export': export_path, 'proof': proof if isinstance(proof, str) else None}
+    try:
+        if isinstance(proof, str):
+            with open(proof, 'r') as f:
+                proof = json.load(f)
+        if proof.get('proof_type') == COMBINED_PROOF_TYPE:
+            seen_keys = {}
+            mismatches = {}
+            for input_name, input_proof in proof['proofs'].items():
+                input_mismatches = _verify_export(os.path.join(export_path, input_name), input_proof, seen_keys)
+                mismatches.update({f"{input_name}:{path}": values for path, values in input_mismatches.items()})
+        else:
+            mismatches = _verify_export(export_path, proof)
+        result.update(status='mismatch' if mismatches else 'verified', mismatches=mismatches)
+    except Exception as e:
+        result.update(status='error', error=str(e), traceback=traceback.format_exc())
+    result['duration_seconds'] = time.perf_counter() - started
+    return result
+
+
+def _verify_export(export_path: str, proof: Dict[str, Any],
+                   seen_keys: Optional[Dict[str, Set[Any]]] = None) -> Dict[str, Dict[str, Any]]:
+    """Recompute the proof of an export with the scope the proof claims, returning the mismatching fields."""
+    window = TimeWindow(
+        parse_timestamp(proof['records_since']) if proof.get('records_since') else None,
+        parse_timestamp(proof['records_until']) if proof.get('records_until') else None
+    )
+    recomputed = recompute_proof(
+        export_path, proof.get('refined_tables'), window, proof.get('orphans_dropped', False), seen_keys=seen_keys
+    )
+    return compare_proofs(proof, recomputed.model_dump())
+
+
+def verify_all(pairs: List[Tuple[str, Union[str, Dict[str, Any]]]], processes: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Verify many proofs in parallel, one export per pool process at a time.
+
+    Args:
+        pairs: Export path and proof (path or object) of every refinement
+        processes: Pool size (defaults to the CPU count)
+
+    Returns:
+        Verification result of every pair, in order
+    """
+    if not pairs:
+        return []
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        return list(executor.map(verify_proof, *zip(*pairs)))
+
+
+def cluster_pairs(cluster_dir: str) -> List[Tuple[str, Dict[str, Any]]]:
+    """Pair every completed input of a cluster run (see refiner.cluster) with the proof its node recorded."""
+    from refiner.cluster import MANIFEST_FILE, load_plan
+    from refiner.models.cluster import ClusterManifest
+
+    plan = load_plan(cluster_dir)
+    with open(os.path.join(cluster_dir, MANIFEST_FILE), 'r') as f:
+        manifest = ClusterManifest.model_validate_json(f.read())
+    return [
+        (os.path.join(plan.input_dir, result.input), result.proof)
+        for result in manifest.results if result.status == 'completed' and result.proof
+    ]
+
+
+def _diff(claimed: Any, recomputed: Any, path: str) -> Iterator[Tuple[str, Any, Any]]:
+    if isinstance(claimed, dict) and isinstance(recomputed, dict):
+        for key in sorted(set(claimed) | set(recomputed), key=str):
+            yield from _diff(claimed.get(key), recomputed.get(key), f"{path}.{key}" if path else str(key))
+    elif claimed != recomputed:
+        yield path, claimed, recomputed
+
+
+def _read_pairs(pairs_path: str) -> List[Tuple[str, str]]:
+    """Read `{"export": ..., "proof": ...}` lines, relative paths are relative to the pairs file."""
+    base_dir = os.path.dirname(os.path.abspath(pairs_path))
+    pairs = []
+    with open(pairs_path, 'r') as f:
+        for line in f:
+            if line.strip():
+                pair = json.loads(line)
+                pairs.append((os.path.join(base_dir, pair['export']), os.path.join(base_dir, pair['proof'])))
+    return pairs
+
+
+# Run with: python -m refiner.verify export.json proof.json [export.json proof.json ...]
+# (the export of a combined proof is the directory of the refinement's inputs)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Verify proofs against their source exports without refining them")
+    parser.add_argument('paths', nargs='*', help="Export and proof paths, in pairs")
+    parser.add_argument('--pairs', help="JSON lines file of {\"export\": ..., \"proof\": ...} pairs")
+    parser.add_argument('--cluster', help="Cluster directory whose completed inputs are verified")
+    parser.add_argument('--processes', type=int, default=None, help="Pool size (defaults to the CPU count)")
+    parser.add_argument('--report', help="Write the results of every pair to this JSON file")
+    args = parser.parse_args()
+
+    if len(args.paths) % 2:
+        parser.error("Exports and proofs must be given in pairs")
+    pairs = list(zip(args.paths[::2], args.paths[1::2]))
+    if args.pairs:
+        pairs += _read_pairs(args.pairs)
+    if args.cluster:
+        pairs += cluster_pairs(args.cluster)
+    if not pairs:
+        parser.error("Nothing to verify")
+
+    started = time.perf_counter()
+    results = verify_all(pairs, args.processes)
+    for result in results:
+        if result['status'] == 'verified':
+            logging.info(f"verified  {result['export']} ({result['duration_seconds']:.2f}s)")
+        elif result['status'] == 'mismatch':
+            logging.info(f"MISMATCH  {result['export']}: {', '.join(result['mismatches'])}")
+        else:
+            logging.info(f"ERROR     {result['export']}: {result['error']}")
+
+    counts = {status: sum(result['status'] == status for result in results) for status in ('verified', 'mismatch', 'error')}
+    logging.info(
+        f"{counts['verified']} verified, {counts['mismatch']} mismatched, {counts['error']} failed "
+        f"in {time.perf_counter() - started:.2f}s"
+    )
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(results, f, indent=2)
+    sys.exit(0 if counts['verified'] == len(results) else 1)
@@ -0,0 +1,228 @@
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Optional
+
+from refiner.context import JobContext
+
+logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+PENDING_DIR = "pending"
+RUNNING_DIR = "running"
+DONE_DIR = "done"
+
+
+def warm_up() -> None:
+    """Import the refinement pipeline once per pool process instead of once per job."""
+    import refiner.__main__  # noqa: F401
+    import refiner.refine  # noqa: F401
+    import refiner.transformer.instagram_transformer  # noqa: F401
+
+
+def run_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Run a single refinement job inside a pool process.
+
+    Args:
+        job: Dictionary with `input_dir` and `output_dir` keys, and an optional `id`
+
+    Returns:
+        Job result with the `Output` of the refinement, or the error that stopped it
+    """
+    from refiner.__main__ import run
+
+    started = time.perf_counter()
+    result = {'id': job.get('id'), 'input_dir': job['input_dir'], 'output_dir': job['output_dir']}
+    try:
+        os.makedirs(job['output_dir'], exist_ok=True)
+        output = run(JobContext.for_job(job['input_dir'], job['output_dir']))
+        result.update(status='completed', output=output.model_dump())
+    except Exception as e:
+        logging.error(f"Job {job.get('id')} failed: {e}")
+        result.update(status='failed', error=str(e), traceback=traceback.format_exc())
+    result['duration_seconds'] = time.perf_counter() - started
+    return result
+
+
+def check_job_id(job_id: Any) -> None:
+    """Refuse job ids that are not a plain file name, since results are written to `done/<job id>.json`."""
+    if not isinstance(job_id, str) or not job_id or any(part in job_id for part in ('/', '\\', '..')):
+        raise ValueError(f"Invalid job id {job_id!r}: it must be a file name, without path separators or '..'")
+
+
+def job_result(job_id: str, future: Future) -> Dict[str, Any]:
+    """Wait for a job, turning a job that never returned a result (e.g. its pool process died) into a failed one."""
+    try:
+        return future.result()
+    except Exception as e:
+        logging.error(f"Job {job_id} failed: {e}")
+        return _failed(job_id, e)
+
+
+def _failed(job_id: str, error: BaseException) -> Dict[str, Any]:
+    """Result of a job that failed before or outside run_job."""
+    return {
+        'id': job_id, 'status': 'failed', 'error': str(error),
+        'traceback': ''.join(traceback.format_exception(error)), 'duration_seconds': 0.0
+    }
+
+
+class RefinementWorker:
+    """
+    Long-running refinement worker backed by a warm process pool.
+
+    Jobs are accepted from a watched directory and/or a localhost HTTP endpoint
+    and run concurrently, one job per pool process at a time, or on threads of
+    the worker's own process, each job with its own JobContext.
+    """
+
+    def __init__(self, processes: Optional[int] = None, initializer: Callable[[], None] = warm_up,
+                 threads: bool = False):
+        """
+        Args:
+            processes: Number of jobs run at a time (defaults to the CPU count)
+            initializer: Run by every pool process or thread before its first job
+            threads: Run jobs on threads of this process instead of a process pool, so
+                nothing is started or imported per worker either
+        """
+        executor = ThreadPoolExecutor if threads else ProcessPoolExecutor
+        self.pool = executor(max_workers=processes, initializer=initializer)
+
+    def submit(self, job: Dict[str, Any]) -> Future:
+        """Queue a job on the pool."""
+        if not isinstance(job, dict) or 'input_dir' not in job or 'output_dir' not in job:
+            raise ValueError("Job must define both input_dir and output_dir")
+        job.setdefault('id', uuid.uuid4().hex)
+        check_job_id(job['id'])
+        return self.pool.submit(run_job, job)
+
+    def watch(self, jobs_dir: str, poll_interval: float = 0.5) -> None:
+        """
+        Process job files dropped into `<jobs_dir>/pending`.
+
+        Each job file is claimed by moving it to `running/`, and its result is
+        written to `done/<job id>.json` once the job finishes.
+        """
+        for name in (PENDING_DIR, RUNNING_DIR, DONE_DIR):
+            os.makedirs(os.path.join(jobs_dir, name), exist_ok=True)
+        logging.info(f"Watching {os.path.join(jobs_dir, PENDING_DIR)} for refinement jobs")
+
+        while True:
+            for job_filename in sorted(os.listdir(os.path.join(jobs_dir, PENDING_DIR))):
+                if not job_filename.endswith('.json'):
+                    continue
+                running_path = os.path.join(jobs_dir, RUNNING_DIR, job_filename)
+                try:
+                    os.rename(os.path.join(jobs_dir, PENDING_DIR, job_filename), running_path)
+                except FileNotFoundError:
+                    continue  # Claimed by another watcher
+
+                job_id = os.path.splitext(job_filename)[0]
+                try:
+                    with open(running_path, 'r') as f:
+                        job = json.load(f)
+                    if isinstance(job, dict):
+                        job.setdefault('id', job_id)
+                    future = self.submit(job)
+                except Exception as e:
+                    # A malformed job must not stop the jobs queued after it
+                    logging.error(f"Job {job_id} could not be submitted: {e}")
+                    self._write_result(jobs_dir, running_path, _failed(job_id, e))
+                    continue
+                future.add_done_callback(
+                    lambda done, path=running_path, job_id=job['id']: self._finish(jobs_dir, path, job_id, done)
+                )
+            time.sleep(poll_interval)
+
+    def _finish(self, jobs_dir: str, running_path: str, job_id: str, future: Future) -> None:
+        """Write the result of a watched job and release its claim."""
+        self._write_result(jobs_dir, running_path, job_result(job_id, future))
+
+    def _write_result(self, jobs_dir: str, running_path: str, result: Dict[str, Any]) -> None:
+        """Write the result of a watched job to done/ and remove its job file from running/."""
+        result_path = os.path.join(jobs_dir, DONE_DIR, f"{result['id']}.json")
+        with open(f"{result_path}.tmp", 'w') as f:
+            json.dump(result, f, indent=2)
+        os.replace(f"{result_path}.tmp", result_path)
+        os.remove(running_path)
+        logging.info(f"Job {result['id']} {result['status']} in {result['duration_seconds']:.2f}s")
+
+    def serve(self, port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+        """
+        Create an HTTP server accepting jobs as `POST /jobs` with a JSON body.
+
+        The request blocks until the job finishes and responds with the job result.
+        """
+        worker = self
+
+        class JobHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == '/health':
+                    self._respond(200, {'status': 'ok'})
+                else:
+                    self._respond(404, {'error': 'Not found'})
+
+            def do_POST(self):
+                if self.path != '/jobs':
+                    self._respond(404, {'error': 'Not found'})
+                    return
+                try:
+                    job = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                    future = worker.submit(job)
+                except (ValueError, TypeError) as e:
+                    self._respond(400, {'error': str(e)})
+                    return
+                result = job_result(job['id'], future)
+                self._respond(200 if result['status'] == 'completed' else 500, result)
+
+            def _respond(self, status: int, body: Dict[str, Any]) -> None:
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                logging.debug(format % args)
+
+        server = ThreadingHTTPServer((host, port), JobHandler)
+        logging.info(f"Accepting refinement jobs on http://{host}:{server.server_port}/jobs")
+        return server
+
+    def shutdown(self) -> None:
+        self.pool.shutdown(wait=True)
+
+
+# Run with: python -m refiner.worker --jobs-dir jobs  (or --port 8080)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run refinement jobs from a warm process pool")
+    parser.add_argument('--processes', type=int, default=None, help="Pool size (defaults to the CPU count)")
+    parser.add_argument('--threads', action='store_true', help="Run jobs on threads of this process instead of processes")
+    parser.add_argument('--jobs-dir', help="Directory to watch for job files")
+    parser.add_argument('--port', type=int, help="Port of the localhost HTTP endpoint")
+    args = parser.parse_args()
+
+    if not args.jobs_dir and args.port is None:
+        parser.error("Either --jobs-dir or --port is required")
+
+    worker = RefinementWorker(args.processes, threads=args.threads)
+    try:
+        if args.port is not None:
+            server = worker.serve(args.port)
+            if args.jobs_dir:
+                threading.Thread(target=worker.watch, args=(args.jobs_dir,), daemon=True).start()
+            server.serve_forever()
+        else:
+            worker.watch(args.jobs_dir)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        worker.shutdown()
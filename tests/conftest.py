@@ -0,0 +1,60 @@
+import json
+import os
+import sqlite3
+from typing import Any, Dict
+
+import pytest
+
+# Settings are read on import and require an encryption key
+os.environ.setdefault('REFINEMENT_ENCRYPTION_KEY', 'test-key')
+
+from refiner.context import JobContext  # noqa: E402
+from refiner.models.output import Output  # noqa: E402
+from refiner.refine import Refiner  # noqa: E402
+
+SAMPLE_EXPORT = os.path.join(os.path.dirname(__file__), os.pardir, 'input', 'instagram_sample.json')
+
+
+@pytest.fixture
+def export() -> Dict[str, Any]:
+    """The sample Instagram export, a fresh copy per test."""
+    with open(SAMPLE_EXPORT, 'r') as f:
+        return json.load(f)
+
+
+@pytest.fixture
+def job(tmp_path) -> JobContext:
+    """Job with its own input and output directories, uploading to a local store instead of Pinata."""
+    input_dir, output_dir = tmp_path / 'input', tmp_path / 'output'
+    input_dir.mkdir()
+    output_dir.mkdir()
+    return JobContext.for_job(
+        str(input_dir), str(output_dir), STORAGE_BACKEND='local', LOCAL_STORE_DIR=str(tmp_path / 'store')
+    )
+
+
+def write_inputs(job: JobContext, **exports: Dict[str, Any]) -> None:
+    """Write exports to the job's input directory, as <name>.json."""
+    for name, data in exports.items():
+        with open(os.path.join(job.input_dir, f"{name}.json"), 'w') as f:
+            json.dump(data, f)
+
+
+def refine(job: JobContext, **exports: Dict[str, Any]) -> Output:
+    """Write exports to the job's input directory and refine them."""
+    write_inputs(job, **exports)
+    return Refiner(job).transform()
+
+
+def rows(db_path: str, table: str) -> list:
+    """Rows of a table of a refinement database, in primary key order."""
+    connection = sqlite3.connect(db_path)
+    try:
+        return connection.execute(f'SELECT * FROM "{table}" ORDER BY 1').fetchall()
+    finally:
+        connection.close()
+
+
+def read_proof(job: JobContext) -> Dict[str, Any]:
+    with open(job.proof_path, 'r') as f:
+        return json.load(f)
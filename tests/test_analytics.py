@@ -0,0 +1,47 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from refiner.utils import analytics
+from refiner.utils.analytics import ACTIVITY_BINS, DAYS_PER_WEEK, ActivityHistogram, engagement_rates
+
+
+@pytest.fixture(params=['numpy', 'python'])
+def backend(request, monkeypatch):
+    """Run a test with NumPy, then with the pure Python fallback."""
+    if request.param == 'numpy':
+        pytest.importorskip('numpy')
+    else:
+        monkeypatch.setattr(analytics, 'np', None)
+    return request.param
+
+
+def test_engagement_rates(backend):
+    assert engagement_rates([10, 0, 5], [0, 0, 5], 200) == [5.0, 0.0, 5.0]
+    assert engagement_rates([], [], 200) == []
+    assert engagement_rates([10, 20], [1, 2], 0) == [0, 0]
+
+
+def test_activity_histogram_bins_by_hour_and_weekday(backend):
+    monday_9am = datetime(2024, 1, 1, 9, 30)
+    histogram = ActivityHistogram(['posts', 'comments'])
+    histogram.add('posts', monday_9am)
+    histogram.extend('posts', [monday_9am + timedelta(days=7), monday_9am + timedelta(days=1)])
+    other = ActivityHistogram(['posts', 'comments'])
+    other.add('comments', monday_9am)
+    histogram.merge(other)
+
+    counts = histogram.counts()
+    assert len(counts['posts']) == ACTIVITY_BINS
+    assert counts['posts'][9 * DAYS_PER_WEEK] == 2
+    assert counts['posts'][9 * DAYS_PER_WEEK + 1] == 1
+    assert histogram.rows() == [
+        {'hour_of_day': 9, 'day_of_week': 0, 'posts': 2, 'comments': 1},
+        {'hour_of_day': 9, 'day_of_week': 1, 'posts': 1, 'comments': 0},
+    ]
+
+
+def test_empty_histogram_has_no_rows(backend):
+    histogram = ActivityHistogram(['posts'])
+    assert histogram.counts() == {'posts': [0] * ACTIVITY_BINS}
+    assert histogram.rows() == []
@@ -0,0 +1,20 @@
+from refiner.models.refined import MEDIA_TYPES, MESSAGE_TYPES
+from tests.conftest import refine, rows
+
+
+def test_types_are_coded_through_lookup_tables(job, export):
+    export['posts'][1]['media'][0]['media_type'] = 'reel'
+    export['stories'][0]['media_type'] = 'reel'
+    export['direct_messages'][0]['message_type'] = 'voice'
+    refine(job, export=export)
+
+    # Known types keep their fixed codes, new ones get the next code once, in the order they are seen
+    assert rows(job.database_path, 'media_types') == [*enumerate(MEDIA_TYPES, start=1), (len(MEDIA_TYPES) + 1, 'reel')]
+    assert rows(job.database_path, 'message_types') == [
+        *enumerate(MESSAGE_TYPES, start=1), (len(MESSAGE_TYPES) + 1, 'voice')
+    ]
+    assert [row[2] for row in rows(job.database_path, 'media_view')] == [
+        export['posts'][0]['media'][0]['media_type'], 'reel'
+    ]
+    assert [row[3] for row in rows(job.database_path, 'stories_view')] == ['reel']
+    assert [row[5] for row in rows(job.database_path, 'direct_messages_view')] == ['voice']
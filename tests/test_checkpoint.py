@@ -0,0 +1,77 @@
+import os
+
+import pytest
+
+from benchmarks.synthetic import generate_export
+from refiner.context import JobContext
+from refiner.refine import Refiner
+from refiner.utils.checkpoint import Checkpoint
+from tests.conftest import rows, write_inputs
+
+TABLES = ('posts', 'media', 'comments', 'stories', 'direct_messages', 'engagement_metrics')
+
+
+class Interrupted(Exception):
+    pass
+
+
+def checkpointed_job(tmp_path, name: str) -> JobContext:
+    (tmp_path / name / 'input').mkdir(parents=True)
+    (tmp_path / name / 'output').mkdir()
+    return JobContext.for_job(
+        str(tmp_path / name / 'input'), str(tmp_path / name / 'output'), STORAGE_BACKEND='local',
+        LOCAL_STORE_DIR=str(tmp_path / 'store'), CHECKPOINT_INTERVAL=10
+    )
+
+
+def test_interrupted_refinement_resumes_from_checkpoint(tmp_path, monkeypatch):
+    export = generate_export(60)
+    expected = checkpointed_job(tmp_path, 'uninterrupted')
+    write_inputs(expected, export=export)
+    Refiner(expected).transform()
+
+    job = checkpointed_job(tmp_path, 'interrupted')
+    write_inputs(job, export=export)
+    advance = Checkpoint.advance
+    commits = []
+
+    def crash_after_five_commits(session, input_name, section, committed):
+        if len(commits) == 5:
+            raise Interrupted()
+        commits.append((section, committed))
+        advance(session, input_name, section, committed)
+
+    monkeypatch.setattr(Checkpoint, 'advance', staticmethod(crash_after_five_commits))
+    with pytest.raises(Interrupted):
+        Refiner(job).transform()
+    checkpoint = Checkpoint(job.database_path)
+    assert os.path.exists(checkpoint.path)
+
+    monkeypatch.setattr(Checkpoint, 'advance', staticmethod(advance))
+    resumed = []
+    committed = Checkpoint.committed
+
+    def record_resume(session, input_name, section):
+        count = committed(session, input_name, section)
+        resumed.append((section, count))
+        return count
+
+    monkeypatch.setattr(Checkpoint, 'committed', staticmethod(record_resume))
+    Refiner(job).transform()
+
+    # The second run started after the records the first one committed, and wrote each row once
+    assert commits[-1] in resumed
+    for table in TABLES:
+        assert rows(job.database_path, table) == rows(expected.database_path, table), table
+    assert not os.path.exists(checkpoint.path)
+
+
+def test_checkpoint_of_other_inputs_is_not_resumed(tmp_path):
+    checkpoint = Checkpoint(str(tmp_path / 'db.libsql'))
+    checkpoint.start({'export.json': 'a' * 64}, 'version')
+
+    assert checkpoint.resumable({'export.json': 'a' * 64}, 'version')
+    assert not checkpoint.resumable({'export.json': 'b' * 64}, 'version')
+    assert not checkpoint.resumable({'export.json': 'a' * 64}, 'other version')
+    checkpoint.clear()
+    assert not checkpoint.resumable({'export.json': 'a' * 64}, 'version')
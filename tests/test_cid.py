@@ -0,0 +1,58 @@
+import pytest
+
+from refiner.utils.cid import CHUNK_SIZE, bytes_cid, file_cid
+
+# CIDv0 of pattern(size), as computed by `ipfs add --only-hash` of kubo v0.22.0
+# (boxo v0.11.0 balanced importer, 256 KiB chunks, dag-pb leaves)
+KUBO_CIDS = {
+    0: "QmbFMke1KXqnYyBBWxB74N4c5SBnJMVAiMNRcGu6x1AwQH",
+    11: "QmVygzXjZeGrQn1X9rw3f3TQWRvFvhgHcLa8CopS6TdV55",
+    CHUNK_SIZE: "QmeqfRyS3vkku7n6krqC3DgGMex3x2sCpSeKMDmrG13QQq",
+    CHUNK_SIZE + 1: "QmUSjGawaz4ptvREcMKSMJneWCa5j8dAz2wSAAvHtW2rnB",
+    3 * CHUNK_SIZE + 100: "QmZLby23pGa99inuFBsqhnVjckMx3UP5QkdzkskoewRFFG",
+    # One chunk more than a node can link to, so the DAG is two levels deep
+    174 * CHUNK_SIZE + 1: "QmTedsTekQQkgACJXb1sPZSW8bLdS9LPMrT7L4YdjNRd4n",
+}
+
+# CIDv1 of pattern(size), raw leaves under the same balanced layout. The kubo build above only adds
+# with CIDv0, so these DAGs were written block by block into a kubo v0.22.0 repo with
+# Datastore.HashOnRead enabled and read back through kubo: every block matched its CID
+# and the file came back byte for byte
+KUBO_CIDS_V1 = {
+    0: "bafkreihdwdcefgh4dqkjv67uzcmw7ojee6xedzdetojuzjevtenxquvyku",
+    11: "bafkreidyuyttca6rpq42bnqsnyrgz3dq4mztp5f4ni4am5abwvfdhz4ovu",
+    # A single chunk is its raw leaf, without a dag-pb root
+    CHUNK_SIZE: "bafkreibruh455iawsviqslif5c7uurdcfdemh22mtnytyzvnzn75kpejxy",
+    CHUNK_SIZE + 1: "bafybeiexg2oqkfnj56l7fcmawswqbijt5shq4b5rg6a546uwpkqqzwjioi",
+    3 * CHUNK_SIZE + 100: "bafybeidgbfvpggtre34rfal7xfzx33nqt3mdwa6kot6iab5go3kvdc3kl4",
+    174 * CHUNK_SIZE + 1: "bafybeib4y7ghw2rq7bracc4xwtxrbzo7cfvagdpte2tmrkgwl6dyard3cm",
+}
+
+
+def pattern(size: int) -> bytes:
+    """The bytes 0 to 250, repeated up to `size` bytes."""
+    return (bytes(range(251)) * (size // 251 + 1))[:size]
+
+
+@pytest.mark.parametrize("size", sorted(KUBO_CIDS))
+def test_bytes_cid_matches_kubo(size):
+    assert bytes_cid(pattern(size)) == KUBO_CIDS[size]
+
+
+@pytest.mark.parametrize("size", sorted(KUBO_CIDS))
+def test_file_cid_matches_kubo(size, tmp_path):
+    path = tmp_path / "file"
+    path.write_bytes(pattern(size))
+    assert file_cid(str(path)) == KUBO_CIDS[size]
+
+
+@pytest.mark.parametrize("size", sorted(KUBO_CIDS_V1))
+def test_bytes_cid_v1_matches_kubo(size):
+    assert bytes_cid(pattern(size), 1) == KUBO_CIDS_V1[size]
+
+
+@pytest.mark.parametrize("size", sorted(KUBO_CIDS_V1))
+def test_file_cid_v1_matches_kubo(size, tmp_path):
+    path = tmp_path / "file"
+    path.write_bytes(pattern(size))
+    assert file_cid(str(path), 1) == KUBO_CIDS_V1[size]
@@ -0,0 +1,81 @@
+import json
+import os
+
+import pytest
+
+from refiner.cluster import (
+    MANIFEST_FILE, NODES_DIR, REDISPATCH_FILE, RESULTS_FILE, _load_redispatch, merge_cluster, plan_cluster
+)
+from refiner.models.cluster import NodeResult
+
+
+@pytest.fixture
+def input_dir(tmp_path):
+    path = tmp_path / 'input'
+    path.mkdir()
+    for index in range(6):
+        (path / f"export-{index}.json").write_text(json.dumps({'user_id': f"user_{index}"}))
+    return str(path)
+
+
+def report(cluster_dir: str, node: int, results, finished: bool = True) -> None:
+    """Write a node's journal as run_node would, ending in a torn line."""
+    node_dir = os.path.join(cluster_dir, NODES_DIR, str(node))
+    os.makedirs(node_dir, exist_ok=True)
+    with open(os.path.join(node_dir, RESULTS_FILE), 'w') as f:
+        for item, status in results:
+            result = NodeResult(
+                input=item.name, sha256=item.sha256, node=node, status=status,
+                cid='bafkrei' if status == 'completed' else None, finished_at='2026-01-01T00:00:00+00:00'
+            )
+            f.write(result.model_dump_json() + "\n")
+        f.write('{"input": "export-')
+    if finished:
+        with open(os.path.join(node_dir, MANIFEST_FILE), 'w') as f:
+            json.dump({}, f)
+
+
+def test_plan_is_deterministic(input_dir, tmp_path):
+    plan = plan_cluster(input_dir, str(tmp_path / 'cluster'), 2)
+
+    assert [item.name for item in plan.inputs] == [f"export-{index}.json" for index in range(6)]
+    assert {item.node for item in plan.inputs} == {0, 1}
+    assert plan_cluster(input_dir, str(tmp_path / 'cluster'), 2) == plan
+    assert plan_cluster(input_dir, str(tmp_path / 'other'), 2) == plan
+    with pytest.raises(ValueError, match="already holds the plan"):
+        plan_cluster(input_dir, str(tmp_path / 'cluster'), 3)
+
+
+def test_merge_redispatches_failed_and_missing_inputs(input_dir, tmp_path):
+    cluster_dir = str(tmp_path / 'cluster')
+    plan = plan_cluster(input_dir, cluster_dir, 2)
+    node_0 = [item for item in plan.inputs if item.node == 0]
+    node_1 = [item for item in plan.inputs if item.node == 1]
+    report(cluster_dir, 0, [(node_0[0], 'failed'), *((item, 'completed') for item in node_0)])
+    report(cluster_dir, 1, [(node_1[0], 'failed')], finished=False)
+
+    manifest = merge_cluster(cluster_dir)
+    assert manifest.node_status == {'0': 'finished', '1': 'partial'}
+    assert not manifest.complete
+    # The later completed result of an input replaces its earlier failure
+    assert manifest.failed == [node_1[0].name]
+    assert manifest.missing == [item.name for item in node_1[1:]]
+    assert manifest.redispatch == {'1': [item.name for item in node_1]}
+    assert _load_redispatch(cluster_dir) == manifest.redispatch
+
+    report(cluster_dir, 1, [(item, 'completed') for item in node_1])
+    manifest = merge_cluster(cluster_dir)
+    assert manifest.complete
+    assert [result.input for result in manifest.results] == [item.name for item in plan.inputs]
+    assert not os.path.exists(os.path.join(cluster_dir, REDISPATCH_FILE))
+
+
+def test_inputs_of_silent_nodes_are_reassigned(input_dir, tmp_path):
+    cluster_dir = str(tmp_path / 'cluster')
+    plan = plan_cluster(input_dir, cluster_dir, 2)
+    report(cluster_dir, 0, [(item, 'completed') for item in plan.inputs if item.node == 0])
+
+    assert merge_cluster(cluster_dir).redispatch == {'1': [item.name for item in plan.inputs if item.node == 1]}
+    manifest = merge_cluster(cluster_dir, reassign=True)
+    assert manifest.node_status == {'0': 'finished', '1': 'missing'}
+    assert manifest.redispatch == {'0': [item.name for item in plan.inputs if item.node == 1]}
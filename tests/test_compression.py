@@ -0,0 +1,46 @@
+import os
+import zlib
+
+import pytest
+
+from refiner.utils.compression import CODECS, codec_of, compress, decompress, is_compressed
+from refiner.utils.encrypt import decrypt_bytes, encrypt_bytes
+
+
+def available(codec: str) -> str:
+    """The codec, skipping the test if it needs a package that is not installed."""
+    if codec == 'zstd':
+        pytest.importorskip('zstandard')
+    return codec
+
+
+@pytest.mark.parametrize("codec", ['zlib', 'zstd'])
+@pytest.mark.parametrize("size", [0, 1000, 3 * 4096 + 17])
+def test_framed_round_trip(codec, size):
+    data = os.urandom(size // 2) + bytes(size - size // 2)
+    # Small chunks, so the data spans several of them
+    compressed = compress(data, available(codec), chunk_size=4096, threads=2)
+
+    assert is_compressed(compressed)
+    assert codec_of(compressed) == codec
+    assert decompress(compressed) == data
+
+
+def test_truncated_container_is_refused():
+    compressed = compress(bytes(10000), 'zlib', chunk_size=4096)
+    with pytest.raises(zlib.error):
+        decompress(compressed[:-10])
+
+
+def test_unknown_codec_is_refused():
+    with pytest.raises(ValueError, match="Unsupported compression codec"):
+        compress(b'data', 'lz4')
+
+
+@pytest.mark.parametrize("codec", CODECS)
+def test_encrypted_round_trip(codec, tmp_path):
+    data = b'SQLite format 3\0' + bytes(50000)
+    path = encrypt_bytes('key', data, str(tmp_path / 'db.pgp'), codec=available(codec))
+
+    with open(path, 'rb') as f:
+        assert decrypt_bytes('key', f.read()) == data
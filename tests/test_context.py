@@ -0,0 +1,58 @@
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pgpy
+
+import refiner.refine
+from refiner.context import JobContext
+from refiner.refine import Refiner
+from refiner.utils.compression import codec_of
+from tests.conftest import write_inputs
+
+
+def tables(db_path: str) -> set:
+    connection = sqlite3.connect(db_path)
+    try:
+        return {name for (name,) in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    finally:
+        connection.close()
+
+
+def test_concurrent_jobs_see_only_their_own_settings(tmp_path, export, monkeypatch):
+    jobs = {}
+    for name, overrides in {
+        'a': dict(REFINED_TABLES='posts', REFINEMENT_COMPRESSION='zlib', REFINEMENT_ENCRYPTION_KEY='key-a'),
+        'b': dict(REFINEMENT_COMPRESSION='none', REFINEMENT_ENCRYPTION_KEY='key-b'),
+    }.items():
+        (tmp_path / name / 'input').mkdir(parents=True)
+        (tmp_path / name / 'output').mkdir()
+        jobs[name] = JobContext.for_job(
+            str(tmp_path / name / 'input'), str(tmp_path / name / 'output'), STORAGE_BACKEND='local',
+            LOCAL_STORE_DIR=str(tmp_path / name / 'store'), **overrides
+        )
+        write_inputs(jobs[name], export=export)
+
+    # Hold both jobs between their transformation and their uploads, so the helpers
+    # encrypting and storing each refinement run while the other job is active
+    both_transformed = threading.Barrier(len(jobs), timeout=30)
+    upload_json_to_ipfs = refiner.refine.upload_json_to_ipfs
+
+    def upload_once_both_transformed(data):
+        if 'schema' in data:
+            both_transformed.wait()
+        return upload_json_to_ipfs(data)
+
+    monkeypatch.setattr(refiner.refine, 'upload_json_to_ipfs', upload_once_both_transformed)
+    with ThreadPoolExecutor(len(jobs)) as executor:
+        outputs = dict(zip(jobs, executor.map(lambda job: Refiner(job).transform(), jobs.values())))
+
+    assert 'comments' not in tables(jobs['a'].database_path)
+    assert 'comments' in tables(jobs['b'].database_path)
+    for name, codec in (('a', 'zlib'), ('b', None)):
+        cid = outputs[name].refinement_url.rsplit('/', 1)[-1]
+        stored = tmp_path / name / 'store' / cid
+        assert stored.exists()
+        message = pgpy.PGPMessage.from_blob(stored.read_bytes())
+        plaintext = bytes(message.decrypt(f'key-{name}').message)
+        assert codec_of(plaintext) == codec
@@ -0,0 +1,80 @@
+import sqlite3
+
+from benchmarks.synthetic import generate_export
+from refiner.context import JobContext
+from refiner.query import RefinementReader
+from refiner.utils.delta import apply_delta, build_delta, read_delta_manifest
+from tests.conftest import refine, rows
+
+TABLES = ('user_profiles', 'posts', 'media', 'comments', 'stories', 'direct_messages', 'engagement_metrics')
+
+
+def database(path: str, items) -> str:
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE items (item_id TEXT PRIMARY KEY, value INTEGER)")
+    connection.executemany("INSERT INTO items VALUES (?, ?)", items)
+    connection.commit()
+    connection.close()
+    return path
+
+
+def test_applied_delta_reproduces_the_target(tmp_path):
+    base_items = [(f"item_{index:04}", index) for index in range(2000)]
+    target_items = [(key, value * 2 if value % 500 == 0 else value) for key, value in base_items[10:]]
+    target_items.append(('item_new', -1))
+    base_path = database(str(tmp_path / 'base.libsql'), base_items)
+    target_path = database(str(tmp_path / 'target.libsql'), target_items)
+    with open(base_path, 'rb') as f:
+        base = f.read()
+
+    delta, manifest = build_delta(target_path, base)
+    # Three changed values and the new item, and the ten removed items
+    assert (manifest.upserted, manifest.deleted, manifest.row_counts) == (
+        {'items': 3 + 1}, {'items': 10}, {'items': len(target_items)}
+    )
+    assert len(delta) < len(base)
+
+    connection = sqlite3.connect(base_path)
+    apply_delta(connection, delta)
+    connection.close()
+    assert rows(base_path, 'items') == rows(target_path, 'items')
+
+
+def test_delta_cannot_express_changed_tables(tmp_path):
+    base_path = database(str(tmp_path / 'base.libsql'), [('a', 1)])
+    connection = sqlite3.connect(str(tmp_path / 'target.libsql'))
+    connection.execute("CREATE TABLE items (item_id TEXT PRIMARY KEY, value INTEGER, note TEXT)")
+    connection.close()
+    with open(base_path, 'rb') as f:
+        assert build_delta(str(tmp_path / 'target.libsql'), f.read()) is None
+
+
+def delta_job(tmp_path, name: str, **overrides) -> JobContext:
+    (tmp_path / name / 'input').mkdir(parents=True)
+    (tmp_path / name / 'output').mkdir()
+    return JobContext.for_job(
+        str(tmp_path / name / 'input'), str(tmp_path / name / 'output'), STORAGE_BACKEND='local',
+        LOCAL_STORE_DIR=str(tmp_path / 'store'), **overrides
+    )
+
+
+def test_delta_refinement_reads_as_the_full_refinement(tmp_path):
+    export = generate_export(200)
+    base_url = refine(delta_job(tmp_path, 'base'), export=export).refinement_url
+    export['posts'][0]['like_count'] += 1
+    del export['comments'][0]
+    job = delta_job(tmp_path, 'delta', DELTA_BASE=base_url)
+    delta_url = refine(job, export=export).refinement_url
+
+    with open(job.manifest_path, 'rb') as f:
+        manifest = read_delta_manifest(f.read())
+    assert manifest.base_cid == base_url.rsplit('/', 1)[-1]
+    assert (manifest.upserted['posts'], manifest.deleted['comments']) == (1, 1)
+
+    # The reader fetches the base and the delta from the job's store, and applies the delta
+    reader = RefinementReader(cache_size=0)
+    with job.activate():
+        for table in TABLES:
+            result = reader.open(delta_url).execute(f'SELECT * FROM "{table}" ORDER BY 1').fetchall()
+            assert result == rows(job.database_path, table), table
+    reader.close()
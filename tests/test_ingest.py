@@ -0,0 +1,105 @@
+import http.client
+import io
+import json
+import threading
+import zipfile
+
+import pytest
+
+from refiner.config import settings
+from refiner.context import JobContext
+from refiner.ingest import serve
+from refiner.refine import Refiner
+from tests.conftest import refine, rows
+
+TABLES = ('user_profiles', 'posts', 'media', 'comments', 'stories', 'direct_messages', 'engagement_metrics')
+
+
+class Unseekable(io.RawIOBase):
+    """A stream read or written front to back only, like a socket."""
+
+    def __init__(self, data: bytes = b""):
+        self.data = data
+        self.written = bytearray()
+
+    def readable(self) -> bool:
+        return True
+
+    def writable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        # Hand out odd-sized pieces, so records straddle reads
+        size = min(len(buffer), 997, len(self.data))
+        buffer[:size], self.data = self.data[:size], self.data[size:]
+        return size
+
+    def write(self, data) -> int:
+        self.written += data
+        return len(data)
+
+
+def zip_archive(members) -> bytes:
+    """A zip archive written without seeking, so sizes follow the members in data descriptors."""
+    target = Unseekable()
+    with zipfile.ZipFile(target, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, content in members.items():
+            with archive.open(name, 'w') as member:
+                member.write(content)
+    return bytes(target.written)
+
+
+def test_streamed_archive_matches_refined_files(tmp_path, job, export):
+    refine(job, export=export)
+    (tmp_path / 'streamed').mkdir()
+    streamed = JobContext.for_job(
+        output_dir=str(tmp_path / 'streamed'), STORAGE_BACKEND='local', LOCAL_STORE_DIR=str(tmp_path / 'store')
+    )
+    upload = zip_archive({'README.txt': b"Not an export\n", 'export.json': json.dumps(export).encode()})
+
+    output = Refiner(streamed, resumable=False).transform_stream(
+        io.BufferedReader(Unseekable(upload)), 'instagram.zip'
+    )
+    assert output.refinement_url
+    for table in TABLES:
+        assert rows(streamed.database_path, table) == rows(job.database_path, table), table
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    # Upload jobs take the process-wide settings
+    monkeypatch.setattr(settings.current(), 'STORAGE_BACKEND', 'local')
+    monkeypatch.setattr(settings.current(), 'LOCAL_STORE_DIR', str(tmp_path / 'store'))
+    server = serve(0, str(tmp_path / 'ingested'))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def post_upload(server, body, **headers):
+    connection = http.client.HTTPConnection('127.0.0.1', server.server_port, timeout=30)
+    try:
+        connection.request('POST', '/ingest?name=export.json', body=body, headers=headers,
+                           encode_chunked='Content-Length' not in headers)
+        response = connection.getresponse()
+        return response.status, json.loads(response.read())
+    finally:
+        connection.close()
+
+
+def test_chunked_upload_is_refined(server, export):
+    data = json.dumps(export).encode()
+    status, result = post_upload(server, (data[start:start + 1000] for start in range(0, len(data), 1000)))
+
+    assert status == 200, result
+    assert result['status'] == 'completed'
+    db_path = JobContext.for_job(output_dir=result['output_dir']).database_path
+    assert [post[0] for post in rows(db_path, 'posts')] == ['post_001', 'post_002']
+
+
+def test_malformed_upload_is_rejected(server):
+    status, result = post_upload(server, b'{"posts": [', **{'Content-Length': '11'})
+    assert status == 400
+    assert result['status'] == 'rejected'
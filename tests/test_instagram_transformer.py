@@ -0,0 +1,41 @@
+import copy
+
+import pytest
+
+from tests.conftest import read_proof, refine, rows
+
+
+def with_duplicates(export):
+    """The export with its first post and first comment repeated, as a re-export merged into it would have them."""
+    export = copy.deepcopy(export)
+    export['posts'].append(copy.deepcopy(export['posts'][0]))
+    export['comments'].append(copy.deepcopy(export['comments'][0]))
+    return export
+
+
+def test_duplicate_records_are_written_once_and_proven_as_read(job, export):
+    refine(job, export=with_duplicates(export))
+
+    assert [row[0] for row in rows(job.database_path, 'posts')] == ['post_001', 'post_002']
+    assert [row[0] for row in rows(job.database_path, 'comments')] == ['comment_001']
+    proof = read_proof(job)
+    assert proof['total_posts'] == 3
+    assert proof['total_comments'] == 2
+    assert proof['duplicates_dropped'] == {'posts': 1, 'comments': 1}
+    assert proof['integrity']['comments_checked'] == 2
+
+
+def test_inputs_repeating_an_export_are_written_once(job, export):
+    refine(job, first=export, second=export)
+
+    assert len(rows(job.database_path, 'posts')) == len(export['posts'])
+    assert len(rows(job.database_path, 'engagement_metrics')) == len(export['engagement_metrics'])
+    proofs = read_proof(job)['proofs']
+    assert list(proofs) == ['first.json', 'second.json']
+    assert proofs['first.json']['total_posts'] == len(export['posts'])
+    assert proofs['second.json']['duplicates_dropped']['posts'] == len(export['posts'])
+
+
+def test_inputs_no_transformer_recognises_are_refused(job):
+    with pytest.raises(ValueError, match="No transformer recognises"):
+        refine(job, notes={'notes': []})
@@ -0,0 +1,65 @@
+from types import SimpleNamespace
+
+import pytest
+
+from refiner.context import JobContext
+from refiner.utils import integrity
+from refiner.utils.integrity import IntegrityChecker, KeyIndex
+from tests.conftest import read_proof, refine, rows
+
+
+@pytest.fixture(params=['numpy', 'python'])
+def backend(request, monkeypatch):
+    """Run a test with NumPy, then with the set fallback."""
+    if request.param == 'numpy':
+        pytest.importorskip('numpy')
+    else:
+        monkeypatch.setattr(integrity, 'np', None)
+    return request.param
+
+
+def test_key_index_finds_keys_added_in_batches(backend):
+    index = KeyIndex()
+    assert index.contains(['post_1']) == [False]
+
+    index.update(f"post_{n}" for n in range(0, 1000, 2))
+    assert index.contains(['post_0', 'post_1', 'post_998', 'post_999']) == [True, False, True, False]
+    # Keys added after the first lookup are found too
+    index.update(['post_1'])
+    assert index.contains(['post_1', 'post_3']) == [True, False]
+    assert len(index) == 501
+
+
+def test_orphans_are_counted_and_dropped(backend):
+    checker = IntegrityChecker('me', drop_orphans=True)
+    checker.index('posts', [SimpleNamespace(post_id='p1')])
+    comments = [SimpleNamespace(post_id='p1'), SimpleNamespace(post_id='p2')]
+    messages = [
+        SimpleNamespace(conversation_id='c1', sender_username='me', recipient_username='ann'),
+        SimpleNamespace(conversation_id='c1', sender_username='bob', recipient_username='me'),
+        SimpleNamespace(conversation_id='c2', sender_username='ann', recipient_username='bob'),
+    ]
+
+    assert checker.check('comments', comments) == comments[:1]
+    assert checker.check('direct_messages', messages) == messages[:2]
+    assert checker.result() == {
+        'comments_checked': 2, 'orphan_comments': 1,
+        'direct_messages_checked': 3, 'orphan_direct_messages': 1, 'conversation_conflicts': 1,
+    }
+
+
+def test_refinement_drops_orphaned_comments(tmp_path, export):
+    (tmp_path / 'input').mkdir()
+    (tmp_path / 'output').mkdir()
+    job = JobContext.for_job(
+        str(tmp_path / 'input'), str(tmp_path / 'output'), STORAGE_BACKEND='local',
+        LOCAL_STORE_DIR=str(tmp_path / 'store'), DROP_ORPHANS=True
+    )
+    export['comments'].append({**export['comments'][0], 'comment_id': 'comment_002', 'post_id': 'post_404'})
+    refine(job, export=export)
+
+    assert [comment[0] for comment in rows(job.database_path, 'comments')] == ['comment_001']
+    proof = read_proof(job)
+    assert proof['orphans_dropped']
+    assert proof['integrity']['comments_checked'] == 2
+    assert proof['integrity']['orphan_comments'] == 1
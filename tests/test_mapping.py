@@ -0,0 +1,65 @@
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy.dialects import sqlite
+
+from refiner.models.refined import CommentRefined, MediaRefined, MediaTypeRefined
+from refiner.transformer.mapping import Field, TableMapping, compile_mapping
+from refiner.utils.categories import CategoryCodec
+from refiner.utils.pii import hash_text
+
+COMMENTS = TableMapping('comments', (
+    Field('comment_id', 'record.comment_id'),
+    Field('user_id', 'context.user_id'),
+    Field('post_id', 'record.post_id'),
+    Field('comment_length', 'record.text', 'length'),
+    Field('comment_date', 'comment_date'),
+    Field('like_count', 'record.like_count', lambda count: count or 0),
+    Field('author_username_hash', 'record.author_username', 'hash'),
+))
+
+
+def test_compiled_mapping_builds_driver_ready_rows():
+    builder = compile_mapping(COMMENTS, CommentRefined.__table__, sqlite.dialect())
+    records = [
+        SimpleNamespace(comment_id='c1', post_id='p1', text='Nice!', like_count=3, author_username='ann'),
+        SimpleNamespace(comment_id='c2', post_id='p1', text=None, like_count=None, author_username='bob'),
+    ]
+    dates = [datetime(2024, 1, 15, 19, 0), datetime(2024, 1, 16, 8, 30)]
+
+    assert builder.inputs == ('comment_date',)
+    assert builder.insert_sql.startswith("INSERT INTO comments (comment_id, user_id, post_id,")
+    # Datetimes come out as SQLite stores them, the context is read once per batch
+    assert builder.build(records, SimpleNamespace(user_id='u1'), comment_date=dates) == [
+        ('c1', 'u1', 'p1', 5, '2024-01-15 19:00:00.000000', 3, hash_text('ann')),
+        ('c2', 'u1', 'p1', 0, '2024-01-16 08:30:00.000000', 0, hash_text('bob')),
+    ]
+
+
+def test_category_fields_are_coded_through_the_lookup_codec():
+    codec = CategoryCodec(MediaTypeRefined)
+    codec.codes.update({'photo': 1, 'video': 2})
+    mapping = TableMapping('media', (
+        Field('post_id', 'post_id'),
+        Field('media_type_id', 'record.media_type', 'category', lookup='media_types'),
+    ))
+    builder = compile_mapping(mapping, MediaRefined.__table__, sqlite.dialect(), {'media_types': codec})
+    records = [SimpleNamespace(media_type=media_type) for media_type in ('video', 'reel', 'photo', 'reel')]
+
+    assert builder.build(records, None, post_id=['p1', 'p1', 'p2', 'p3']) == [
+        ('p1', 2), ('p1', 3), ('p2', 1), ('p3', 3)
+    ]
+    assert codec.pending == [(3, 'reel')]
+
+
+@pytest.mark.parametrize("field, error", [
+    (Field('comment_text', 'record.text'), "has no column"),
+    (Field('post_id', 'record.post_id; import os'), "Invalid source"),
+    (Field('post_id', 'post.post_id'), "must start with record or context"),
+    (Field('post_id', 'record.post_id', 'upper'), "Unknown transform"),
+    (Field('post_id', 'record.post_id', 'category', lookup='post_types'), "not a produced lookup table"),
+])
+def test_invalid_mappings_are_refused(field, error):
+    with pytest.raises(ValueError, match=error):
+        compile_mapping(TableMapping('comments', (field,)), CommentRefined.__table__, sqlite.dialect())
@@ -0,0 +1,34 @@
+import os
+from urllib.parse import urlparse
+from urllib.request import url2pathname
+
+import pytest
+
+from refiner.context import JobContext
+from refiner.utils.encrypt import decrypt_bytes
+from tests.conftest import refine, rows
+
+TABLES = ('user_profiles', 'posts', 'media', 'comments', 'stories', 'direct_messages', 'engagement_metrics')
+
+
+@pytest.mark.parametrize("build_processes", [1, 2])
+def test_in_memory_refinement_never_writes_the_plaintext(tmp_path, job, export, build_processes):
+    refine(job, export=export)
+    (tmp_path / 'memory' / 'input').mkdir(parents=True)
+    (tmp_path / 'memory' / 'output').mkdir()
+    memory = JobContext.for_job(
+        str(tmp_path / 'memory' / 'input'), str(tmp_path / 'memory' / 'output'), STORAGE_BACKEND='local',
+        LOCAL_STORE_DIR=str(tmp_path / 'store'), REFINEMENT_IN_MEMORY=True, BUILD_PROCESSES=build_processes
+    )
+    output = refine(memory, export=export)
+
+    assert not os.path.exists(memory.database_path)
+    # Nothing but the published artifacts is left behind, parallel parts included
+    assert all(not name.endswith('.libsql') for name in os.listdir(memory.output_dir))
+    with open(url2pathname(urlparse(output.refinement_url).path), 'rb') as f:
+        plaintext = decrypt_bytes(memory.settings.REFINEMENT_ENCRYPTION_KEY, f.read())
+    decrypted_path = str(tmp_path / 'decrypted.libsql')
+    with open(decrypted_path, 'wb') as f:
+        f.write(plaintext)
+    for table in TABLES:
+        assert rows(decrypted_path, table) == rows(job.database_path, table), table
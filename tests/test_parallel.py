@@ -0,0 +1,37 @@
+from benchmarks.synthetic import generate_export
+from refiner.context import JobContext
+from tests.conftest import refine, rows
+
+TABLES = (
+    'user_profiles', 'posts', 'media', 'comments', 'stories', 'direct_messages', 'engagement_metrics',
+    'media_types', 'message_types'
+)
+
+
+def build(tmp_path, name: str, export, **overrides) -> JobContext:
+    (tmp_path / name / 'input').mkdir(parents=True)
+    (tmp_path / name / 'output').mkdir()
+    job = JobContext.for_job(
+        str(tmp_path / name / 'input'), str(tmp_path / name / 'output'), STORAGE_BACKEND='local',
+        LOCAL_STORE_DIR=str(tmp_path / 'store'), **overrides
+    )
+    refine(job, export=export)
+    return job
+
+
+def test_parallel_build_matches_serial_build(tmp_path):
+    export = generate_export(40)
+    # Types no part knows in advance: every part codes its own first new type 4, the merge renumbers
+    # them in the order a serial build meets them, posts (and their media) before stories
+    export['posts'][3]['media'][0]['media_type'] = 'clip'
+    export['stories'][0]['media_type'] = 'reel'
+    export['stories'][1]['media_type'] = 'clip'
+    export['direct_messages'][0]['message_type'] = 'voice'
+
+    serial = build(tmp_path, 'serial', export, BUILD_PROCESSES=1)
+    parallel = build(tmp_path, 'parallel', export, BUILD_PROCESSES=2)
+
+    assert rows(parallel.database_path, 'media_types')[-2:] == [(4, 'clip'), (5, 'reel')]
+    for table in TABLES:
+        assert rows(parallel.database_path, table) == rows(serial.database_path, table), table
+    assert {row[3] for row in rows(parallel.database_path, 'stories_view')} >= {'reel', 'clip'}
@@ -0,0 +1,39 @@
+import io
+import json
+from urllib.parse import urlparse
+from urllib.request import url2pathname
+
+import pytest
+
+from refiner.context import JobContext
+from refiner.utils.encrypt import decrypt_bytes
+from tests.conftest import refine, rows
+
+pq = pytest.importorskip('pyarrow.parquet')
+
+
+def read_parquet(job: JobContext, url: str):
+    """Decrypt and read a Parquet file uploaded to the local store."""
+    with open(url2pathname(urlparse(url).path), 'rb') as f:
+        return pq.read_table(io.BytesIO(decrypt_bytes(job.settings.REFINEMENT_ENCRYPTION_KEY, f.read())))
+
+
+def test_tables_are_exported_as_encrypted_parquet(tmp_path, export):
+    (tmp_path / 'input').mkdir()
+    (tmp_path / 'output').mkdir()
+    job = JobContext.for_job(
+        str(tmp_path / 'input'), str(tmp_path / 'output'), STORAGE_BACKEND='local',
+        LOCAL_STORE_DIR=str(tmp_path / 'store'), OUTPUT_PARQUET=True
+    )
+    output = refine(job, export=export)
+
+    with open(job.schema_path, 'r') as f:
+        parquet_schema = json.load(f)['parquet_schema']
+    assert set(output.parquet_urls) == set(parquet_schema)
+    for table, url in output.parquet_urls.items():
+        parquet = read_parquet(job, url)
+        assert parquet.column_names == [column.split(': ')[0] for column in parquet_schema[table]], table
+        assert parquet.num_rows == len(rows(job.database_path, table)), table
+
+    posts = read_parquet(job, output.parquet_urls['posts'])
+    assert sorted(posts.column('post_id').to_pylist()) == [post[0] for post in rows(job.database_path, 'posts')]
@@ -0,0 +1,66 @@
+import pytest
+
+from refiner import planner
+from refiner.context import JobContext
+from refiner.planner import DEFAULT_STREAMING_BATCH_SIZE, MEMORY_MODE, STREAMING_MODE, plan_execution
+from tests.conftest import refine, rows
+
+TABLES = ('user_profiles', 'posts', 'media', 'comments', 'stories', 'direct_messages', 'engagement_metrics')
+
+
+@pytest.fixture
+def input_file(tmp_path):
+    path = tmp_path / 'export.json'
+    path.write_bytes(b' ' * 1000)
+    return str(path)
+
+
+def plan(input_file: str, **overrides):
+    with JobContext.for_job(**overrides).activate():
+        return plan_execution([input_file])
+
+
+def test_input_fitting_the_budget_is_loaded_whole(input_file, monkeypatch):
+    monkeypatch.setattr(planner, 'memory_limit', lambda: 2 * 1000 * planner.MEMORY_EXPANSION)
+    execution = plan(input_file, MEMORY_BUDGET=None, CHECKPOINT_INTERVAL=0)
+
+    assert execution.mode == MEMORY_MODE
+    assert execution.estimated_peak_bytes == 1000 * planner.MEMORY_EXPANSION
+    assert execution.memory_budget_bytes == 1000 * planner.MEMORY_EXPANSION
+    assert execution.batch_size == 0
+
+
+def test_input_exceeding_the_budget_is_streamed(input_file, monkeypatch):
+    monkeypatch.setattr(planner, 'memory_limit', lambda: 1000)
+    execution = plan(input_file, MEMORY_BUDGET=None, CHECKPOINT_INTERVAL=0)
+    assert execution.mode == STREAMING_MODE
+    assert execution.batch_size == DEFAULT_STREAMING_BATCH_SIZE
+
+    # Batches follow the checkpoint interval when there is one
+    assert plan(input_file, MEMORY_BUDGET=None, CHECKPOINT_INTERVAL=50).batch_size == 50
+    # Without ijson, inputs can only be loaded whole
+    monkeypatch.setattr(planner, 'ijson', None)
+    assert plan(input_file, MEMORY_BUDGET=None).mode == MEMORY_MODE
+
+
+def test_execution_mode_overrides_the_plan(input_file, monkeypatch):
+    monkeypatch.setattr(planner, 'memory_limit', lambda: None)
+    assert plan(input_file, MEMORY_BUDGET=None).mode == MEMORY_MODE
+    assert plan(input_file, EXECUTION_MODE=STREAMING_MODE).mode == STREAMING_MODE
+    with pytest.raises(ValueError, match="Unsupported execution mode"):
+        plan(input_file, EXECUTION_MODE='lazy')
+
+
+def test_streamed_refinement_matches_in_memory(tmp_path, export):
+    jobs = {}
+    for mode in (MEMORY_MODE, STREAMING_MODE):
+        (tmp_path / mode / 'input').mkdir(parents=True)
+        (tmp_path / mode / 'output').mkdir()
+        jobs[mode] = JobContext.for_job(
+            str(tmp_path / mode / 'input'), str(tmp_path / mode / 'output'), STORAGE_BACKEND='local',
+            LOCAL_STORE_DIR=str(tmp_path / 'store'), EXECUTION_MODE=mode, CHECKPOINT_INTERVAL=1
+        )
+        assert refine(jobs[mode], export=export).plan.mode == mode
+
+    for table in TABLES:
+        assert rows(jobs[STREAMING_MODE].database_path, table) == rows(jobs[MEMORY_MODE].database_path, table), table
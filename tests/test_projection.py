@@ -0,0 +1,49 @@
+import sqlite3
+
+import pytest
+
+from refiner.context import JobContext
+from tests.conftest import read_proof, refine, rows
+
+
+def projected_job(tmp_path, **overrides) -> JobContext:
+    (tmp_path / 'input').mkdir()
+    (tmp_path / 'output').mkdir()
+    return JobContext.for_job(
+        str(tmp_path / 'input'), str(tmp_path / 'output'), STORAGE_BACKEND='local',
+        LOCAL_STORE_DIR=str(tmp_path / 'store'), **overrides
+    )
+
+
+def tables(db_path: str) -> set:
+    connection = sqlite3.connect(db_path)
+    try:
+        return {name for (name,) in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    finally:
+        connection.close()
+
+
+@pytest.mark.parametrize("execution_mode", ['memory', 'streaming'])
+def test_only_selected_tables_are_produced(tmp_path, export, execution_mode):
+    job = projected_job(tmp_path, REFINED_TABLES='posts,engagement_metrics', EXECUTION_MODE=execution_mode)
+    refine(job, export=export)
+
+    # The profile is referenced by both selected tables and comes along with them
+    assert tables(job.database_path) == {'user_profiles', 'posts', 'engagement_metrics'}
+    assert [post[0] for post in rows(job.database_path, 'posts')] == ['post_001', 'post_002']
+    assert read_proof(job)['refined_tables'] == ['engagement_metrics', 'posts', 'user_profiles']
+
+
+@pytest.mark.parametrize("execution_mode", ['memory', 'streaming'])
+def test_records_outside_the_time_range_are_dropped(tmp_path, export, execution_mode):
+    job = projected_job(
+        tmp_path, RECORDS_SINCE='2024-01-15', RECORDS_UNTIL='2024-01-16', EXECUTION_MODE=execution_mode
+    )
+    refine(job, export=export)
+
+    assert [post[0] for post in rows(job.database_path, 'posts')] == ['post_001']
+    assert rows(job.database_path, 'stories') == []
+    assert len(rows(job.database_path, 'comments')) == 1
+    assert len(rows(job.database_path, 'engagement_metrics')) == 1
+    proof = read_proof(job)
+    assert (proof['records_since'], proof['records_until']) == ('2024-01-15T00:00:00+00:00', '2024-01-16T00:00:00+00:00')
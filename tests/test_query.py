@@ -0,0 +1,44 @@
+import os
+import stat
+
+import pytest
+
+from refiner import query
+from refiner.query import RefinementReader
+from tests.conftest import refine, rows
+
+
+@pytest.fixture
+def refinement_url(job, export) -> str:
+    return refine(job, export=export).refinement_url
+
+
+def test_query_decrypts_into_a_private_cache(job, refinement_url, tmp_path, monkeypatch):
+    cache_dir = tmp_path / 'cache'
+    reader = RefinementReader(cache_dir=str(cache_dir), cache_size=64)
+    result = reader.query(refinement_url, 'SELECT post_id FROM posts ORDER BY post_id')
+    reader.close()
+
+    assert [row['post_id'] for row in result] == [post[0] for post in rows(job.database_path, 'posts')]
+    (cached,) = os.listdir(cache_dir)
+    assert cached == f"{refinement_url.rsplit('/', 1)[-1]}.libsql"
+    assert stat.S_IMODE(os.stat(cache_dir).st_mode) == 0o700
+    assert stat.S_IMODE(os.stat(cache_dir / cached).st_mode) == 0o600
+
+    # Another reader finds the decrypted database in the cache, without fetching the refinement again
+    def fetch(source):
+        raise AssertionError(f"{source} fetched again")
+
+    monkeypatch.setattr(query, '_fetch', fetch)
+    reader = RefinementReader(cache_dir=str(cache_dir), cache_size=64)
+    assert reader.query(refinement_url, 'SELECT count(*) AS posts FROM posts') == [{'posts': len(result)}]
+    reader.close()
+
+
+def test_disabled_cache_writes_nothing(refinement_url, tmp_path):
+    cache_dir = tmp_path / 'cache'
+    reader = RefinementReader(cache_dir=str(cache_dir), cache_size=0)
+
+    assert reader.query(refinement_url, 'SELECT count(*) AS n FROM user_profiles') == [{'n': 1}]
+    assert not cache_dir.exists()
+    reader.close()
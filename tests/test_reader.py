@@ -0,0 +1,24 @@
+import hashlib
+import json
+
+from refiner.utils.checkpoint import file_sha256
+from refiner.utils.reader import iter_json_items, read_json_fields
+
+
+def test_items_and_fields_are_read_from_the_file(tmp_path, export):
+    path = tmp_path / 'export.json'
+    path.write_text(json.dumps(export))
+
+    assert list(iter_json_items(str(path), 'posts.item')) == export['posts']
+    assert read_json_fields(str(path), ['user_id', 'profile']) == {
+        'user_id': export['user_id'], 'profile': export['profile']
+    }
+
+
+def test_empty_file_has_no_items_or_fields(tmp_path):
+    path = tmp_path / 'empty.json'
+    path.write_bytes(b'')
+
+    assert list(iter_json_items(str(path), 'posts.item')) == []
+    assert read_json_fields(str(path), ['user_id']) == {}
+    assert file_sha256(str(path)) == hashlib.sha256(b'').hexdigest()
@@ -0,0 +1,46 @@
+import json
+import os
+
+import pytest
+
+from refiner.context import JobContext
+from refiner.utils.shards import PROFILE_SHARD, TIME_PARTITIONED_TABLES, _period
+from tests.conftest import refine, rows
+
+
+@pytest.mark.parametrize("date, granularity, period", [
+    ('2024-01-15', 'year', ('2024', '2024-01-01', '2025-01-01')),
+    ('2024-05-31', 'quarter', ('2024-Q2', '2024-04-01', '2024-07-01')),
+    ('2023-11-02', 'quarter', ('2023-Q4', '2023-10-01', '2024-01-01')),
+])
+def test_period(date, granularity, period):
+    assert _period(date, granularity) == period
+
+
+def test_refinement_is_split_by_quarter(tmp_path, export):
+    (tmp_path / 'input').mkdir()
+    job = JobContext.for_job(
+        str(tmp_path / 'input'), str(tmp_path / 'output'), STORAGE_BACKEND='local',
+        LOCAL_STORE_DIR=str(tmp_path / 'store'), OUTPUT_SHARDING='quarter'
+    )
+    os.makedirs(job.output_dir)
+    export['posts'][1]['timestamp'] = '2023-11-02T08:15:00Z'
+    refine(job, export=export)
+
+    with open(job.manifest_path, 'r') as f:
+        manifest = json.load(f)
+    shards = {shard['name']: shard for shard in manifest['shards']}
+    assert list(shards) == [PROFILE_SHARD, '2023-Q4', '2024-Q1']
+    assert all(shard['cid'] and shard['url'] for shard in shards.values())
+
+    shard_rows = {name: {
+        table: rows(os.path.join(job.output_dir, shard['path']), table)
+        for table in ('user_profiles', *TIME_PARTITIONED_TABLES, 'media')
+    } for name, shard in shards.items()}
+    assert shard_rows[PROFILE_SHARD]['user_profiles'] == rows(job.database_path, 'user_profiles')
+    assert shard_rows[PROFILE_SHARD]['posts'] == []
+    assert [post[0] for post in shard_rows['2023-Q4']['posts']] == ['post_002']
+    assert [post[0] for post in shard_rows['2024-Q1']['posts']] == ['post_001']
+    # Every row of a time-partitioned table, and every media row, lands in exactly one shard
+    for table in (*TIME_PARTITIONED_TABLES, 'media'):
+        assert sorted(row for name in shards for row in shard_rows[name][table]) == rows(job.database_path, table)
@@ -0,0 +1,56 @@
+import random
+
+import pytest
+
+from refiner.utils.sketches import HyperLogLog, KLLSketch, load_sketch
+
+
+def test_hyperloglog_estimates_distinct_values():
+    sketch = HyperLogLog()
+    sketch.update(f"user_{index % 20000}" for index in range(50000))
+    sketch.add(None)
+    assert abs(sketch.estimate() - 20000) < 20000 * 0.05
+
+    small = HyperLogLog()
+    small.update(['a', 'b', 'a', 'c'])
+    assert small.estimate() == 3
+
+
+def test_hyperloglog_sketches_merge_into_the_combined_stream():
+    first, second, combined = HyperLogLog(), HyperLogLog(), HyperLogLog()
+    first.update(range(0, 6000))
+    second.update(range(4000, 10000))
+    combined.update(range(0, 10000))
+    first.merge(second)
+
+    assert first.registers == combined.registers
+    assert load_sketch(first.to_dict()).registers == combined.registers
+    with pytest.raises(ValueError, match="precision"):
+        first.merge(HyperLogLog(precision=10))
+
+
+def test_kll_quantiles_are_within_rank_error():
+    values = list(range(100000))
+    random.Random(1).shuffle(values)
+    sketch = KLLSketch()
+    sketch.update(values)
+
+    assert (sketch.count, sketch.min, sketch.max) == (100000, 0, 99999)
+    for q in (0.1, 0.5, 0.9, 0.99):
+        assert abs(sketch.quantile(q) - q * 100000) < 100000 * 0.02, q
+    assert KLLSketch().quantile(0.5) is None
+
+
+def test_kll_sketches_are_deterministic_and_mergeable():
+    first, second = KLLSketch(), KLLSketch()
+    first.update(range(0, 50000))
+    second.update(range(50000, 100000))
+    again = KLLSketch()
+    again.update(range(0, 50000))
+    assert again.to_dict() == first.to_dict()
+
+    first.merge(load_sketch(second.to_dict()))
+    assert (first.count, first.min, first.max) == (100000, 0, 99999)
+    assert abs(first.quantile(0.5) - 50000) < 100000 * 0.02
+    with pytest.raises(ValueError, match="Unknown sketch type"):
+        load_sketch({'type': 'cms'})
@@ -0,0 +1,38 @@
+import os
+
+import requests
+
+from refiner.query import RefinementReader
+from refiner.utils.storage import LocalStorage, PinataStorage, WriteThroughStorage, get_storage
+from tests.conftest import refine
+
+
+def test_local_refinement_url_is_the_stored_file(job, export, tmp_path):
+    output = refine(job, export=export)
+
+    assert output.refinement_url.startswith('file://')
+    cid = output.refinement_url.rsplit('/', 1)[-1]
+    assert os.path.exists(os.path.join(job.settings.LOCAL_STORE_DIR, cid))
+
+    reader = RefinementReader(job.settings.REFINEMENT_ENCRYPTION_KEY, cache_dir=str(tmp_path / 'cache'))
+    try:
+        rows = reader.query(output.refinement_url, "SELECT count(*) AS posts FROM posts")
+    finally:
+        reader.close()
+    assert rows == [{'posts': len(export['posts'])}]
+
+
+def test_cached_content_url_is_the_remote_one(tmp_path):
+    remote = PinataStorage(gateway_url='https://ipfs.example.org/ipfs')
+    storage = WriteThroughStorage(LocalStorage(str(tmp_path)), remote)
+    assert storage.url('QmHash') == 'https://ipfs.example.org/ipfs/QmHash'
+
+
+def test_stub_url_serves_the_uploaded_content(job):
+    with job.activate():
+        job.settings.STORAGE_BACKEND = 'stub'
+        storage = get_storage()
+        cid = storage.put_json(b'{"stub": true}', 'QmStub')
+        response = requests.get(storage.url(cid), timeout=10)
+    response.raise_for_status()
+    assert response.content == b'{"stub": true}'
@@ -0,0 +1,39 @@
+import os
+
+from refiner.verify import verify_proof
+from tests.conftest import read_proof, refine
+from tests.test_instagram_transformer import with_duplicates
+
+
+def test_proof_of_export_with_duplicates_verifies(job, export):
+    refine(job, export=with_duplicates(export))
+
+    result = verify_proof(os.path.join(job.input_dir, 'export.json'), job.proof_path)
+    assert result['status'] == 'verified', result.get('mismatches') or result.get('error')
+
+
+def test_combined_proof_of_several_exports_verifies(job, export):
+    refine(job, first=export, second=with_duplicates(export))
+
+    result = verify_proof(job.input_dir, job.proof_path)
+    assert result['status'] == 'verified', result.get('mismatches') or result.get('error')
+
+
+def test_tampered_proof_is_a_mismatch(job, export):
+    refine(job, export=export)
+    proof = read_proof(job)
+    proof['total_posts'] += 1
+
+    result = verify_proof(os.path.join(job.input_dir, 'export.json'), proof)
+    assert result['status'] == 'mismatch'
+    assert list(result['mismatches']) == ['total_posts']
+
+
+def test_tampered_combined_proof_names_the_input(job, export):
+    refine(job, first=export, second=export)
+    proof = read_proof(job)
+    proof['proofs']['second.json']['total_posts'] += 1
+
+    result = verify_proof(job.input_dir, proof)
+    assert result['status'] == 'mismatch'
+    assert list(result['mismatches']) == ['second.json:total_posts']
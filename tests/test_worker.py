@@ -0,0 +1,67 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import Future
+
+import pytest
+
+from refiner.worker import RefinementWorker
+
+
+def noop() -> None:
+    pass
+
+
+@pytest.fixture
+def worker():
+    worker = RefinementWorker(processes=1, initializer=noop, threads=True)
+    yield worker
+    worker.shutdown()
+
+
+@pytest.fixture
+def server(worker):
+    server = worker.serve(0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def post_job(server, job):
+    """POST a job to a worker's HTTP endpoint, returning the status and body of the response."""
+    request = urllib.request.Request(
+        f"http://127.0.0.1:{server.server_port}/jobs", data=json.dumps(job).encode(), method='POST'
+    )
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status, json.load(response)
+    except urllib.error.HTTPError as e:
+        return e.code, json.load(e)
+
+
+@pytest.mark.parametrize("job_id", ['../escaped', 'nested/job', 'nested\\job', '..', ''])
+def test_job_ids_that_are_not_file_names_are_refused(worker, job_id):
+    with pytest.raises(ValueError, match="Invalid job id"):
+        worker.submit({'id': job_id, 'input_dir': 'input', 'output_dir': 'output'})
+
+
+def test_http_job_with_bad_id_is_a_bad_request(server):
+    status, body = post_job(server, {'id': '../escaped', 'input_dir': 'input', 'output_dir': 'output'})
+    assert status == 400
+    assert 'Invalid job id' in body['error']
+
+
+def test_http_job_without_a_result_is_a_server_error(server, worker, monkeypatch):
+    # A job whose pool process died never returns a result
+    def submit(job):
+        future = Future()
+        future.set_exception(RuntimeError("pool process died"))
+        return future
+
+    monkeypatch.setattr(worker, 'submit', submit)
+    status, body = post_job(server, {'id': 'job', 'input_dir': 'input', 'output_dir': 'output'})
+    assert status == 500
+    assert body['status'] == 'failed'
+    assert body['error'] == "pool process died"